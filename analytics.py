@@ -0,0 +1,203 @@
+"""
+Admin analytics for the Ghibli Movie Booking System.
+
+The figures on /admin/analytics come from the materialized views created
+by migrations/0009_analytics_views.sql: bookings per course per week,
+module popularity, and conversion from registration to first booking.
+Aggregating bookings, booking_modules and customers for every page view
+would load the primary. The page reads pre-computed rows instead, usually
+from the replica.
+
+``refresh()`` rebuilds each view with ``REFRESH MATERIALIZED VIEW
+CONCURRENTLY``. Readers see the old contents until the new ones are
+swapped in. Each refresh runs in its own transaction and records its
+duration and row count in ``analytics_refreshes``. Run it on a schedule
+with ``flask analytics-refresh`` (cron or a systemd timer). Admins can also
+queue a refresh; the "refresh_analytics" job runs it in the jobs worker.
+
+Chart payloads are column-oriented (one list of labels, one list per
+series) and serialised without whitespace to keep them small.
+"""
+
+import json
+import logging
+import time
+
+import click
+
+import db
+import jobs
+
+logger = logging.getLogger(__name__)
+
+VIEWS = (
+    "analytics_course_weekly",
+    "analytics_module_popularity",
+    "analytics_registration_conversion",
+)
+
+
+def refresh(conn, views=VIEWS):
+    """
+    Refresh materialized views concurrently, one transaction per view.
+
+    Args:
+        conn: A psycopg2 connection on the primary
+        views (iterable): Names from VIEWS
+
+    Returns:
+        list: (view, seconds, row count) per refreshed view
+    """
+    results = []
+    cur = conn.cursor()
+    try:
+        for view in views:
+            if view not in VIEWS:
+                raise ValueError(f"unknown analytics view {view!r}")
+            started = time.perf_counter()
+            # Pooled connections may carry a request-sized timeout.
+            cur.execute("SET LOCAL statement_timeout = 0")
+            cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{view}")
+            seconds = time.perf_counter() - started
+            cur.execute(f"SELECT count(*) FROM public.{view}")
+            rows = cur.fetchone()[0]
+            cur.execute(
+                """
+                INSERT INTO analytics_refreshes (view_name, refreshed_at, duration_ms, row_count)
+                VALUES (%s, now(), %s, %s)
+                ON CONFLICT (view_name) DO UPDATE
+                SET refreshed_at = EXCLUDED.refreshed_at,
+                    duration_ms = EXCLUDED.duration_ms,
+                    row_count = EXCLUDED.row_count
+                """,
+                (view, round(seconds * 1000, 1), rows),
+            )
+            conn.commit()
+            logger.info("Refreshed %s in %.1f ms (%s rows)", view, seconds * 1000, rows)
+            results.append((view, seconds, rows))
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return results
+
+
+def last_refreshes(cur):
+    """When each view was last refreshed: {view: (refreshed_at, duration_ms, rows)}."""
+    cur.execute("SELECT view_name, refreshed_at, duration_ms, row_count FROM analytics_refreshes")
+    return {view: (at, float(ms), rows) for view, at, ms, rows in cur.fetchall()}
+
+
+# ---------- CHART PAYLOADS ----------
+def course_weekly_chart(cur, weeks=12, top_courses=8):
+    """
+    Weekly bookings of the busiest courses over the last ``weeks`` weeks.
+
+    Returns:
+        dict: {"labels": [week, ...], "series": [{"name", "data"}, ...]}
+    """
+    cur.execute(
+        """
+        WITH recent AS (
+            SELECT course_id, week, bookings
+            FROM analytics_course_weekly
+            WHERE week > (current_date - make_interval(weeks => %(weeks)s))::date
+        ), top AS (
+            SELECT course_id FROM recent
+            GROUP BY course_id
+            ORDER BY sum(bookings) DESC, course_id
+            LIMIT %(top)s
+        )
+        SELECT r.week, co.course_name, r.bookings
+        FROM recent r
+        JOIN top USING (course_id)
+        JOIN courses co ON co.course_id = r.course_id
+        ORDER BY r.week, co.course_name
+        """,
+        {"weeks": weeks, "top": top_courses},
+    )
+    rows = cur.fetchall()
+    labels = sorted({week.isoformat() for week, _, _ in rows})
+    position = {week: i for i, week in enumerate(labels)}
+    series = {}
+    for week, course_name, bookings in rows:
+        data = series.setdefault(course_name, [0] * len(labels))
+        data[position[week.isoformat()]] = bookings
+    return {
+        "labels": labels,
+        "series": [{"name": name, "data": data} for name, data in series.items()],
+    }
+
+
+def module_popularity_chart(cur, limit=15):
+    """Most-booked modules: {"labels": ["Course: Module", ...], "data": [count, ...]}."""
+    cur.execute(
+        """
+        SELECT co.course_name, m.module_name, p.bookings
+        FROM analytics_module_popularity p
+        JOIN course_modules m ON m.module_id = p.module_id
+        JOIN courses co ON co.course_id = p.course_id
+        ORDER BY p.bookings DESC, p.module_id
+        LIMIT %s
+        """,
+        (limit,),
+    )
+    rows = cur.fetchall()
+    return {
+        "labels": [f"{course}: {module}" for course, module, _ in rows],
+        "data": [bookings for _, _, bookings in rows],
+    }
+
+
+def conversion_chart(cur, weeks=12):
+    """Registration cohorts per week with how many went on to book."""
+    cur.execute(
+        """
+        SELECT week, registered, booked, booked_within_7_days, avg_days_to_first_booking
+        FROM analytics_registration_conversion
+        WHERE week > (current_date - make_interval(weeks => %s))::date
+        ORDER BY week
+        """,
+        (weeks,),
+    )
+    rows = cur.fetchall()
+    return {
+        "labels": [row[0].isoformat() for row in rows],
+        "registered": [row[1] for row in rows],
+        "booked": [row[2] for row in rows],
+        "booked_within_7_days": [row[3] for row in rows],
+        "avg_days_to_first_booking": [
+            float(row[4]) if row[4] is not None else None for row in rows
+        ],
+    }
+
+
+def to_json(payload):
+    """Serialise a chart payload without insignificant whitespace."""
+    return json.dumps(payload, separators=(",", ":"), default=str)
+
+
+# ---------- SCHEDULED AND ON-DEMAND REFRESH ----------
+@jobs.job_handler("refresh_analytics")
+def refresh_job(payload):
+    """Refresh the views from the jobs worker (queued from the admin page)."""
+    conn = db.connection_pool.getconn()
+    try:
+        refresh(conn, payload.get("views") or VIEWS)
+    finally:
+        conn.close()
+
+
+@click.command("analytics-refresh")
+@click.option("--view", "views", multiple=True, type=click.Choice(VIEWS),
+              help="Refresh only this view (repeatable); default is all.")
+def refresh_command(views):
+    """Refresh the admin analytics materialized views."""
+    conn = db.connection_pool.getconn()
+    try:
+        results = refresh(conn, views or VIEWS)
+    finally:
+        conn.close()
+    for view, seconds, rows in results:
+        click.echo(f"Refreshed {view} in {seconds * 1000:.1f} ms ({rows} rows)")
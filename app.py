@@ -6,61 +6,113 @@ view their personal details and bookings, and update extra requests for courses.
 
 """
 
-import os
 import re
+import hmac
+import time
+import uuid
+import random
 import logging
-from urllib.parse import urlparse
-import psycopg2
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import threading
+from datetime import date
+import click
+import psycopg2.errors
+from flask import (
+    Flask, render_template, request, redirect, url_for, session, flash, jsonify,
+    current_app, g, has_request_context, send_from_directory,
+)
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_wtf.csrf import CSRFProtect
 from flask_talisman import Talisman
-
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "ghibli_secret_key")
-env = os.environ.get("FLASK_ENV", "development").lower()
-if env == "production" and app.config["SECRET_KEY"] == "ghibli_secret_key":
-    raise ValueError("No SECRET_KEY set !")
+import analytics
+import audit
+import db
+import jobs
+import logs
+import metrics
+import profiling
+from config import DEFAULT_SECRET_KEY, ProductionConfig, config_for_env
 
 LOGIN_TEMPLATE = "customer_login.html"
 REGISTER_TEMPLATE = "register.html"
 INVALID_CRED_MSG = "Invalid login credentials"
 
-# Initialize Logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(levelname)s: %(message)s'
-)
 logger = logging.getLogger(__name__)
+access_logger = logging.getLogger("ghibli.access")
+
+# What get_db_connection() raises when the database cannot take the request
+# right now. Views re-raise these past their catch-all handlers so the 503
+# page with Retry-After answers instead of a raw 500.
+DB_UNAVAILABLE = (db.CircuitOpenError, db.PoolTimeout)
 
 
-def get_db_connection():
+def get_db_connection(readonly=False):
     """
-    Parse DATABASE_URL (from Docker Compose) and connect securely.
+    Check out a connection from this worker's pool.
+
+    The pool is configured from DATABASE_URL (from Docker Compose) by
+    create_app(); calling close() on the result returns it to the pool.
+    The connection's statement_timeout is set to the current route's budget.
+
+    Args:
+        readonly (bool): Use the read replica, if one is configured, has not
+            failed to connect within REPLICA_RETRY_SECONDS and the current
+            session has not written within the read-your-writes window.
+
+    Raises:
+        db.CircuitOpenError: While the database circuit breaker is open.
     """
-    database_url = os.environ.get("DATABASE_URL")
-    if not database_url:
-        raise ValueError("DATABASE_URL environment variable is required")
+    timeout_ms = _statement_timeout_ms()
+    admitted = readonly and db.replica_pool.database_url and not _pinned_to_primary() \
+        and db.replica_breaker.allow_request()
+    if admitted:
+        try:
+            conn = db.replica_pool.getconn(statement_timeout_ms=timeout_ms)
+        except Exception as e:
+            # Only a failed connect means the replica is down; a full pool
+            # just sends this one read to the primary and, in a half-open
+            # trial, hands the slot back for the next read.
+            if isinstance(e, psycopg2.OperationalError):
+                db.replica_breaker.record(False)
+            elif admitted == db.CircuitBreaker.TRIAL:
+                db.replica_breaker.finish_trial(None)
+            logger.warning("Replica unavailable, falling back to primary: %s", e)
+        else:
+            if admitted == db.CircuitBreaker.TRIAL:
+                db.replica_breaker.finish_trial(True)
+            return conn
+    if db.breaker.state == db.breaker.OPEN:
+        raise db.CircuitOpenError("database circuit breaker is open")
+    return db.connection_pool.getconn(statement_timeout_ms=timeout_ms)
 
-    parsed = urlparse(database_url)
 
-    return psycopg2.connect(
-        host=parsed.hostname,
-        port=parsed.port or 5432,
-        dbname=parsed.path[1:],
-        user=parsed.username,
-        password=parsed.password,
-    )
+def _statement_timeout_ms():
+    """Per-endpoint statement_timeout budget, or the default outside requests."""
+    if not has_request_context():
+        return None
+    budgets = current_app.config.get("STATEMENT_TIMEOUTS_MS", {})
+    return budgets.get(request.endpoint, current_app.config.get("STATEMENT_TIMEOUT_MS"))
 
 
-app.config.update(
-    SESSION_COOKIE_HTTPONLY=True,
-    SESSION_COOKIE_SAMESITE="Lax",
-)
+def _pinned_to_primary():
+    """True while the current session is inside its read-your-writes window."""
+    if not has_request_context():
+        return False
+    return session.get("primary_until", 0) > time.time()
+
+
+def mark_primary_write():
+    """
+    Keep this session's reads on the primary for a short window.
+
+    Call after committing a write so the next page (e.g. booking_submitted)
+    cannot be served from a replica that has not replayed it yet.
+    """
+    window = current_app.config.get("READ_YOUR_WRITES_SECONDS", 0)
+    if window:
+        session["primary_until"] = time.time() + window
 
-app.config["SESSION_COOKIE_SECURE"] = os.environ.get("FLASK_DEBUG", "1") == "0"
 
-csrf = CSRFProtect(app)
+csrf = CSRFProtect()
 
 CSP_POLICY = {
     "default-src": "'self'",
@@ -75,20 +127,9 @@ CSP_POLICY = {
     "base-uri": "'self'",
 }
 
-talisman = Talisman(
-    app,
-    content_security_policy=CSP_POLICY,
-    force_https=env == "production",
-    strict_transport_security=env == "production",
-    strict_transport_security_max_age=31536000,
-    strict_transport_security_include_subdomains=True,
-    x_content_type_options=True,
-    referrer_policy="strict-origin-when-cross-origin",
-    frame_options="DENY",
-)
+talisman = Talisman()
 
 
-@app.after_request
 def set_security_headers(response):
     # Prevents loading cross-origin resources without explicit permission
     response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
@@ -99,8 +140,247 @@ def set_security_headers(response):
     return response
 
 
+# ---------- DB CIRCUIT BREAKER ----------
+# Endpoints that never touch the database are served even when it is down.
+_DB_FREE_ENDPOINTS = {"static", "index", "logout", "healthz", "readyz", "metrics_endpoint"}
+
+
+def circuit_breaker_gate():
+    """
+    Fail fast with a 503 while the database circuit breaker is open.
+
+    Runs before every request; in the half-open state a few requests are let
+    through as trials and finish_circuit_trial() reports how each went.
+    """
+    if request.endpoint in _DB_FREE_ENDPOINTS:
+        return None
+    if request.method == "GET" and request.endpoint in ("customer_login", "register",
+                                                        "admin_login"):
+        return None
+    admitted = db.breaker.allow_request()
+    if not admitted:
+        return service_unavailable(None)
+    g.circuit_trial = admitted == db.CircuitBreaker.TRIAL
+    return None
+
+
+def finish_circuit_trial(error):
+    """
+    Report a half-open trial request to the breaker once it is done.
+
+    It succeeds if it ended without an exception or a 5xx. A request that
+    never reached the database proves nothing and hands its slot back.
+    """
+    if not g.pop("circuit_trial", False):
+        return
+    if metrics.request_queries() == 0:
+        db.breaker.finish_trial(None)
+    else:
+        db.breaker.finish_trial(error is None and g.get("metrics_status", 500) < 500)
+
+
+def service_unavailable(error):
+    """Friendly 503 page with a Retry-After hint."""
+    retry_after = int(current_app.config.get("CIRCUIT_RESET_SECONDS", 10))
+    return (
+        render_template("service_unavailable.html"),
+        503,
+        {"Retry-After": str(retry_after)},
+    )
+
+
+# ---------- ROUTE REGISTRY ----------
+_ROUTES = []
+
+
+def route(rule, **options):
+    """
+    Record a view function so create_app() can register it.
+
+    Works like ``app.route`` but without needing an application at import
+    time, and keeps endpoint names (and so every url_for) unchanged.
+    """
+    def decorator(view):
+        _ROUTES.append((rule, options, view))
+        return view
+    return decorator
+
+
+# ---------- HEALTH CHECKS ----------
+READINESS_CACHE_SECONDS = 5.0
+READINESS_MAX_DB_MS = 500.0
+
+
+class ReadinessCheck:
+    """
+    Cached, single-flight database readiness probe.
+
+    At most one probe per worker touches the database every ``ttl`` seconds;
+    concurrent callers reuse the last result instead of queueing behind the
+    probe, so an aggressive orchestrator cannot pile queries onto Postgres.
+    """
+
+    def __init__(self, ttl=READINESS_CACHE_SECONDS, max_db_ms=READINESS_MAX_DB_MS):
+        self.ttl = ttl
+        self.max_db_ms = max_db_ms
+        self.reset()
+
+    def reset(self):
+        """Drop the cached result and lock, e.g. in a freshly forked worker."""
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._result = None
+
+    def _probe(self):
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = get_db_connection()
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+        except Exception as e:
+            logger.warning("Readiness probe failed: %s", e)
+            return {"status": "unavailable", "db": "error"}
+        finally:
+            if conn:
+                conn.close()
+
+        db_ms = round((time.perf_counter() - started) * 1000, 2)
+        status = "ok" if db_ms <= self.max_db_ms else "degraded"
+        return {"status": status, "db": "ok", "db_ms": db_ms}
+
+    def check(self):
+        """
+        Return the cached readiness result, refreshing it when stale.
+
+        Returns:
+            dict: status, db state and round-trip time in milliseconds
+        """
+        now = time.monotonic()
+        if self._result is not None and now - self._checked_at < self.ttl:
+            metrics.cache_lookup("readiness", True)
+            return self._result
+
+        # Only one thread probes; the rest serve the previous answer.
+        if not self._lock.acquire(blocking=self._result is None):
+            metrics.cache_lookup("readiness", True)
+            return self._result
+        try:
+            stale = self._result is None or time.monotonic() - self._checked_at >= self.ttl
+            metrics.cache_lookup("readiness", not stale)
+            if stale:
+                self._result = self._probe()
+                self._checked_at = time.monotonic()
+            return self._result
+        finally:
+            self._lock.release()
+
+
+readiness = ReadinessCheck()
+
+
+@route("/healthz")
+@talisman(force_https=False)
+def healthz():
+    """
+    Liveness probe: no template rendering and no I/O.
+
+    Returns:
+        tuple: Plain-text body and 200 status
+    """
+    return "ok", 200, {"Content-Type": "text/plain", "Cache-Control": "no-store"}
+
+
+@route("/readyz")
+@talisman(force_https=False)
+def readyz():
+    """
+    Readiness probe: database round trip, cached for a few seconds.
+
+    Returns:
+        tuple: JSON probe result with 200 when ready or degraded, 503 otherwise
+    """
+    result = dict(
+        readiness.check(), pool=db.connection_pool.stats(), circuit=db.breaker.state
+    )
+    if db.replica_pool.database_url:
+        result["replica_pool"] = db.replica_pool.stats()
+    code = 503 if result["status"] == "unavailable" else 200
+    return jsonify(result), code, {"Cache-Control": "no-store"}
+
+
+# ---------- REQUEST IDS ----------
+_REQUEST_ID_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+def assign_request_id():
+    """Reuse a sane incoming X-Request-ID (e.g. from the proxy) or make one."""
+    incoming = request.headers.get("X-Request-ID", "")
+    g.request_id = incoming if _REQUEST_ID_RE.match(incoming) else uuid.uuid4().hex
+
+
+def echo_request_id(response):
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    return response
+
+
+# ---------- METRICS ----------
+def start_request_metrics():
+    """Count the request as in flight and reset its query counter."""
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or "unmatched"
+    metrics.REQUESTS_IN_FLIGHT.labels(g.metrics_endpoint).inc()
+    metrics.start_request()
+
+
+def record_response_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+def finish_request(error):
+    """
+    Observe latency and query count and write the access log line.
+
+    Runs as a teardown, so even requests whose view raised are counted.
+    """
+    started = g.pop("metrics_started", None)
+    if started is None:
+        return
+    duration = time.perf_counter() - started
+    queries = metrics.request_queries()
+    endpoint = g.metrics_endpoint
+    status = g.get("metrics_status", 500)
+    metrics.REQUEST_SECONDS.labels(endpoint, request.method, str(status)).observe(duration)
+    metrics.REQUESTS_IN_FLIGHT.labels(endpoint).dec()
+    metrics.DB_QUERIES_PER_REQUEST.labels(endpoint).observe(queries)
+    access_logger.info(
+        "%s %s %s", request.method, request.path, status,
+        extra={"status": status, "duration_ms": round(duration * 1000, 2),
+               "db_queries": queries},
+    )
+
+
+@route("/metrics")
+@talisman(force_https=False)
+def metrics_endpoint():
+    """
+    Prometheus scrape target, aggregated across gunicorn workers.
+
+    When METRICS_TOKEN is set, scrapers must send it as a bearer token.
+    """
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return "Unauthorized", 401, {"WWW-Authenticate": "Bearer"}
+    body, content_type = metrics.render()
+    return body, 200, {"Content-Type": content_type, "Cache-Control": "no-store"}
+
+
 # ---------- LANDING PAGE ----------
-@app.route("/")
+@route("/")
 def index():
     """
     Render the landing page.
@@ -112,6 +392,18 @@ def index():
 
 
 # ---------- PASSWORD VERIFICATION ----------
+def hash_password(password):
+    """generate_password_hash(), timed for metrics."""
+    with metrics.PASSWORD_HASH_SECONDS.labels("hash").time():
+        return generate_password_hash(password)
+
+
+def check_password(stored_hash, password):
+    """check_password_hash(), timed for metrics."""
+    with metrics.PASSWORD_HASH_SECONDS.labels("verify").time():
+        return check_password_hash(stored_hash, password)
+
+
 def verify_customer_password(stored_password, provided_password, email):
     """Handles both modern hashes and legacy plain-text migration.
 
@@ -119,7 +411,7 @@ def verify_customer_password(stored_password, provided_password, email):
         bool: True if password is valid, False otherwise
     """
     if stored_password.startswith(("pbkdf2:", "sha256:", "scrypt:")):
-        return check_password_hash(stored_password, provided_password)
+        return check_password(stored_password, provided_password)
 
     # Legacy check
     if stored_password == provided_password:
@@ -150,7 +442,7 @@ def get_customer_by_email(email):
             """
             SELECT customer_id, name, last_name, email, phone, password
             FROM customers
-            WHERE email = %s
+            WHERE lower(email) = lower(%s)
             """,
             (email,),
         )
@@ -174,25 +466,25 @@ def rehash_customer_password(email, password):
     Returns:
         None
     """
-    new_hashed = generate_password_hash(password)
+    new_hashed = hash_password(password)
     conn = None
     try:
         conn = get_db_connection()
         with conn.cursor() as cur:
             cur.execute(
-                "UPDATE customers SET password = %s WHERE email = %s",
+                "UPDATE customers SET password = %s WHERE lower(email) = lower(%s)",
                 (new_hashed, email),
             )
             conn.commit()
     except Exception as e:
-        logger.error(f"Error rehashing customer password: {e}")
+        logger.error("Error rehashing customer password: %s", e)
     finally:
         if conn:
             conn.close()
 
 
 # ---------- CUSTOMER LOGIN ----------
-@app.route("/login", methods=["GET", "POST"])
+@route("/login", methods=["GET", "POST"])
 def customer_login():
     """
     Handle customer login.
@@ -213,6 +505,8 @@ def customer_login():
     try:
         row = get_customer_by_email(email)
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception:
         flash(INVALID_CRED_MSG, "error")
         return render_template(LOGIN_TEMPLATE), 401
@@ -269,7 +563,7 @@ def validate_registration(form, testing_mode):
 
 
 # ---------- REGISTER ----------
-@app.route("/register", methods=["GET", "POST"])
+@route("/register", methods=["GET", "POST"])
 def register():
     """
     Handle customer registration.
@@ -283,15 +577,15 @@ def register():
     if request.method == "GET":
         return render_template(REGISTER_TEMPLATE)
 
-    error = validate_registration(request.form, app.config.get("TESTING"))
+    error = validate_registration(request.form, current_app.config.get("TESTING"))
     if error:
         flash(error, "error")
         return render_template(REGISTER_TEMPLATE)
 
     # Hash the password for live/new users
     hashed_pw = (
-        generate_password_hash(request.form.get("password"))
-        if not app.config.get("TESTING")
+        hash_password(request.form.get("password"))
+        if not current_app.config.get("TESTING")
         else request.form.get("password")
         )
 
@@ -306,11 +600,13 @@ def register():
             VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP, %s)
             """,
             (request.form.get("first_name"), request.form.get("last_name"),
-                request.form.get("email"), request.form.get("phone"), hashed_pw)
+                request.form.get("email").strip(), request.form.get("phone"), hashed_pw)
         )
         conn.commit()
         flash("Account created successfully. Please log in.", "success")
         return redirect(url_for("customer_login"))
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         msg = str(e).lower()
         if "duplicate" in msg or "unique" in msg:
@@ -323,7 +619,7 @@ def register():
 
 
 # ---------- CUSTOMER DASHBOARD ----------
-@app.route("/dashboard", methods=["GET", "POST"])
+@route("/dashboard", methods=["GET", "POST"])
 def customer_dashboard():
     """
     Display customer dashboard with personal details and bookings.
@@ -351,16 +647,20 @@ def customer_dashboard():
             SET nice_to_have_requests = %s, updated_at = NOW()
             FROM customers c
             WHERE bookings.customer_id = c.customer_id
-            AND c.email = %s
+            AND lower(c.email) = lower(%s)
             AND bookings.course_id = %s
+            AND bookings.status <> 'cancelled'
             """
             cursor.execute(update_query, (new_extra, user_email, course_id_to_update))
             conn.commit()
+            mark_primary_write()
 
+        except DB_UNAVAILABLE:
+            raise
         except Exception as e:
             if conn:
                 conn.rollback()
-            logger.error(f"Update Error: {e}")
+            logger.error("Update Error: %s", e)
             return f"Error updating booking: {e}", 500
         finally:
             if cursor:
@@ -383,40 +683,46 @@ def customer_dashboard():
     user_bookings = []
 
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cursor = conn.cursor()
 
+        # One row per booking, already shaped as the dict the template
+        # uses: modules are aggregated into a JSON array per booking, so
+        # no per-booking follow-up queries and no per-field unpacking.
         query = """
-        SELECT
-            b.booking_id,
-            b.course_id,
-            b.nice_to_have_requests,
-            b.status,
-            co.course_name,
-            co.description
+        SELECT json_build_object(
+            'booking_id', b.booking_id,
+            'course_id', b.course_id,
+            'extra', b.nice_to_have_requests,
+            'status', b.status,
+            'course', co.course_name,
+            'description', co.description,
+            'submitted_at', to_char(b.submitted_at, 'YYYY-MM-DD HH24:MI'),
+            'updated_at', to_char(b.updated_at, 'YYYY-MM-DD HH24:MI'),
+            'modules', COALESCE(m.modules, '[]'::json)
+        )
         FROM bookings b
         JOIN customers c ON b.customer_id = c.customer_id
         JOIN courses co ON b.course_id = co.course_id
-        WHERE c.email = %s
+        LEFT JOIN LATERAL (
+            SELECT json_agg(
+                       json_build_object('module_id', cm.module_id, 'name', cm.module_name)
+                       ORDER BY cm.module_order, cm.module_id
+                   ) AS modules
+            FROM booking_modules bm
+            JOIN course_modules cm ON cm.module_id = bm.module_id
+            WHERE bm.booking_id = b.booking_id
+        ) m ON true
+        WHERE lower(c.email) = lower(%s)
         ORDER BY b.booking_id DESC
         """
         cursor.execute(query, (user_email,))
-        rows = cursor.fetchall()
-
-        for row in rows:
-            user_bookings.append(
-                {
-                    "booking_id": row[0],
-                    "course_id": row[1],
-                    "extra": row[2],
-                    "status": row[3],
-                    "course": row[4],
-                    "description": row[5],
-                }
-            )
+        user_bookings = [row[0] for row in cursor.fetchall()]
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
-        logger.error(f"Dashboard Fetch Error: {e}")
+        logger.error("Dashboard Fetch Error: %s", e)
         return f"Error fetching dashboard: {e}", 500
     finally:
         if cursor:
@@ -432,7 +738,7 @@ def customer_dashboard():
 
 
 # ---------- LOGOUT ----------
-@app.route("/logout")
+@route("/logout")
 def logout():
     """
     Log out the current user by clearing the session.
@@ -444,8 +750,159 @@ def logout():
     return redirect(url_for("customer_login"))
 
 
+# ---------- COURSE CAPACITY ----------
+SEAT_ALLOCATION_ATTEMPTS = 50
+SEAT_RETRY_SECONDS = 0.002
+
+
+class CapacityError(ValueError):
+    """Raised when a new capacity is below the seats already booked."""
+
+
+def allocate_seat(cur, booking_id, course_id, attempts=SEAT_ALLOCATION_ATTEMPTS):
+    """
+    Take one seat for ``booking_id`` from the course's seat shards.
+
+    Picks a random shard no other transaction holds (SKIP LOCKED), so
+    concurrent bookings for the same course lock different rows. Never
+    waits on a row lock: if every shard with seats is busy it backs off
+    briefly and retries, which also rules out lock-order deadlocks.
+
+    Returns:
+        int or None: The shard the seat came from, or None if sold out
+    """
+    for attempt in range(attempts):
+        cur.execute("""
+            WITH seat AS (
+                UPDATE course_seat_shards s
+                SET seats_left = s.seats_left - 1
+                WHERE s.course_id = %(course_id)s AND s.shard = (
+                    SELECT shard FROM course_seat_shards
+                    WHERE course_id = %(course_id)s AND seats_left > 0
+                    ORDER BY random()
+                    LIMIT 1
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING s.shard
+            )
+            UPDATE bookings b
+            SET seat_shard = seat.shard
+            FROM seat
+            WHERE b.booking_id = %(booking_id)s
+            RETURNING b.seat_shard
+        """, {"course_id": course_id, "booking_id": booking_id})
+        row = cur.fetchone()
+        if row:
+            return row[0]
+
+        # Nothing unlocked had seats: sold out, or just busy right now?
+        cur.execute(
+            "SELECT EXISTS (SELECT 1 FROM course_seat_shards "
+            "WHERE course_id = %s AND seats_left > 0)",
+            (course_id,),
+        )
+        if not cur.fetchone()[0]:
+            return None
+        time.sleep(random.uniform(0, SEAT_RETRY_SECONDS * (attempt + 1)))
+    return None
+
+
+def claim_seats(cur, booking_ids):
+    """
+    Give each booking in ``booking_ids`` that lacks a seat on a capped course one.
+
+    The bookings_release_seat trigger frees a seat when a booking is
+    cancelled or moved to another course. Whatever makes a booking live
+    again, or moves a live one, must claim its seat here in the same
+    transaction: before approving cancelled bookings, after a course move.
+
+    Returns:
+        list: Ids of the bookings left without a seat because their
+        course is sold out
+    """
+    cur.execute("""
+        SELECT b.booking_id, b.course_id
+        FROM bookings b
+        JOIN courses c ON c.course_id = b.course_id
+        WHERE b.booking_id = ANY(%s) AND b.seat_shard IS NULL AND c.capacity IS NOT NULL
+        ORDER BY b.booking_id
+        FOR UPDATE OF b
+    """, (list(booking_ids),))
+    return [
+        booking_id for booking_id, course_id in cur.fetchall()
+        if allocate_seat(cur, booking_id, course_id) is None
+    ]
+
+
+def superseded_bookings(cur, booking_ids):
+    """
+    Find cancelled bookings in ``booking_ids`` that cannot go live again.
+
+    Only one booking per customer and course may be live, so a cancelled
+    one is superseded once the customer has booked the course again, or
+    when a newer cancelled booking of theirs for it is in ``booking_ids``.
+
+    Returns:
+        list: Ids of the superseded bookings
+    """
+    cur.execute("""
+        SELECT b.booking_id
+        FROM bookings b
+        WHERE b.booking_id = ANY(%(ids)s) AND b.status = 'cancelled'
+          AND EXISTS (
+              SELECT 1 FROM bookings o
+              WHERE o.customer_id = b.customer_id AND o.course_id = b.course_id
+                AND o.booking_id <> b.booking_id
+                AND (o.status <> 'cancelled'
+                     OR (o.booking_id = ANY(%(ids)s) AND o.booking_id > b.booking_id))
+          )
+        ORDER BY b.booking_id
+    """, {"ids": list(booking_ids)})
+    return [row[0] for row in cur.fetchall()]
+
+
+def set_course_capacity(cur, course_id, capacity, shards):
+    """
+    Set (or with None, remove) a course's seat limit and rebuild its shards.
+
+    Live bookings keep their seats: each is pinned to a shard and the
+    remaining free seats are spread evenly over ``shards`` rows. Runs in the
+    caller's transaction and waits for in-flight allocations to finish.
+
+    Raises:
+        CapacityError: If capacity is below the number of live bookings
+    """
+    cur.execute("SELECT course_id FROM courses WHERE course_id = %s FOR UPDATE", (course_id,))
+    cur.execute(
+        "SELECT shard FROM course_seat_shards WHERE course_id = %s FOR UPDATE", (course_id,)
+    )
+    cur.execute("UPDATE courses SET capacity = %s WHERE course_id = %s", (capacity, course_id))
+    cur.execute("DELETE FROM course_seat_shards WHERE course_id = %s", (course_id,))
+    if capacity is None:
+        cur.execute(
+            "UPDATE bookings SET seat_shard = NULL WHERE course_id = %s AND seat_shard IS NOT NULL",
+            (course_id,),
+        )
+        return
+
+    cur.execute("""
+        UPDATE bookings SET seat_shard = booking_id %% %s
+        WHERE course_id = %s AND status <> 'cancelled'
+    """, (shards, course_id))
+    booked = cur.rowcount
+    if booked > capacity:
+        raise CapacityError(f"{booked} seats are already booked")
+
+    free, extra = divmod(capacity - booked, shards)
+    cur.execute("""
+        INSERT INTO course_seat_shards (course_id, shard, seats_left)
+        SELECT %s, shard, %s + (shard < %s)::int
+        FROM generate_series(0, %s - 1) AS shard
+    """, (course_id, free, extra, shards))
+
+
 # ---------- BOOKING PAGE -----------
-@app.route("/book", methods=["GET", "POST"])
+@route("/book", methods=["GET", "POST"])
 def booking():
     """
     Handle course booking.
@@ -472,54 +929,82 @@ def booking():
             cur = conn.cursor()
 
             cur.execute(
-                "SELECT customer_id FROM customers WHERE email = %s", (user_email,)
+                "SELECT customer_id FROM customers WHERE lower(email) = lower(%s)",
+                (user_email,),
             )
             customer_row = cur.fetchone()
             if not customer_row:
                 return redirect(url_for("customer_login"))
             customer_id = customer_row[0]
 
-            for course_id in selected_course_ids:
-                # Check for duplicate booking
-                cur.execute(
-                    "SELECT booking_id FROM bookings WHERE customer_id = %s AND course_id = %s",
-                    (customer_id, course_id),
-                )
-                if cur.fetchone():
-                    continue
+            cur.execute(
+                "SELECT course_id FROM courses WHERE course_id = ANY(%s) AND capacity IS NOT NULL",
+                ([int(c) for c in selected_course_ids],),
+            )
+            capped_course_ids = {str(row[0]) for row in cur.fetchall()}
+            sold_out = 0
 
-                # Insert booking
+            for course_id in selected_course_ids:
+                # The unique index on live (customer_id, course_id) bookings
+                # decides; an already-booked (or since archived) course
+                # returns no row and is skipped. A cancelled booking does
+                # not count, so a customer can book that course again.
                 cur.execute(
                     """
                     INSERT INTO bookings
                     (customer_id, course_id, status, nice_to_have_requests, updated_at)
-                    VALUES (%s, %s, 'Pending', %s, NOW())
+                    SELECT %s, course_id, 'pending', %s, NOW()
+                    FROM courses
+                    WHERE course_id = %s AND active
+                    ON CONFLICT (customer_id, course_id) WHERE status <> 'cancelled' DO NOTHING
                     RETURNING booking_id
                     """,
-                    (customer_id, course_id, extra_request),
+                    (customer_id, extra_request, course_id),
                 )
-                new_booking_id = cur.fetchone()[0]
+                inserted = cur.fetchone()
+                if not inserted:
+                    continue
+                new_booking_id = inserted[0]
+
+                if course_id in capped_course_ids and \
+                        allocate_seat(cur, new_booking_id, course_id) is None:
+                    cur.execute("DELETE FROM bookings WHERE booking_id = %s", (new_booking_id,))
+                    sold_out += 1
+                    continue
                 new_booking_ids.append(new_booking_id)
 
-                # Insert selected modules
+                # Insert selected modules in one statement, however many
                 selected_module_ids = request.form.getlist(f"modules_{course_id}")
                 if selected_module_ids:
-                    module_insert_data = [
-                        (new_booking_id, m_id) for m_id in selected_module_ids
-                    ]
-                    cur.executemany(
-                        "INSERT INTO booking_modules (booking_id, module_id) VALUES (%s, %s)",
-                        module_insert_data,
+                    cur.execute(
+                        """
+                        INSERT INTO booking_modules (booking_id, module_id)
+                        SELECT %s, module_id FROM course_modules
+                        WHERE module_id = ANY(%s) AND course_id = %s AND active
+                        """,
+                        (new_booking_id, [int(m) for m in selected_module_ids], course_id),
                     )
 
+            if new_booking_ids:
+                # Confirmation email goes out from the job worker after commit.
+                jobs.enqueue(cur, "booking_confirmation", {"booking_ids": new_booking_ids})
+
             conn.commit()
+            mark_primary_write()
+            if sold_out:
+                flash(f"{sold_out} of the selected courses are fully booked "
+                      "and were not added.", "error")
+                if not new_booking_ids:
+                    return redirect(url_for("booking"))
             session["last_booking_ids"] = new_booking_ids
             return redirect(url_for("booking_submitted"))
 
+        except DB_UNAVAILABLE:
+            raise
         except Exception as e:
             if conn:
                 conn.rollback()
-            logger.error(f"Booking POST Error: {e}")
+            logger.error("Booking POST Error: %s", e)
             return f"Error processing booking: {e}", 500
         finally:
             if conn:
@@ -528,7 +1013,7 @@ def booking():
     # --- GET: Render Form ---
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cur = conn.cursor()
 
         cur.execute("""
@@ -581,16 +1066,102 @@ def booking():
             courses=courses_payload,
         )
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
-        logger.error(f"Booking GET Error: {e}")
+        logger.error("Booking GET Error: %s", e)
         return f"Error loading booking page: {e}", 500
     finally:
         if conn:
             conn.close()
 
 
+# ---------- COURSE SEARCH ----------
+SEARCH_RESULT_LIMIT = 20
+_SEARCH_TERM_RE = re.compile(r"[^\W_]+")
+
+
+def to_prefix_tsquery(text):
+    """
+    Turn free text into a to_tsquery() string matching every word as a prefix.
+
+    Only word characters survive, so user input can never produce tsquery
+    syntax errors: "Studio Ghib" -> "studio:* & ghib:*".
+    """
+    return " & ".join(f"{term}:*" for term in _SEARCH_TERM_RE.findall(text.lower()))
+
+
+@route("/book/search")
+def course_search():
+    """
+    Ranked full-text search over active courses and their modules.
+
+    Matches course name/description and module name/description through the
+    GIN-indexed search_vector columns, with every word treated as a prefix.
+    A course ranks by its best hit, whether on itself or one of its modules.
+
+    Returns:
+        JSON: {"query": str, "results": [{id, name, description, rank, modules}]}
+    """
+    if session.get("role") != "customer":
+        return redirect(url_for("customer_login"))
+
+    query_text = request.args.get("q", "").strip()
+    tsquery = to_prefix_tsquery(query_text)
+    if not tsquery:
+        return jsonify({"query": query_text, "results": []})
+
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        cur = conn.cursor()
+        cur.execute("""
+            WITH course_hits AS (
+                SELECT course_id, ts_rank(search_vector, to_tsquery('english', %(q)s)) AS rank
+                FROM courses
+                WHERE active AND search_vector @@ to_tsquery('english', %(q)s)
+            ), module_hits AS (
+                SELECT course_id, module_id, module_name, module_order,
+                       ts_rank(search_vector, to_tsquery('english', %(q)s)) AS rank
+                FROM course_modules
+                WHERE active AND search_vector @@ to_tsquery('english', %(q)s)
+            ), ranked AS (
+                SELECT course_id, max(rank) AS rank
+                FROM (SELECT course_id, rank FROM course_hits
+                      UNION ALL
+                      SELECT course_id, rank FROM module_hits) hits
+                GROUP BY course_id
+            )
+            SELECT c.course_id, c.course_name, c.description, r.rank,
+                   COALESCE(
+                       (SELECT json_agg(json_build_object('id', m.module_id,
+                                                          'name', m.module_name)
+                                        ORDER BY m.module_order)
+                        FROM module_hits m WHERE m.course_id = c.course_id),
+                       '[]'::json)
+            FROM ranked r
+            JOIN courses c ON c.course_id = r.course_id AND c.active
+            ORDER BY r.rank DESC, c.course_name
+            LIMIT %(limit)s
+        """, {"q": tsquery, "limit": SEARCH_RESULT_LIMIT})
+        results = [
+            {"id": r[0], "name": r[1], "description": r[2],
+             "rank": round(r[3], 4), "modules": r[4]}
+            for r in cur.fetchall()
+        ]
+        return jsonify({"query": query_text, "results": results})
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        logger.error("Course search error: %s", e)
+        return jsonify({"error": "Search is unavailable right now."}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
 # ---------- BOOKING SUBMITTED ----------
-@app.route("/booking_submitted")
+@route("/booking_submitted")
 def booking_submitted():
     """
     Display booking confirmation page.
@@ -612,45 +1183,40 @@ def booking_submitted():
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cur = conn.cursor()
 
+        # Module names come aggregated per booking, not one query each.
         cur.execute(
             """
-            SELECT b.booking_id, c.course_name, b.nice_to_have_requests
+            SELECT b.booking_id, c.course_name, b.nice_to_have_requests,
+                   COALESCE(m.modules, '{}')
             FROM bookings b
             JOIN courses c ON b.course_id = c.course_id
+            LEFT JOIN LATERAL (
+                SELECT array_agg(cm.module_name ORDER BY cm.module_order, cm.module_id)
+                       AS modules
+                FROM booking_modules bm
+                JOIN course_modules cm ON bm.module_id = cm.module_id
+                WHERE bm.booking_id = b.booking_id
+            ) m ON true
             WHERE b.booking_id = ANY(%s)
+            ORDER BY b.booking_id
             """,
             (booking_ids,),
         )
-
-        rows = cur.fetchall()
-
-        for row in rows:
-            b_id, c_name, extra = row
-
-            cur.execute(
-                """
-                SELECT m.module_name
-                FROM booking_modules bm
-                JOIN course_modules m ON bm.module_id = m.module_id
-                WHERE bm.booking_id = %s
-                """,
-                (b_id,),
-            )
-
-            modules = [m_row[0] for m_row in cur.fetchall()]
-
-            booking_details.append(
-                {"course": c_name, "modules": modules, "extra": extra}
-            )
+        booking_details = [
+            {"course": c_name, "modules": modules, "extra": extra}
+            for _, c_name, extra, modules in cur.fetchall()
+        ]
 
         cur.close()
         conn.close()
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching confirmation: {e}")
+        logger.error("Error fetching confirmation: %s", e)
         return "Error loading confirmation", 500
     finally:
         if conn:
@@ -663,7 +1229,7 @@ def booking_submitted():
 
 
 # ---------- ADMIN LOGIN ----------
-@app.route("/admin/login", methods=["GET", "POST"])
+@route("/admin/login", methods=["GET", "POST"])
 def admin_login():
     """
     Handle administrator login.
@@ -682,7 +1248,7 @@ def admin_login():
                 """
                 SELECT admin_id, name, email, password
                 FROM admins
-                WHERE email = %s
+                WHERE lower(email) = lower(%s)
                 """,
                 (email,),
             )
@@ -690,6 +1256,8 @@ def admin_login():
             cur.close()
             conn.close()
 
+        except DB_UNAVAILABLE:
+            raise
         except Exception:
             flash("Database error occurred.", "error")
             return render_template("admin_login.html"), 500
@@ -703,24 +1271,24 @@ def admin_login():
         # Check password — support hashed and legacy plain-text
         valid = False
         if stored_password.startswith(("pbkdf2:", "sha256:", "scrypt:")):
-            valid = check_password_hash(stored_password, password)
+            valid = check_password(stored_password, password)
         else:
             # Legacy plain-text — compare, then rehash in a fresh connection
             if stored_password == password:
                 valid = True
-                new_hashed = generate_password_hash(password)
+                new_hashed = hash_password(password)
                 rehash_conn = None
                 rehash_cur = None
                 try:
                     rehash_conn = get_db_connection()
                     rehash_cur = rehash_conn.cursor()
                     rehash_cur.execute(
-                        "UPDATE admins SET password = %s WHERE email = %s",
-                        (new_hashed, email),
+                        "UPDATE admins SET password = %s WHERE admin_id = %s",
+                        (new_hashed, admin_id),
                     )
                     rehash_conn.commit()
                 except Exception as e:
-                    logger.error(f"Error rehashing admin password: {e}")
+                    logger.error("Error rehashing admin password: %s", e)
                 finally:
                     if rehash_cur:
                         rehash_cur.close()
@@ -742,7 +1310,7 @@ def admin_login():
 
 
 # ---------- ADMIN DASHBOARD ----------
-@app.route("/admin")
+@route("/admin")
 def admin_dashboard():
     """
     Admin dashboard showing summary counts.
@@ -752,7 +1320,7 @@ def admin_dashboard():
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cur = conn.cursor()
 
         cur.execute("SELECT COUNT(*) FROM customers")
@@ -771,6 +1339,8 @@ def admin_dashboard():
             booking_count=booking_count,
         )
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         return f"Admin Stats Error: {e}", 500
 
@@ -778,44 +1348,62 @@ def admin_dashboard():
         if conn:
             conn.close()
 
+
 # --------------------- ADMIN COURSE -----------
+ARCHIVED_COURSES_SHOWN = 50
 
 
-@app.route("/admin/courses", methods=["GET", "POST"])
+@route("/admin/courses", methods=["GET", "POST"])
 def manage_courses():
     if session.get("role") != "admin":
         return redirect(url_for("admin_login"))
 
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=request.method == "GET")
         cur = conn.cursor()
 
         if request.method == "POST":
             course_name = request.form.get("course_name", "").strip()
             description = request.form.get("description", "").strip()
+            capacity = request.form.get("capacity", "").strip()
 
             if not course_name or not description:
                 flash("Course name and description are required.", "error")
                 return redirect(url_for("manage_courses"))
+            if capacity and not capacity.isdigit():
+                flash("Capacity must be a whole number of seats.", "error")
+                return redirect(url_for("manage_courses"))
 
             cur.execute(
                 """
                 INSERT INTO courses (course_name, description, active, created_at)
                 VALUES (%s, %s, TRUE, NOW())
+                RETURNING course_id
                 """,
                 (course_name, description),
             )
+            course_id = cur.fetchone()[0]
+            if capacity:
+                set_course_capacity(
+                    cur, course_id, int(capacity),
+                    current_app.config["COURSE_SEAT_SHARDS"],
+                )
             conn.commit()
+            mark_primary_write()
+            audit_admin_change("create", "course", course_id, name=course_name,
+                               capacity=int(capacity) if capacity else None)
             flash("Course created successfully.", "success")
             return redirect(url_for("manage_courses"))
 
         cur.execute(
             """
-            SELECT course_id, course_name, description
-            FROM courses
-            WHERE active = TRUE
-            ORDER BY course_id ASC
+            SELECT c.course_id, c.course_name, c.description, c.capacity,
+                   (SELECT SUM(s.seats_left) FROM course_seat_shards s
+                    WHERE s.course_id = c.course_id)
+            FROM courses c
+            WHERE c.active = TRUE
+            ORDER BY c.course_id ASC
             """
         )
         rows = cur.fetchall()
@@ -825,13 +1413,47 @@ def manage_courses():
                 "id": row[0],
                 "name": row[1],
                 "description": row[2],
+                "capacity": row[3],
+                "seats_left": row[4],
+                "modules": [],
             }
             for row in rows
         ]
 
+        by_id = {course["id"]: course for course in courses}
+        cur.execute(
+            """
+            SELECT module_id, course_id, module_name, active
+            FROM course_modules
+            WHERE course_id = ANY(%s)
+            ORDER BY module_order, module_id
+            """,
+            (list(by_id),),
+        )
+        for module_id, course_id, module_name, active in cur.fetchall():
+            by_id[course_id]["modules"].append(
+                {"id": module_id, "name": module_name, "active": active}
+            )
+
+        cur.execute(
+            """
+            SELECT course_id, course_name, archived_at
+            FROM courses
+            WHERE NOT active
+            ORDER BY archived_at DESC NULLS LAST, course_id DESC
+            LIMIT %s
+            """,
+            (ARCHIVED_COURSES_SHOWN,),
+        )
+        archived = [
+            {"id": row[0], "name": row[1], "archived_at": row[2]} for row in cur.fetchall()
+        ]
+
         cur.close()
-        return render_template("admin_courses.html", courses=courses)
+        return render_template("admin_courses.html", courses=courses, archived=archived)
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
@@ -842,57 +1464,267 @@ def manage_courses():
             conn.close()
 
 
-@app.route("/admin/courses/<int:course_id>/delete", methods=["POST"])
-def delete_course(course_id):
+@route("/admin/courses/<int:course_id>/capacity", methods=["POST"])
+def update_course_capacity(course_id):
+    """
+    Change a course's seat limit; a blank value makes it unlimited.
+    """
     if session.get("role") != "admin":
         return redirect(url_for("admin_login"))
 
+    capacity = request.form.get("capacity", "").strip()
+    if capacity and not capacity.isdigit():
+        flash("Capacity must be a whole number of seats.", "error")
+        return redirect(url_for("manage_courses"))
+
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-
-        cur.execute("DELETE FROM courses WHERE course_id = %s", (course_id,))
+        set_course_capacity(
+            cur, course_id, int(capacity) if capacity else None,
+            current_app.config["COURSE_SEAT_SHARDS"],
+        )
         conn.commit()
-
-        flash("Course deleted successfully.", "success")
-        return redirect(url_for("manage_courses"))
-
-    except Exception:
+        mark_primary_write()
+        audit_admin_change("set_capacity", "course", course_id,
+                           capacity=int(capacity) if capacity else None)
+        flash("Course capacity updated.", "success")
+    except CapacityError as e:
+        conn.rollback()
+        flash(f"Capacity too low: {e}.", "error")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
         if conn:
             conn.rollback()
-        flash("Unable to delete course.", "error")
-        return redirect(url_for("manage_courses"))
-
+        flash(f"Unable to update capacity: {e}", "error")
     finally:
         if conn:
             conn.close()
+    return redirect(url_for("manage_courses"))
 
-# ---------- ADMIN MANAGE BOOKINGS ----------
 
+def _set_catalog_active(table, key, row_id, active):
+    """
+    Archive (active=False) or restore one course or module row.
 
-@app.route("/admin/bookings")
-def manage_bookings():
+    Returns:
+        bool: False when the row did not exist or was already in that state
     """
-    List all bookings for admin review.
+    sql = f"""
+        UPDATE {table}
+        SET active = %s, archived_at = CASE WHEN %s THEN NULL ELSE now() END
+        WHERE {key} = %s AND active <> %s
     """
-    if session.get("role") != "admin":
-        return redirect(url_for("admin_login"))
-
     conn = None
     try:
         conn = get_db_connection()
         cur = conn.cursor()
-        cur.execute("""
-            SELECT b.booking_id, c.email, co.course_name, b.nice_to_have_requests
-            FROM bookings b
-            JOIN customers c ON b.customer_id = c.customer_id
-            JOIN courses co ON b.course_id = co.course_id
+        cur.execute(sql, (active, active, row_id, active))
+        changed = cur.rowcount == 1
+        conn.commit()
+        mark_primary_write()
+        return changed
+    except Exception:
+        if conn:
+            conn.rollback()
+        raise
+    finally:
+        if conn:
+            conn.close()
+
+
+@route("/admin/courses/<int:course_id>/archive", methods=["POST"])
+def archive_course(course_id):
+    """
+    Hide a course from the catalog without deleting it.
+
+    Existing bookings keep pointing at the course; `flask catalog-purge`
+    removes archived courses once nothing refers to them.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    try:
+        if _set_catalog_active("courses", "course_id", course_id, False):
+            audit_admin_change("archive", "course", course_id)
+            flash("Course archived.", "success")
+        else:
+            flash("That course is already archived or no longer exists.", "error")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        logger.error("Archive course error: %s", e)
+        flash("Unable to archive course.", "error")
+    return redirect(url_for("manage_courses"))
+
+
+@route("/admin/courses/<int:course_id>/restore", methods=["POST"])
+def restore_course(course_id):
+    """Put an archived course back in the catalog."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    try:
+        if _set_catalog_active("courses", "course_id", course_id, True):
+            audit_admin_change("restore", "course", course_id)
+            flash("Course restored.", "success")
+        else:
+            flash("That course is not archived or no longer exists.", "error")
+    except psycopg2.errors.UniqueViolation:
+        flash("Another live course already uses this name; rename it first.", "error")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        logger.error("Restore course error: %s", e)
+        flash("Unable to restore course.", "error")
+    return redirect(url_for("manage_courses"))
+
+
+@route("/admin/modules/<int:module_id>/archive", methods=["POST"])
+def archive_module(module_id):
+    """Stop offering one module; bookings that chose it are unaffected."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    try:
+        if _set_catalog_active("course_modules", "module_id", module_id, False):
+            audit_admin_change("archive", "module", module_id)
+            flash("Module archived.", "success")
+        else:
+            flash("That module is already archived or no longer exists.", "error")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        logger.error("Archive module error: %s", e)
+        flash("Unable to archive module.", "error")
+    return redirect(url_for("manage_courses"))
+
+
+@route("/admin/modules/<int:module_id>/restore", methods=["POST"])
+def restore_module(module_id):
+    """Offer an archived module again."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    try:
+        if _set_catalog_active("course_modules", "module_id", module_id, True):
+            audit_admin_change("restore", "module", module_id)
+            flash("Module restored.", "success")
+        else:
+            flash("That module is not archived or no longer exists.", "error")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        logger.error("Restore module error: %s", e)
+        flash("Unable to restore module.", "error")
+    return redirect(url_for("manage_courses"))
+
+
+def purge_archived(conn, older_than_days, batch_size):
+    """
+    Delete archived modules and courses that nothing references any more.
+
+    Works in batches of ``batch_size`` rows, committing after each, so no
+    long transaction holds locks on the catalog. Rows locked by a running
+    transaction (e.g. a booking) are skipped and retried on the next run.
+    Modules go first, including live modules of archived courses, since
+    a course can only be deleted once it has none.
+
+    Returns:
+        tuple: (modules deleted, courses deleted)
+    """
+    cutoff = {"days": older_than_days, "batch": batch_size}
+    statements = (
+        """
+        DELETE FROM course_modules WHERE module_id IN (
+            SELECT m.module_id FROM course_modules m
+            LEFT JOIN courses c ON c.course_id = m.course_id
+            WHERE ((NOT m.active AND m.archived_at < now() - make_interval(days => %(days)s))
+                   OR (NOT c.active
+                       AND c.archived_at < now() - make_interval(days => %(days)s)))
+              AND NOT EXISTS (SELECT 1 FROM booking_modules bm
+                              WHERE bm.module_id = m.module_id)
+            LIMIT %(batch)s
+            FOR UPDATE OF m SKIP LOCKED
+        )
+        """,
+        """
+        DELETE FROM courses WHERE course_id IN (
+            SELECT c.course_id FROM courses c
+            WHERE NOT c.active
+              AND c.archived_at < now() - make_interval(days => %(days)s)
+              AND NOT EXISTS (SELECT 1 FROM bookings b WHERE b.course_id = c.course_id)
+              AND NOT EXISTS (SELECT 1 FROM course_modules m WHERE m.course_id = c.course_id)
+            LIMIT %(batch)s
+            FOR UPDATE SKIP LOCKED
+        )
+        """,
+    )
+    deleted = []
+    cur = conn.cursor()
+    try:
+        for sql in statements:
+            total = 0
+            while True:
+                cur.execute(sql, cutoff)
+                conn.commit()
+                total += cur.rowcount
+                if cur.rowcount < batch_size:
+                    break
+            deleted.append(total)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return tuple(deleted)
+
+
+# ---------- ADMIN MANAGE BOOKINGS ----------
+BOOKINGS_PAGE_SIZE = 50
+
+
+@route("/admin/bookings")
+def manage_bookings():
+    """
+    List bookings for admin review, newest first.
+
+    Pages with a keyset cursor (?before=<booking_id>) walking the primary
+    key backwards, so a page costs the same however many bookings exist.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    before = request.args.get("before", "")
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT b.booking_id, c.email, co.course_name, b.nice_to_have_requests
+            FROM bookings b
+            JOIN customers c ON b.customer_id = c.customer_id
+            JOIN courses co ON b.course_id = co.course_id
+            WHERE (%(before)s IS NULL OR b.booking_id < %(before)s)
             ORDER BY b.booking_id DESC
-        """)
+            LIMIT %(limit)s
+        """, {
+            "before": int(before) if before.isdigit() else None,
+            "limit": BOOKINGS_PAGE_SIZE + 1,
+        })
         rows = cur.fetchall()
-        bookings = [{"id": r[0], "email": r[1], "course": r[2], "extra": r[3]} for r in rows]
-        return render_template("manage_bookings.html", bookings=bookings)
+        bookings = [
+            {"id": r[0], "email": r[1], "course": r[2], "extra": r[3]}
+            for r in rows[:BOOKINGS_PAGE_SIZE]
+        ]
+        next_before = bookings[-1]["id"] if len(rows) > BOOKINGS_PAGE_SIZE else None
+        return render_template(
+            "manage_bookings.html", bookings=bookings, next_before=next_before
+        )
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         return f"Error loading bookings: {e}", 500
     finally:
@@ -900,8 +1732,260 @@ def manage_bookings():
             conn.close()
 
 
+# ---------- ADMIN PENDING REVIEW ----------
+PENDING_PAGE_SIZE = 50
+
+
+@route("/admin/bookings/pending")
+def pending_bookings():
+    """
+    Oldest-first list of bookings awaiting review.
+
+    Reads only pending rows via the partial index on (submitted_at,
+    booking_id) and pages with a keyset cursor (?after=<ts>,<id>), so the
+    cost stays flat however many bookings have already been reviewed.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    after = request.args.get("after", "")
+    after_ts, _, after_id = after.partition(",")
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT b.booking_id, c.email, co.course_name, b.nice_to_have_requests,
+                   b.submitted_at
+            FROM bookings b
+            JOIN customers c ON b.customer_id = c.customer_id
+            JOIN courses co ON b.course_id = co.course_id
+            WHERE b.status = 'pending'
+              AND (%(after_id)s IS NULL
+                   OR (b.submitted_at, b.booking_id) > (%(after_ts)s, %(after_id)s))
+            ORDER BY b.submitted_at, b.booking_id
+            LIMIT %(limit)s
+        """, {
+            "after_ts": after_ts or None,
+            "after_id": int(after_id) if after_id.isdigit() else None,
+            "limit": PENDING_PAGE_SIZE + 1,
+        })
+        rows = cur.fetchall()
+        bookings = [
+            {"id": r[0], "email": r[1], "course": r[2], "extra": r[3], "submitted_at": r[4]}
+            for r in rows[:PENDING_PAGE_SIZE]
+        ]
+        next_after = None
+        if len(rows) > PENDING_PAGE_SIZE:
+            last = bookings[-1]
+            next_after = f"{last['submitted_at'].isoformat()},{last['id']}"
+        return render_template(
+            "pending_bookings.html", bookings=bookings, next_after=next_after
+        )
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        return f"Error loading pending bookings: {e}", 500
+    finally:
+        if conn:
+            conn.close()
+
+
+# ---------- ADMIN REVIEW QUEUE ----------
+def claim_review_batch(cur, reviewer, limit, lease_seconds):
+    """
+    Lease up to ``limit`` pending bookings to ``reviewer``.
+
+    Rows another transaction is claiming right now are skipped rather than
+    waited on (SKIP LOCKED), and rows leased to someone else stay hidden
+    until their lease expires. The reviewer's own unexpired claims are
+    returned again with a renewed lease, so reloading the page is stable.
+
+    Returns:
+        list: (booking_id, email, course_name, extra, submitted_at, claimed_until)
+    """
+    cur.execute("""
+        WITH claimed AS (
+            UPDATE bookings
+            SET review_claimed_by = %(reviewer)s,
+                review_claimed_until = NOW() + make_interval(secs => %(lease)s)
+            WHERE booking_id IN (
+                SELECT booking_id FROM bookings
+                WHERE status = 'pending'
+                  AND (review_claimed_until IS NULL
+                       OR review_claimed_until < NOW()
+                       OR review_claimed_by = %(reviewer)s)
+                ORDER BY submitted_at, booking_id
+                LIMIT %(limit)s
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING booking_id, customer_id, course_id, nice_to_have_requests,
+                      submitted_at, review_claimed_until
+        )
+        SELECT cl.booking_id, c.email, co.course_name, cl.nice_to_have_requests,
+               cl.submitted_at, cl.review_claimed_until
+        FROM claimed cl
+        JOIN customers c ON cl.customer_id = c.customer_id
+        JOIN courses co ON cl.course_id = co.course_id
+        ORDER BY cl.submitted_at, cl.booking_id
+    """, {"reviewer": reviewer, "lease": lease_seconds, "limit": limit})
+    return cur.fetchall()
+
+
+@route("/admin/review-queue")
+def review_queue():
+    """
+    Hand this admin their next batch of unclaimed pending bookings.
+
+    Each admin works on a disjoint batch, so several reviewers can clear the
+    queue in parallel without opening the same booking twice.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        rows = claim_review_batch(
+            cur,
+            session.get("user"),
+            current_app.config["REVIEW_BATCH_SIZE"],
+            current_app.config["REVIEW_LEASE_SECONDS"],
+        )
+        conn.commit()
+        mark_primary_write()
+        bookings = [
+            {"id": r[0], "email": r[1], "course": r[2], "extra": r[3],
+             "submitted_at": r[4], "claimed_until": r[5]}
+            for r in rows
+        ]
+        return render_template("review_queue.html", bookings=bookings)
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        return f"Error loading review queue: {e}", 500
+    finally:
+        if conn:
+            conn.close()
+
+
+@route("/admin/review-queue/release", methods=["POST"])
+def release_review_claims():
+    """
+    Give this admin's unreviewed claims back to the queue straight away.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("""
+            UPDATE bookings
+            SET review_claimed_by = NULL, review_claimed_until = NULL
+            WHERE review_claimed_by = %s AND status = 'pending'
+        """, (session.get("user"),))
+        released = cur.rowcount
+        conn.commit()
+        mark_primary_write()
+        flash(f"Released {released} booking(s) back to the queue.", "success")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        flash(f"Error releasing bookings: {e}", "error")
+    finally:
+        if conn:
+            conn.close()
+    return redirect(url_for("pending_bookings"))
+
+
 # ---------- ADMIN EDIT BOOKING ----------
-@app.route("/admin/bookings/<int:booking_id>/edit", methods=["GET", "POST"])
+BOOKING_EDIT_FIELDS = [("course", "Course"), ("extra", "Extra requests")]
+
+
+def _form_version():
+    """The row version an edit form was rendered from, or None if missing."""
+    version = request.form.get("version", "")
+    return int(version) if version.isdigit() else None
+
+
+def _edit_conflicts(fields, submitted, current):
+    """
+    Fields where the admin's submission differs from the row as it is now.
+
+    Args:
+        fields (list): (key, label) pairs in display order
+        submitted (dict): Values from the form
+        current (dict): Values currently in the database
+
+    Returns:
+        list: {"label", "yours", "current"} dicts, empty if nothing differs
+    """
+    return [
+        {"label": label, "yours": submitted[key], "current": current[key]}
+        for key, label in fields
+        if (submitted[key] or "") != (current[key] or "")
+    ]
+
+
+def _load_booking(cur, booking_id):
+    cur.execute("""
+        SELECT b.booking_id, b.nice_to_have_requests, b.course_id, c.course_name, b.version
+        FROM bookings b
+        JOIN courses c ON b.course_id = c.course_id
+        WHERE b.booking_id = %s
+    """, (booking_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "extra": row[1],
+        "course_id": row[2],
+        "course_name": row[3],
+        "version": row[4],
+    }
+
+
+def _booking_conflict(cur, booking_id, course_id, extra):
+    """
+    Response for a booking edit made against a stale version.
+
+    Returns:
+        The 409 diff page (or a 404), or None when the row already holds
+        exactly what the admin submitted.
+    """
+    current = _load_booking(cur, booking_id)
+    if not current:
+        return "Booking not found", 404
+    cur.execute("SELECT course_id, course_name FROM courses WHERE active = TRUE")
+    all_courses = cur.fetchall()
+    course_names = dict(all_courses)
+    course_names[current["course_id"]] = current["course_name"]
+    course_id = int(course_id) if str(course_id).isdigit() else None
+
+    conflicts = _edit_conflicts(
+        BOOKING_EDIT_FIELDS,
+        {"course": course_names.get(course_id, "Unknown course"), "extra": extra},
+        {"course": current["course_name"], "extra": current["extra"]},
+    )
+    if not conflicts:
+        return None
+    # The form keeps the admin's input but now carries the current version,
+    # so saving again is a deliberate overwrite.
+    submitted = dict(current, course_id=course_id, extra=extra)
+    return render_template(
+        "edit_booking.html", booking=submitted, courses=all_courses, conflicts=conflicts
+    ), 409
+
+
+@route("/admin/bookings/<int:booking_id>/edit", methods=["GET", "POST"])
 def edit_booking(booking_id):
     """
     Handle editing of bookings in admin panel.
@@ -909,13 +1993,18 @@ def edit_booking(booking_id):
     GET: Display the edit booking form
     POST: Process booking updates
 
+    The form carries the row version it was rendered from. The UPDATE only
+    matches that version, so an admin editing a stale copy gets a 409 with
+    the differences instead of overwriting someone else's change. No lock
+    is held between GET and POST.
+
     Args:
         booking_id (int): The ID of the booking to edit
 
     Returns:
         str: Rendered edit template or redirect to bookings list
     """
-    if not app.config.get("TESTING") and session.get("role") != "admin":
+    if not current_app.config.get("TESTING") and session.get("role") != "admin":
         return redirect(url_for("admin_login"))
 
     conn = None
@@ -926,40 +2015,49 @@ def edit_booking(booking_id):
         if request.method == "POST":
             new_course_id = request.form.get("course_id")
             new_extra = request.form.get("extra")
+            version = _form_version()
+            if version is None:
+                flash("This form is out of date; please review the booking again.", "error")
+                return redirect(url_for("edit_booking", booking_id=booking_id))
 
             cur.execute("""
                 UPDATE bookings
                 SET course_id = %s, nice_to_have_requests = %s, updated_at = NOW()
-                WHERE booking_id = %s
-            """, (new_course_id, new_extra, booking_id))
-            conn.commit()
+                WHERE booking_id = %s AND version = %s
+                RETURNING status
+            """, (new_course_id, new_extra, booking_id, version))
+            updated = cur.fetchone()
+            if updated is None:
+                conn.rollback()
+                conflict = _booking_conflict(cur, booking_id, new_course_id, new_extra)
+                if conflict is not None:
+                    return conflict
+            elif updated[0] != "cancelled" and claim_seats(cur, [booking_id]):
+                # Moved onto a capped course with no seats left.
+                conn.rollback()
+                flash("That course is fully booked; the booking was not changed.", "error")
+                return redirect(url_for("edit_booking", booking_id=booking_id))
+            else:
+                conn.commit()
+                mark_primary_write()
+                audit_admin_change("update", "booking", booking_id,
+                                   course_id=new_course_id, extra=new_extra)
             flash("Booking updated successfully!", "success")
             return redirect(url_for("manage_bookings"))
 
         # GET: Fetch current booking and all courses for the dropdown
-        cur.execute("""
-            SELECT b.booking_id, b.nice_to_have_requests, b.course_id, c.course_name
-            FROM bookings b
-            JOIN courses c ON b.course_id = c.course_id
-            WHERE b.booking_id = %s
-        """, (booking_id,))
-        row = cur.fetchone()
+        booking_data = _load_booking(cur, booking_id)
 
-        if not row:
+        if not booking_data:
             return "Booking not found", 404
 
         cur.execute("SELECT course_id, course_name FROM courses WHERE active = TRUE")
         all_courses = cur.fetchall()
 
-        booking_data = {
-            "id": row[0],
-            "extra": row[1],
-            "course_id": row[2],
-            "course_name": row[3],
-        }
-
         return render_template("edit_booking.html", booking=booking_data, courses=all_courses)
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
@@ -971,7 +2069,7 @@ def edit_booking(booking_id):
 
 
 # ---------- ADMIN DELETE BOOKING ----------
-@app.route("/admin/bookings/<int:booking_id>/delete", methods=["POST"])
+@route("/admin/bookings/<int:booking_id>/delete", methods=["POST"])
 def delete_booking(booking_id):
     """
     Delete a booking and its associated modules.
@@ -986,7 +2084,11 @@ def delete_booking(booking_id):
         cur.execute("DELETE FROM booking_modules WHERE booking_id = %s", (booking_id,))
         cur.execute("DELETE FROM bookings WHERE booking_id = %s", (booking_id,))
         conn.commit()
+        mark_primary_write()
+        audit_admin_change("delete", "booking", booking_id)
         flash("Booking deleted successfully.", "success")
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
@@ -997,24 +2099,142 @@ def delete_booking(booking_id):
     return redirect(url_for("manage_bookings"))
 
 
+# ---------- ADMIN BULK BOOKING ACTIONS ----------
+BULK_BOOKING_STATUSES = {"approve": "approved", "cancel": "cancelled"}
+BULK_RETURN_ENDPOINTS = {"manage_bookings", "pending_bookings", "review_queue"}
+
+
+def _bulk_booking_summary(action, requested, affected):
+    verb = {"approve": "Approved", "cancel": "Cancelled", "delete": "Deleted"}[action]
+    return f"{verb} {affected} of {requested} selected booking(s)."
+
+
+@route("/admin/bookings/bulk", methods=["POST"])
+def bulk_bookings():
+    """
+    Approve, cancel or delete many bookings at once.
+
+    Each action is one set-based statement per table (booking_id = ANY(ids))
+    inside a single transaction, so the cost does not grow with round trips.
+    Approving claims seats first for cancelled bookings on capped courses;
+    those whose course is sold out stay as they are, as do cancelled ones
+    the customer has since booked again. Each booking actually changed gets
+    one audit event. Responds with JSON when the client asks for it,
+    otherwise flashes a summary and returns to the bookings list.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    action = request.form.get("action")
+    return_to = request.form.get("return_to")
+    if return_to not in BULK_RETURN_ENDPOINTS:
+        return_to = "manage_bookings"
+    try:
+        booking_ids = sorted({int(i) for i in request.form.getlist("booking_ids")})
+    except ValueError:
+        booking_ids = None
+
+    wants_json = request.accept_mimetypes.best == "application/json"
+    if action not in ("approve", "cancel", "delete") or not booking_ids:
+        message = "Select at least one booking and a valid action."
+        if wants_json:
+            return jsonify({"error": message}), 400
+        flash(message, "error")
+        return redirect(url_for(return_to))
+
+    sold_out = []
+    superseded = []
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        if action == "approve":
+            superseded = superseded_bookings(cur, booking_ids)
+            sold_out = claim_seats(cur, [i for i in booking_ids if i not in superseded])
+        if action == "delete":
+            cur.execute(
+                "DELETE FROM booking_modules WHERE booking_id = ANY(%s)", (booking_ids,)
+            )
+            cur.execute(
+                "DELETE FROM bookings WHERE booking_id = ANY(%s) RETURNING booking_id",
+                (booking_ids,),
+            )
+        else:
+            # Rows already in the target status are left untouched (and uncounted).
+            cur.execute("""
+                UPDATE bookings
+                SET status = %s, updated_at = NOW(),
+                    review_claimed_by = NULL, review_claimed_until = NULL
+                WHERE booking_id = ANY(%s) AND status <> %s AND NOT booking_id = ANY(%s)
+                RETURNING booking_id
+            """, (BULK_BOOKING_STATUSES[action], booking_ids,
+                  BULK_BOOKING_STATUSES[action], sold_out + superseded))
+        changed = sorted(row[0] for row in cur.fetchall())
+        affected = len(changed)
+        conn.commit()
+        mark_primary_write()
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        if wants_json:
+            return jsonify({"error": f"Bulk {action} failed: {e}"}), 500
+        flash(f"Error updating bookings: {e}", "error")
+        return redirect(url_for(return_to))
+    finally:
+        if conn:
+            conn.close()
+
+    summary = {"action": action, "requested": len(booking_ids), "affected": affected}
+    if action == "approve":
+        summary["sold_out"] = len(sold_out)
+        summary["superseded"] = len(superseded)
+    logger.info("Admin bulk %s: %s/%s bookings", action, affected, len(booking_ids))
+    # Only bookings the statement actually changed are audited.
+    for booking_id in changed:
+        audit_admin_change(f"bulk_{action}", "booking", booking_id)
+    if wants_json:
+        return jsonify(summary)
+    flash(_bulk_booking_summary(action, len(booking_ids), affected), "success")
+    if sold_out:
+        flash(f"{len(sold_out)} booking(s) were not approved: their course is fully booked.",
+              "error")
+    if superseded:
+        flash(f"{len(superseded)} cancelled booking(s) were not approved: the customer "
+              "has booked that course again.", "error")
+    return redirect(url_for(return_to))
+
+
 # ---------- ADMIN LIST CUSTOMERS ----------
-@app.route("/admin/customers")
+CUSTOMERS_PAGE_SIZE = 50
+
+
+@route("/admin/customers")
 def admin_customers():
     """
-    List all customers for admin review.
+    List customers for admin review, newest first.
+
+    Pages with a keyset cursor (?before=<customer_id>) like the bookings list.
     """
     if session.get("role") != "admin":
         return redirect(url_for("admin_login"))
 
+    before = request.args.get("before", "")
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(readonly=True)
         cur = conn.cursor()
         cur.execute("""
             SELECT customer_id, name, last_name, email, phone, created_at
             FROM customers
+            WHERE (%(before)s IS NULL OR customer_id < %(before)s)
             ORDER BY customer_id DESC
-        """)
+            LIMIT %(limit)s
+        """, {
+            "before": int(before) if before.isdigit() else None,
+            "limit": CUSTOMERS_PAGE_SIZE + 1,
+        })
         rows = cur.fetchall()
         customers = [
             {
@@ -1025,9 +2245,14 @@ def admin_customers():
                 "phone": r[4],
                 "created": r[5],
             }
-            for r in rows
+            for r in rows[:CUSTOMERS_PAGE_SIZE]
         ]
-        return render_template("manage_customers.html", customerlist=customers)
+        next_before = customers[-1]["id"] if len(rows) > CUSTOMERS_PAGE_SIZE else None
+        return render_template(
+            "manage_customers.html", customerlist=customers, next_before=next_before
+        )
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         return f"Error loading customers: {e}", 500
     finally:
@@ -1036,7 +2261,7 @@ def admin_customers():
 
 
 # ---------- ADMIN DELETE CUSTOMER ----------
-@app.route("/admin/customers/<int:customer_id>/delete", methods=["POST"])
+@route("/admin/customers/<int:customer_id>/delete", methods=["POST"])
 def delete_customer(customer_id):
     """
     Delete a customer and all their associated bookings and modules.
@@ -1064,7 +2289,11 @@ def delete_customer(customer_id):
         cur.execute("DELETE FROM customers WHERE customer_id = %s", (customer_id,))
 
         conn.commit()
+        mark_primary_write()
+        audit_admin_change("delete", "customer", customer_id)
         flash("Customer deleted successfully.", "success")
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
@@ -1076,13 +2305,54 @@ def delete_customer(customer_id):
 
 
 # ---------- ADMIN EDIT CUSTOMER ----------
-@app.route("/admin/customers/<int:customer_id>/edit", methods=["GET", "POST"])
+CUSTOMER_EDIT_FIELDS = [
+    ("name", "First name"), ("last_name", "Last name"), ("email", "Email"), ("phone", "Phone"),
+]
+
+
+def _load_customer(cur, customer_id):
+    cur.execute(
+        """
+        SELECT customer_id, name, last_name, email, phone, version
+        FROM customers
+        WHERE customer_id = %s
+        """,
+        (customer_id,),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        "id": row[0],
+        "name": row[1],
+        "last_name": row[2],
+        "email": row[3],
+        "phone": row[4],
+        "version": row[5],
+    }
+
+
+def _customer_conflict(cur, customer_id, submitted):
+    """Like _booking_conflict, for a stale customer edit."""
+    current = _load_customer(cur, customer_id)
+    if not current:
+        return "Customer not found", 404
+    conflicts = _edit_conflicts(CUSTOMER_EDIT_FIELDS, submitted, current)
+    if not conflicts:
+        return None
+    return render_template(
+        "edit_customer.html", customer=dict(current, **submitted), conflicts=conflicts
+    ), 409
+
+
+@route("/admin/customers/<int:customer_id>/edit", methods=["GET", "POST"])
 def edit_customer(customer_id):
     """
     Handle editing of a customer from admin dashboard.
 
     GET: Display the edit customer form
-    POST: Process customer update
+    POST: Process customer update, unless the customer changed since the
+        form was rendered (409 with the differences, as in edit_booking)
 
     Args:
         customer_id (int): The ID of the customer to edit
@@ -1090,7 +2360,7 @@ def edit_customer(customer_id):
     Returns:
         str: Rendered edit template or redirect to customers list
     """
-    if not app.config.get("TESTING") and session.get("role") != "admin":
+    if not current_app.config.get("TESTING") and session.get("role") != "admin":
         return redirect(url_for("admin_login"))
 
     conn = None
@@ -1108,41 +2378,45 @@ def edit_customer(customer_id):
                 flash("Name, last name and email are required.", "error")
                 return redirect(url_for("edit_customer", customer_id=customer_id))
 
+            version = _form_version()
+            if version is None:
+                flash("This form is out of date; please review the customer again.", "error")
+                return redirect(url_for("edit_customer", customer_id=customer_id))
+
             cur.execute(
                 """
                 UPDATE customers
                 SET name = %s, last_name = %s, email = %s, phone = %s
-                WHERE customer_id = %s
+                WHERE customer_id = %s AND version = %s
+                RETURNING version
                 """,
-                (new_name, new_last_name, new_email, new_phone, customer_id),
+                (new_name, new_last_name, new_email, new_phone, customer_id, version),
             )
-            conn.commit()
+            if cur.fetchone() is None:
+                conn.rollback()
+                submitted = {"name": new_name, "last_name": new_last_name,
+                             "email": new_email, "phone": new_phone}
+                conflict = _customer_conflict(cur, customer_id, submitted)
+                if conflict is not None:
+                    return conflict
+            else:
+                conn.commit()
+                mark_primary_write()
+                audit_admin_change("update", "customer", customer_id, name=new_name,
+                                   last_name=new_last_name, email=new_email, phone=new_phone)
             flash("Customer updated successfully!", "success")
             return redirect(url_for("admin_customers"))
 
         # GET: fetch current customer data
-        cur.execute(
-            """
-            SELECT customer_id, name, last_name, email, phone
-            FROM customers
-            WHERE customer_id = %s
-            """,
-            (customer_id,),
-        )
-        row = cur.fetchone()
+        customer_data = _load_customer(cur, customer_id)
 
-        if not row:
+        if not customer_data:
             return "Customer not found", 404
 
-        customer_data = {
-            "id": row[0],
-            "name": row[1],
-            "last_name": row[2],
-            "email": row[3],
-            "phone": row[4],
-        }
         return render_template("edit_customer.html", customer=customer_data)
 
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         if conn:
             conn.rollback()
@@ -1153,6 +2427,231 @@ def edit_customer(customer_id):
             conn.close()
 
 
+# ---------- ADMIN AUDIT TRAIL ----------
+AUDIT_ENTITIES = ("booking", "customer", "course", "module")
+AUDIT_PAGE_SIZE = 200
+
+
+def audit_admin_change(action, entity, entity_id, **details):
+    """Buffer an audit event for the logged-in admin; call after commit."""
+    audit.record(session.get("user"), action, entity, entity_id, details)
+
+
+@route("/admin/audit")
+def audit_log():
+    """
+    Browse the audit trail, filtered by entity, id and date range.
+
+    Query args: entity, entity_id, since and until (YYYY-MM-DD, until is
+    exclusive). Flushes this worker's buffer first so an admin's own
+    recent changes are visible.
+    """
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    filters = {
+        "entity": request.args.get("entity", ""),
+        "entity_id": request.args.get("entity_id", "").strip(),
+        "since": request.args.get("since", ""),
+        "until": request.args.get("until", ""),
+    }
+    if filters["entity"] not in AUDIT_ENTITIES:
+        filters["entity"] = ""
+    if not filters["entity_id"].isdigit():
+        filters["entity_id"] = ""
+    try:
+        since = date.fromisoformat(filters["since"]) if filters["since"] else None
+        until = date.fromisoformat(filters["until"]) if filters["until"] else None
+    except ValueError:
+        flash("Dates must look like YYYY-MM-DD.", "error")
+        since = until = None
+
+    try:
+        audit.trail.flush()
+    except Exception as e:
+        logger.warning("Audit flush before query failed: %s", e)
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        rows = audit.query(
+            cur,
+            entity=filters["entity"] or None,
+            entity_id=int(filters["entity_id"]) if filters["entity_id"] else None,
+            since=since,
+            until=until,
+            limit=AUDIT_PAGE_SIZE,
+        )
+        events = [
+            {"at": r[0], "actor": r[1], "action": r[2], "entity": r[3],
+             "entity_id": r[4], "details": r[5]}
+            for r in rows
+        ]
+        return render_template(
+            "audit_log.html", events=events, filters=filters, entities=AUDIT_ENTITIES
+        )
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        return f"Error loading audit log: {e}", 500
+    finally:
+        if conn:
+            conn.close()
+
+
+# ---------- ADMIN ANALYTICS ----------
+ANALYTICS_WEEKS = 12
+
+
+@route("/admin/analytics")
+def admin_analytics():
+    """Analytics page; the charts load their data from admin_analytics_data."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        cur = conn.cursor()
+        refreshes = analytics.last_refreshes(cur)
+        return render_template(
+            "admin_analytics.html", views=analytics.VIEWS, refreshes=refreshes
+        )
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        return f"Error loading analytics: {e}", 500
+    finally:
+        if conn:
+            conn.close()
+
+
+@route("/admin/analytics.json")
+def admin_analytics_data():
+    """
+    Chart payloads read from the analytics materialized views.
+
+    Nothing is aggregated here; the views only change when refreshed, so
+    browsers may reuse the response for a minute.
+    """
+    if session.get("role") != "admin":
+        return jsonify({"error": "Admin login required."}), 403
+
+    conn = None
+    try:
+        conn = get_db_connection(readonly=True)
+        cur = conn.cursor()
+        payload = {
+            "course_weekly": analytics.course_weekly_chart(cur, weeks=ANALYTICS_WEEKS),
+            "module_popularity": analytics.module_popularity_chart(cur),
+            "conversion": analytics.conversion_chart(cur, weeks=ANALYTICS_WEEKS),
+        }
+        return current_app.response_class(
+            analytics.to_json(payload),
+            mimetype="application/json",
+            headers={"Cache-Control": "private, max-age=60"},
+        )
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        logger.error("Analytics data error: %s", e)
+        return jsonify({"error": "Analytics are unavailable right now."}), 500
+    finally:
+        if conn:
+            conn.close()
+
+
+@route("/admin/analytics/refresh", methods=["POST"])
+def refresh_analytics():
+    """Queue a refresh of every analytics view for the jobs worker."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        jobs.enqueue(cur, "refresh_analytics", {})
+        conn.commit()
+        flash("Analytics refresh queued.", "success")
+    except DB_UNAVAILABLE:
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        flash(f"Could not queue analytics refresh: {e}", "error")
+    finally:
+        if conn:
+            conn.close()
+    return redirect(url_for("admin_analytics"))
+
+
+# ---------- ADMIN PROFILER ----------
+def _profile_store():
+    config = current_app.config
+    return profiling.ProfileStore(config["PROFILE_DIR"], config["PROFILE_MAX_FILES"])
+
+
+def start_profiling():
+    """Sample this request's stack when an admin asks with ?_profile=1."""
+    if not profiling.requested(request):
+        return
+    if session.get("role") != "admin" or not current_app.config["PROFILING_ENABLED"]:
+        return
+    interval = current_app.config["PROFILE_INTERVAL_MS"] / 1000
+    g.profiler = profiling.Sampler(threading.get_ident(), interval).start()
+
+
+def finish_profiling(response):
+    """Save the finished profile and point to it with X-Profile-Id."""
+    sampler = g.pop("profiler", None)
+    if sampler is None:
+        return response
+    sampler.stop()
+    try:
+        profile_id = _profile_store().save(
+            sampler,
+            endpoint=request.endpoint,
+            method=request.method,
+            path=request.full_path.rstrip("?"),
+            status=response.status_code,
+            admin=session.get("user"),
+        )
+        response.headers["X-Profile-Id"] = profile_id
+    except OSError as e:
+        logger.error("Could not save profile: %s", e)
+    return response
+
+
+def discard_profiling(error):
+    """Stop a sampler left running when the response never completed."""
+    sampler = g.pop("profiler", None)
+    if sampler is not None:
+        sampler.stop()
+
+
+@route("/admin/profiles")
+def admin_profiles():
+    """List saved request profiles, newest first."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+    return render_template("admin_profiles.html", profiles=_profile_store().summaries())
+
+
+@route("/admin/profiles/<profile_id>.folded")
+def download_profile(profile_id):
+    """Collapsed stacks for flamegraph.pl, inferno or speedscope."""
+    if session.get("role") != "admin":
+        return redirect(url_for("admin_login"))
+    if not profiling.PROFILE_ID_RE.match(profile_id):
+        return "Profile not found", 404
+    return send_from_directory(
+        current_app.config["PROFILE_DIR"], f"{profile_id}.folded",
+        mimetype="text/plain", as_attachment=True,
+    )
+
+
 # ---------- DEBUG DB DUMP (admin-only) ----------
 _ALLOWED_TABLES = {
     "customers", "admins", "bookings", "courses",
@@ -1160,7 +2659,7 @@ _ALLOWED_TABLES = {
 }
 
 
-@app.route("/debug/db-dump")
+@route("/debug/db-dump")
 def db_dump():
     """
     Dump all database tables for debugging — admin only.
@@ -1200,6 +2699,8 @@ def db_dump():
             db_content[table] = {"columns": columns, "rows": rows}
 
         cur.close()
+    except DB_UNAVAILABLE:
+        raise
     except Exception as e:
         return f"Error dumping database: {str(e)}", 500
     finally:
@@ -1209,5 +2710,192 @@ def db_dump():
     return render_template("db_dump.html", db_content=db_content)
 
 
+# ---------- CLI COMMANDS ----------
+@click.command("db-upgrade")
+def db_upgrade_command():
+    """Apply pending SQL migrations from migrations/."""
+    conn = get_db_connection()
+    try:
+        applied = db.apply_migrations(conn)
+    finally:
+        conn.close()
+    for version in applied:
+        click.echo(f"Applied {version}")
+    if not applied:
+        click.echo("Database is up to date.")
+
+
+@click.command("catalog-purge")
+@click.option("--older-than-days", default=30, show_default=True,
+              help="Only purge rows archived at least this long ago.")
+@click.option("--batch-size", default=500, show_default=True,
+              help="Rows deleted per transaction.")
+def catalog_purge_command(older_than_days, batch_size):
+    """Delete archived courses and modules that no booking refers to."""
+    conn = get_db_connection()
+    try:
+        modules, courses = purge_archived(conn, older_than_days, batch_size)
+    finally:
+        conn.close()
+    click.echo(f"Purged {modules} module(s) and {courses} course(s).")
+
+
+# ---------- APPLICATION FACTORY ----------
+# Settings create_app() applies to process-wide state: the DB pools and
+# circuit breaker in db.py, the audit buffer and the logging pipeline.
+PROCESS_SETTINGS = (
+    "DATABASE_URL", "REPLICA_DATABASE_URL", "DB_POOL_MAX", "DB_POOL_TIMEOUT",
+    "DB_CONNECT_TIMEOUT", "REPLICA_RETRY_SECONDS",
+    "CIRCUIT_WINDOW", "CIRCUIT_MIN_CALLS", "CIRCUIT_FAILURE_RATE", "CIRCUIT_SLOW_RATE",
+    "CIRCUIT_SLOW_MS", "CIRCUIT_RESET_SECONDS", "CIRCUIT_HALF_OPEN_PROBES",
+    "AUDIT_ENABLED", "AUDIT_BATCH_SIZE", "AUDIT_FLUSH_SECONDS", "AUDIT_MAX_PENDING",
+    "LOG_LEVEL", "LOG_FORMAT", "LOG_SAMPLE_RATE", "LOG_QUEUE_SIZE",
+)
+_process_settings = None
+
+
+def create_app(config=None, replace=False):
+    """
+    Build and configure a Flask application.
+
+    Nothing here opens a socket: the DB pool is only configured and is built
+    lazily per process, so the app can be preloaded in the gunicorn master
+    and forked into workers safely.
+
+    There is one application configuration per process. The pools, circuit
+    breaker, audit buffer and logging pipeline are module-level singletons
+    that the job worker and the audit thread use outside any request, so a
+    second app with other PROCESS_SETTINGS would silently take them over
+    from the first. That raises instead, unless ``replace`` says the switch
+    is deliberate; the old pools are then closed. A second app with the
+    same settings shares the existing state.
+
+    Args:
+        config (type): A config.py class; defaults to the one for FLASK_ENV.
+        replace (bool): Reconfigure the process-wide state for this app.
+
+    Returns:
+        Flask: The configured application
+
+    Raises:
+        RuntimeError: The process is already configured with other settings
+    """
+    global _process_settings
+    config = config or config_for_env()
+    flask_app = Flask(__name__)
+    flask_app.config.from_object(config)
+    flask_app.config["DATABASE_URL"] = config.get_database_url()
+
+    production = issubclass(config, ProductionConfig)
+    if production and flask_app.config["SECRET_KEY"] == DEFAULT_SECRET_KEY:
+        raise ValueError("No SECRET_KEY set !")
+
+    settings = {key: flask_app.config[key] for key in PROCESS_SETTINGS}
+    if _process_settings is not None and settings != _process_settings and not replace:
+        changed = [key for key in PROCESS_SETTINGS if settings[key] != _process_settings[key]]
+        raise RuntimeError(
+            "create_app() already configured this process with other settings "
+            f"({', '.join(changed)}); pass replace=True to switch deliberately"
+        )
+
+    csrf.init_app(flask_app)
+    talisman.init_app(
+        flask_app,
+        content_security_policy=CSP_POLICY,
+        force_https=production,
+        strict_transport_security=production,
+        strict_transport_security_max_age=31536000,
+        strict_transport_security_include_subdomains=True,
+        x_content_type_options=True,
+        referrer_policy="strict-origin-when-cross-origin",
+        frame_options="DENY",
+    )
+    flask_app.before_request(assign_request_id)
+    flask_app.before_request(start_request_metrics)
+    flask_app.before_request(start_profiling)
+    flask_app.before_request(circuit_breaker_gate)
+    flask_app.after_request(finish_profiling)
+    flask_app.after_request(set_security_headers)
+    flask_app.after_request(echo_request_id)
+    flask_app.after_request(record_response_status)
+    flask_app.teardown_request(discard_profiling)
+    flask_app.teardown_request(finish_circuit_trial)
+    flask_app.teardown_request(finish_request)
+    flask_app.register_error_handler(db.CircuitOpenError, service_unavailable)
+    flask_app.register_error_handler(db.PoolTimeout, service_unavailable)
+
+    for rule, options, view in _ROUTES:
+        flask_app.add_url_rule(rule, view_func=view, **options)
+
+    flask_app.cli.add_command(db_upgrade_command)
+    flask_app.cli.add_command(catalog_purge_command)
+    flask_app.cli.add_command(jobs.worker_command)
+    flask_app.cli.add_command(analytics.refresh_command)
+
+    if settings != _process_settings:
+        _configure_process(flask_app.config)
+        _process_settings = settings
+    return flask_app
+
+
+def _configure_process(app_config):
+    """Apply an app's PROCESS_SETTINGS to the process-wide singletons."""
+    if _process_settings is not None:
+        db.close_pools()
+    logs.configure(
+        level=app_config["LOG_LEVEL"],
+        fmt=app_config["LOG_FORMAT"],
+        sample_rate=app_config["LOG_SAMPLE_RATE"],
+        queue_size=app_config["LOG_QUEUE_SIZE"],
+    )
+    audit.trail.configure(
+        batch_size=app_config["AUDIT_BATCH_SIZE"],
+        flush_interval=app_config["AUDIT_FLUSH_SECONDS"],
+        max_pending=app_config["AUDIT_MAX_PENDING"],
+        enabled=app_config["AUDIT_ENABLED"],
+    )
+
+    db.connection_pool.configure(
+        app_config["DATABASE_URL"],
+        maxconn=app_config["DB_POOL_MAX"],
+        acquire_timeout=app_config["DB_POOL_TIMEOUT"],
+        connect_timeout=app_config["DB_CONNECT_TIMEOUT"],
+    )
+    db.replica_pool.configure(
+        app_config["REPLICA_DATABASE_URL"],
+        maxconn=app_config["DB_POOL_MAX"],
+        acquire_timeout=app_config["DB_POOL_TIMEOUT"],
+        connect_timeout=app_config["DB_CONNECT_TIMEOUT"],
+    )
+    db.replica_breaker.configure(
+        reset_timeout=app_config["REPLICA_RETRY_SECONDS"], **db.REPLICA_BREAKER_SETTINGS
+    )
+    db.breaker.configure(
+        window=app_config["CIRCUIT_WINDOW"],
+        min_calls=app_config["CIRCUIT_MIN_CALLS"],
+        failure_rate=app_config["CIRCUIT_FAILURE_RATE"],
+        slow_rate=app_config["CIRCUIT_SLOW_RATE"],
+        slow_ms=app_config["CIRCUIT_SLOW_MS"],
+        reset_timeout=app_config["CIRCUIT_RESET_SECONDS"],
+        half_open_probes=app_config["CIRCUIT_HALF_OPEN_PROBES"],
+    )
+
+
+def reset_worker_state():
+    """
+    Discard per-process state inherited from the gunicorn master.
+
+    Called from the post_fork hook in gunicorn.conf.py so connection pools
+    and caches are rebuilt inside each worker instead of being shared.
+    """
+    db.reset_pools()
+    readiness.reset()
+    audit.trail.reset()
+    logs.pipeline.reset()
+
+
+app = create_app()
+
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,218 @@
+"""
+Buffered audit trail of admin changes for the Ghibli Movie Booking System.
+
+Admin views call ``record()`` after their transaction commits. Events are
+only appended to an in-process buffer, so recording costs the request
+nothing but a lock. A background thread writes the buffer to ``audit_log``
+with a single ``COPY`` whenever it holds ``batch_size`` events or
+``flush_interval`` seconds have passed, and ``close()`` drains it when the
+process exits (atexit, or gunicorn's worker_exit hook).
+
+Trade-off: events still in the buffer are lost if the process is killed
+hard (SIGKILL, OOM). If the database is unreachable they are kept and
+retried, up to ``max_pending`` events; beyond that the oldest are dropped.
+"""
+
+import atexit
+import csv
+import io
+import json
+import logging
+import threading
+from datetime import datetime, timezone
+
+import db
+
+logger = logging.getLogger(__name__)
+
+COPY_SQL = (
+    "COPY audit_log (occurred_at, actor, action, entity, entity_id, details) "
+    "FROM STDIN WITH (FORMAT csv)"
+)
+
+
+class AuditTrail:
+    """
+    Thread-safe, fork-aware buffer of audit events.
+
+    Args:
+        batch_size (int): Buffered events that trigger an early flush
+        flush_interval (float): Max seconds an event waits in the buffer
+        max_pending (int): Events kept while the database is unreachable
+        enabled (bool): When False, record() is a no-op
+    """
+
+    def __init__(self, batch_size=100, flush_interval=2.0, max_pending=10000, enabled=True):
+        self.configure(batch_size, flush_interval, max_pending, enabled)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events = []
+        self._thread = None
+        self._closing = False
+        self._atexit_registered = False
+
+    def configure(self, batch_size=100, flush_interval=2.0, max_pending=10000, enabled=True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.enabled = enabled
+
+    def record(self, actor, action, entity, entity_id=None, details=None):
+        """
+        Buffer one event; never touches the database.
+
+        Args:
+            actor (str): Who made the change (the admin's session user)
+            action (str): What happened, e.g. "update" or "bulk_approve"
+            entity (str): Kind of record changed, e.g. "booking"
+            entity_id (int): Primary key of the changed record, if any
+            details (dict): JSON-serialisable extra context
+        """
+        if not self.enabled:
+            return
+        event = (
+            datetime.now(timezone.utc).isoformat(),
+            actor, action, entity, entity_id,
+            json.dumps(details or {}, default=str),
+        )
+        with self._lock:
+            self._events.append(event)
+            full = len(self._events) >= self.batch_size
+            if self._thread is None:
+                self._start()
+        if full:
+            self._wake.set()
+
+    def pending(self):
+        """Number of events waiting to be written."""
+        with self._lock:
+            return len(self._events)
+
+    def _start(self):
+        # Called with self._lock held, lazily, so nothing runs in the
+        # gunicorn master before workers fork.
+        self._closing = False
+        self._thread = threading.Thread(
+            target=self._run, name="audit-flusher", daemon=True
+        )
+        self._thread.start()
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+
+    def _run(self):
+        while not self._closing:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Audit flush failed: %s", e)
+
+    def flush(self):
+        """
+        Write every buffered event in one COPY.
+
+        Returns:
+            int: Number of events written
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._events = self._events, []
+            if not batch:
+                return 0
+
+            data = io.StringIO()
+            csv.writer(data).writerows(batch)
+            data.seek(0)
+            try:
+                conn = db.connection_pool.getconn()
+                try:
+                    conn.cursor().copy_expert(COPY_SQL, data)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.close()
+            except Exception:
+                self._requeue(batch)
+                raise
+            return len(batch)
+
+    def _requeue(self, batch):
+        with self._lock:
+            self._events = batch + self._events
+            overflow = len(self._events) - self.max_pending
+            if overflow > 0:
+                del self._events[:overflow]
+                logger.error("Audit buffer full; dropped %s oldest event(s)", overflow)
+
+    def close(self, timeout=5.0):
+        """Stop the flusher thread and write whatever is still buffered."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._closing = True
+        self._wake.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error("Audit events lost at shutdown (%s): %s", self.pending(), e)
+
+    def reset(self):
+        """Forget the master's buffer and thread in a freshly forked worker."""
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._events = []
+        self._thread = None
+        self._closing = False
+
+
+def query(cur, entity=None, entity_id=None, since=None, until=None, limit=200):
+    """
+    Fetch audit events, newest first, filtered by entity and time range.
+
+    Only the filters that are set end up in the WHERE clause, so each
+    combination can use the (entity, entity_id, occurred_at) index or the
+    BRIN index on occurred_at.
+
+    Returns:
+        list: (occurred_at, actor, action, entity, entity_id, details) rows
+    """
+    clauses, params = [], {"limit": limit}
+    if entity:
+        clauses.append("entity = %(entity)s")
+        params["entity"] = entity
+    if entity_id is not None:
+        clauses.append("entity_id = %(entity_id)s")
+        params["entity_id"] = entity_id
+    if since:
+        clauses.append("occurred_at >= %(since)s")
+        params["since"] = since
+    if until:
+        clauses.append("occurred_at < %(until)s")
+        params["until"] = until
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    cur.execute(
+        f"""
+        SELECT occurred_at, actor, action, entity, entity_id, details
+        FROM audit_log
+        {where}
+        ORDER BY occurred_at DESC, audit_id DESC
+        LIMIT %(limit)s
+        """,
+        params,
+    )
+    return cur.fetchall()
+
+
+trail = AuditTrail()
+
+
+def record(actor, action, entity, entity_id=None, details=None):
+    """Buffer an event on the process-wide trail."""
+    trail.record(actor, action, entity, entity_id, details)
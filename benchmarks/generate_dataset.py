@@ -0,0 +1,328 @@
+"""
+Fill a database with a large synthetic dataset for scale testing.
+
+Creates ``--courses`` courses with 2-12 modules each, then ``--customers``
+customers with their bookings and booking_modules. The distributions are
+meant to look like real traffic:
+
+- Course popularity is Zipf-skewed: a few courses take most bookings.
+- Bookings cluster in bursts (enrolment openings) on top of a steady
+  background.
+- Most customers book soon after registering, some never book, a few
+  book many courses.
+- Modules per booking vary from none to all of the course's modules.
+
+Rows are written with COPY, not INSERT. Customers are generated in
+batches of ``--batch-size``, and ``--workers`` processes each COPY whole
+batches over their own connection. Every batch draws from its own random
+generator, seeded from ``--seed`` and the batch number. The same seed and
+size therefore always give the same data, whatever the number of workers.
+Primary keys are reserved in blocks from the identity sequences, so the
+workers can COPY rows that reference each other without round trips.
+
+Passwords are not hashed per row. ``--password`` is hashed once and every
+synthetic customer shares that hash, so each can log in with it
+(worker_classes.py logs its clients in this way).
+
+Generated rows are tagged with ``--tag`` in emails and course names, so
+several datasets can coexist. Nothing is cleaned up afterwards.
+
+Needs DATABASE_URL pointing at a database migrated with ``flask db-upgrade``.
+
+Usage:
+    python benchmarks/generate_dataset.py --customers 1000000 --workers 8
+    python benchmarks/generate_dataset.py --customers 50000 --seed 7 --tag small
+"""
+
+import argparse
+import csv
+import io
+import math
+import multiprocessing
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+from werkzeug.security import generate_password_hash
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+
+NOW = datetime(2025, 6, 30, tzinfo=timezone.utc)
+HISTORY_DAYS = 730
+BURSTS = 24
+BURST_SHARE = 0.4
+ZIPF_EXPONENT = 1.1
+# Bookings per customer (0 = registered but never booked).
+BOOKINGS_PER_CUSTOMER = [(0, 25), (1, 40), (2, 18), (3, 9), (4, 4), (5, 2), (8, 1), (12, 1)]
+STATUSES = [("approved", 70), ("pending", 20), ("cancelled", 10)]
+FIRST_NAMES = ["Chihiro", "Sophie", "Howl", "Kiki", "Satsuki", "Mei", "Pazu", "Sheeta",
+               "Ashitaka", "San", "Nausicaa", "Porco", "Arrietty", "Shizuku", "Marnie"]
+LAST_NAMES = ["Ogino", "Hatter", "Jenkins", "Kusakabe", "Okino", "Tsukishima",
+              "Honjo", "Hayashi", "Sasaki", "Fujimoto", "Kondo", "Takahashi"]
+REQUESTS = ["Vegetarian lunch", "Wheelchair access", "Left-handed desk",
+            "Sketchbook provided", "Evening session if possible"]
+
+
+def _connect():
+    return psycopg2.connect(**db.connect_kwargs(os.environ["DATABASE_URL"]))
+
+
+def _copy(cur, table, columns, rows):
+    """COPY rows (an iterable of tuples, None for NULL) into table."""
+    data = io.StringIO()
+    csv.writer(data).writerows(rows)
+    data.seek(0)
+    cur.copy_expert(
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '')", data
+    )
+
+
+def reserve_ids(cur, table, column, count):
+    """
+    Take ``count`` consecutive ids from the table's identity sequence.
+
+    The table lock (which plain INSERTs wait for, but readers do not) only
+    lasts for this short transaction, so no concurrent insert can draw an
+    id from the middle of the block.
+
+    Returns:
+        int: The first id of the block
+    """
+    if count == 0:
+        return 0
+    cur.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE")
+    cur.execute(
+        "SELECT setval(pg_get_serial_sequence(%s, %s), nextval(pg_get_serial_sequence(%s, %s))"
+        " + %s - 1)",
+        (table, column, table, column, count),
+    )
+    last = cur.fetchone()[0]
+    cur.connection.commit()
+    return last - count + 1
+
+
+def _weighted(rng, pairs):
+    values, weights = zip(*pairs)
+    return rng.choices(values, weights)[0]
+
+
+# ---------- CATALOG ----------
+def create_catalog(conn, courses, seed, tag):
+    """
+    COPY the courses and their modules.
+
+    Returns:
+        list: (course_id, [module_id, ...], popularity weight) per course
+    """
+    rng = random.Random(f"{seed}:catalog")
+    cur = conn.cursor()
+    first_course = reserve_ids(cur, "courses", "course_id", courses)
+    module_counts = [rng.randint(2, 12) for _ in range(courses)]
+    first_module = reserve_ids(cur, "course_modules", "module_id", sum(module_counts))
+
+    course_rows, module_rows, catalog = [], [], []
+    module_id = first_module
+    for i, module_count in enumerate(module_counts):
+        course_id = first_course + i
+        created = NOW - timedelta(days=HISTORY_DAYS + rng.randint(0, 90))
+        course_rows.append((
+            course_id, f"{tag} course {i + 1}",
+            f"Synthetic course {i + 1} with {module_count} modules", True, created,
+        ))
+        module_ids = []
+        for order in range(1, module_count + 1):
+            module_rows.append((
+                module_id, course_id, f"Module {order}",
+                f"Part {order} of synthetic course {i + 1}", order, True,
+            ))
+            module_ids.append(module_id)
+            module_id += 1
+        catalog.append((course_id, module_ids))
+
+    _copy(cur, "courses",
+          ("course_id", "course_name", "description", "active", "created_at"), course_rows)
+    _copy(cur, "course_modules",
+          ("module_id", "course_id", "module_name", "module_description", "module_order",
+           "active"), module_rows)
+    conn.commit()
+
+    # Popularity rank is shuffled so it does not simply follow course_id.
+    ranks = list(range(1, courses + 1))
+    rng.shuffle(ranks)
+    return [(course_id, module_ids, 1 / rank ** ZIPF_EXPONENT)
+            for (course_id, module_ids), rank in zip(catalog, ranks)]
+
+
+def burst_centres(seed):
+    rng = random.Random(f"{seed}:bursts")
+    return sorted(NOW - timedelta(days=rng.uniform(0, HISTORY_DAYS)) for _ in range(BURSTS))
+
+
+# ---------- CUSTOMERS AND BOOKINGS ----------
+def generate_batch(batch, batch_size, total, seed, tag, catalog, bursts):
+    """
+    Build one batch of customers with their bookings, without ids.
+
+    Returns:
+        tuple: (customers, bookings, booking_modules). Bookings reference
+        their customer by position in the batch and booking_modules their
+        booking by position, so ids can be assigned after reserving.
+    """
+    rng = random.Random(f"{seed}:batch:{batch}")
+    course_ids = [course_id for course_id, _, _ in catalog]
+    weights = [weight for _, _, weight in catalog]
+    modules_of = {course_id: module_ids for course_id, module_ids, _ in catalog}
+
+    customers, bookings, booking_modules = [], [], []
+    start = batch * batch_size
+    for n in range(start, min(start + batch_size, total)):
+        registered = NOW - timedelta(seconds=rng.uniform(0, HISTORY_DAYS * 86400))
+        customers.append((
+            rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+            f"{tag}-{n + 1}@example.invalid", f"555-{rng.randint(0, 9999):04d}", registered,
+        ))
+
+        wanted = min(_weighted(rng, BOOKINGS_PER_CUSTOMER), len(course_ids))
+        # A dict, not a set: iteration order must not depend on the ids.
+        chosen = {}
+        for _ in range(wanted * 4):
+            if len(chosen) == wanted:
+                break
+            chosen[rng.choices(course_ids, weights)[0]] = None
+
+        for course_id in chosen:
+            if rng.random() < BURST_SHARE:
+                submitted = rng.choice(bursts) + timedelta(hours=rng.gauss(0, 36))
+            else:
+                # Most first bookings come within days of registering.
+                submitted = registered + timedelta(days=rng.expovariate(1 / 20))
+            submitted = min(max(submitted, registered), NOW)
+            status = _weighted(rng, STATUSES)
+            if NOW - submitted < timedelta(days=14) and status == "approved":
+                status = "pending"
+            updated = submitted if status == "pending" else min(
+                submitted + timedelta(hours=rng.expovariate(1 / 30)), NOW
+            )
+            extra = rng.choice(REQUESTS) if rng.random() < 0.15 else None
+            bookings.append((len(customers) - 1, course_id, status, extra, submitted, updated))
+
+            modules = modules_of[course_id]
+            picked = rng.sample(modules, rng.randint(0, len(modules)))
+            booking_modules.extend((len(bookings) - 1, module_id) for module_id in picked)
+
+    return customers, bookings, booking_modules
+
+
+_worker_conn = None
+_worker_args = None
+
+
+def _init_worker(args):
+    global _worker_args
+    _worker_args = args
+
+
+def copy_batch(conn, customers, bookings, booking_modules, password_hash):
+    """Reserve ids for one generated batch and COPY it in a single transaction."""
+    cur = conn.cursor()
+    first_customer = reserve_ids(cur, "customers", "customer_id", len(customers))
+    first_booking = reserve_ids(cur, "bookings", "booking_id", len(bookings))
+    _copy(cur, "customers",
+          ("customer_id", "name", "last_name", "email", "phone", "created_at", "password"),
+          ((first_customer + i, *row, password_hash) for i, row in enumerate(customers)))
+    _copy(cur, "bookings",
+          ("booking_id", "customer_id", "course_id", "status", "nice_to_have_requests",
+           "submitted_at", "updated_at"),
+          ((first_booking + i, first_customer + customer, *rest)
+           for i, (customer, *rest) in enumerate(bookings)))
+    _copy(cur, "booking_modules", ("booking_id", "module_id"),
+          ((first_booking + booking, module_id) for booking, module_id in booking_modules))
+    conn.commit()
+    return len(customers), len(bookings), len(booking_modules)
+
+
+def load_batch(batch):
+    """Generate one batch in a pool worker and COPY it; return row counts."""
+    global _worker_conn
+    if _worker_conn is None:
+        _worker_conn = _connect()
+    (batch_size, total, seed, tag, catalog, bursts, password_hash) = _worker_args
+    return copy_batch(
+        _worker_conn,
+        *generate_batch(batch, batch_size, total, seed, tag, catalog, bursts),
+        password_hash,
+    )
+
+
+def populate(conn, customers, courses=200, seed=1, tag="synth", batch_size=10_000,
+             password="synthetic"):
+    """
+    Load a dataset over one connection, without worker processes.
+
+    Produces the same rows as the command line for the same arguments; the
+    test suite uses it to seed small databases.
+    """
+    password_hash = generate_password_hash(password)
+    catalog = create_catalog(conn, courses, seed, tag)
+    bursts = burst_centres(seed)
+    for batch in range(math.ceil(customers / batch_size)):
+        copy_batch(conn, *generate_batch(batch, batch_size, customers, seed, tag, catalog,
+                                         bursts), password_hash)
+    analyze(conn)
+
+
+def analyze(conn):
+    """Refresh planner statistics on every table the generator fills."""
+    cur = conn.cursor()
+    for table in ("courses", "course_modules", "customers", "bookings", "booking_modules"):
+        cur.execute(f"ANALYZE {table}")
+    conn.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--customers", type=int, default=100_000,
+                        help="Dataset size; bookings are about 1.5x this.")
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--tag", default="synth",
+                        help="Marks generated emails and course names.")
+    parser.add_argument("--password", default="synthetic")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    password_hash = generate_password_hash(args.password)
+
+    conn = _connect()
+    catalog = create_catalog(conn, args.courses, args.seed, args.tag)
+    conn.close()
+
+    batches = math.ceil(args.customers / args.batch_size)
+    worker_args = (args.batch_size, args.customers, args.seed, args.tag, catalog,
+                   burst_centres(args.seed), password_hash)
+    totals = [0, 0, 0]
+    with multiprocessing.Pool(args.workers, _init_worker, (worker_args,)) as pool:
+        for done, counts in enumerate(pool.imap_unordered(load_batch, range(batches)), 1):
+            totals = [t + c for t, c in zip(totals, counts)]
+            print(f"\rbatch {done}/{batches}: {totals[0]} customers, {totals[1]} bookings, "
+                  f"{totals[2]} booking modules", end="", flush=True)
+    print()
+
+    conn = _connect()
+    analyze(conn)
+    conn.close()
+    print(f"Done in {time.perf_counter() - started:.1f} s. "
+          f"Customers log in with password {args.password!r}; "
+          "run `flask analytics-refresh` to update the analytics views.")
+
+
+if __name__ == "__main__":
+    main()
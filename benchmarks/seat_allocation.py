@@ -0,0 +1,199 @@
+"""
+Hammer one capped course with concurrent bookings and check it never oversells.
+
+Creates a throwaway course with ``--capacity`` seats and ``--customers``
+throwaway customers, then has ``--threads`` workers book that course for
+every customer at once, using the same INSERT ... ON CONFLICT and
+allocate_seat() path as booking(). Runs once per shard count so the single
+hot row (``--shards 1``) can be compared with sharded counters.
+
+After each run it asserts that the number of seated bookings never exceeds
+the capacity and that seated bookings plus free seats add up to exactly the
+capacity. Everything it creates is removed afterwards.
+
+Needs DATABASE_URL pointing at a database migrated with ``flask db-upgrade``.
+
+Usage:
+    python benchmarks/seat_allocation.py --capacity 200 --customers 1000
+    python benchmarks/seat_allocation.py --threads 64 --shards 1 8 16
+"""
+
+import argparse
+import os
+import queue
+import statistics
+import sys
+import threading
+import time
+import uuid
+
+import psycopg2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+from app import allocate_seat, set_course_capacity  # noqa: E402
+
+
+def _connect():
+    return psycopg2.connect(**db.connect_kwargs(os.environ["DATABASE_URL"]))
+
+
+def setup(capacity, customers, shards):
+    """Create the course and customers; return (course_id, customer_ids, tag)."""
+    tag = uuid.uuid4().hex[:8]
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO courses (course_name, description, active, created_at)
+        VALUES (%s, 'seat allocation benchmark', TRUE, NOW())
+        RETURNING course_id
+        """,
+        (f"bench-seats-{tag}",),
+    )
+    course_id = cur.fetchone()[0]
+    cur.execute(
+        """
+        INSERT INTO customers (name, last_name, email, phone, password)
+        SELECT 'Bench', 'Customer', 'bench-seats-' || %s || '-' || g || '@example.invalid',
+               '000', 'x'
+        FROM generate_series(1, %s) AS g
+        RETURNING customer_id
+        """,
+        (tag, customers),
+    )
+    customer_ids = [row[0] for row in cur.fetchall()]
+    set_course_capacity(cur, course_id, capacity, shards)
+    conn.commit()
+    conn.close()
+    return course_id, customer_ids, tag
+
+
+def teardown(course_id, tag):
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM bookings WHERE course_id = %s", (course_id,))
+    cur.execute("DELETE FROM courses WHERE course_id = %s", (course_id,))
+    cur.execute("DELETE FROM customers WHERE email LIKE %s", (f"bench-seats-{tag}-%",))
+    conn.commit()
+    conn.close()
+
+
+def book(cur, customer_id, course_id):
+    """One booking() transaction body; returns True if a seat was taken."""
+    cur.execute(
+        """
+        INSERT INTO bookings
+        (customer_id, course_id, status, nice_to_have_requests, updated_at)
+        VALUES (%s, %s, 'pending', '', NOW())
+        ON CONFLICT (customer_id, course_id) DO NOTHING
+        RETURNING booking_id
+        """,
+        (customer_id, course_id),
+    )
+    row = cur.fetchone()
+    if not row:
+        return False
+    if allocate_seat(cur, row[0], course_id) is None:
+        cur.execute("DELETE FROM bookings WHERE booking_id = %s", (row[0],))
+        return False
+    return True
+
+
+def run(capacity, customers, threads, shards):
+    course_id, customer_ids, tag = setup(capacity, customers, shards)
+    work = queue.Queue()
+    for customer_id in customer_ids:
+        work.put(customer_id)
+    latencies, seated, errors = [], [], []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads + 1)
+
+    def worker():
+        conn = _connect()
+        cur = conn.cursor()
+        start_gate.wait()
+        while True:
+            try:
+                customer_id = work.get_nowait()
+            except queue.Empty:
+                break
+            started = time.perf_counter()
+            try:
+                ok = book(cur, customer_id, course_id)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append((time.perf_counter() - started) * 1000)
+                if ok:
+                    seated.append(customer_id)
+        conn.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for t in pool:
+        t.start()
+    start_gate.wait()
+    began = time.perf_counter()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - began
+
+    conn = _connect()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT count(*) FROM bookings WHERE course_id = %s AND seat_shard IS NOT NULL",
+        (course_id,),
+    )
+    booked = cur.fetchone()[0]
+    cur.execute(
+        "SELECT COALESCE(SUM(seats_left), 0) FROM course_seat_shards WHERE course_id = %s",
+        (course_id,),
+    )
+    free = cur.fetchone()[0]
+    conn.close()
+    teardown(course_id, tag)
+
+    assert booked <= capacity, f"oversold: {booked} bookings for {capacity} seats"
+    assert booked + free == capacity, f"seats leaked: {booked} booked + {free} free"
+    assert booked == len(seated), "booked rows disagree with successful bookings"
+    assert booked == min(capacity, customers) or errors, "seats left unsold"
+
+    for error in sorted(set(errors))[:3]:
+        print(f"  error: {error.strip()}")
+    latencies.sort()
+    return {
+        "shards": shards,
+        "booked": booked,
+        "free": free,
+        "errors": len(errors),
+        "req_s": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p99": latencies[int(len(latencies) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--capacity", type=int, default=200)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    print(f"{'shards':>6} {'booked':>7} {'free':>5} {'errors':>6} "
+          f"{'req/s':>8} {'p50 ms':>7} {'p99 ms':>7}")
+    for shards in args.shards:
+        r = run(args.capacity, args.customers, args.threads, shards)
+        print(f"{r['shards']:>6} {r['booked']:>7} {r['free']:>5} {r['errors']:>6} "
+              f"{r['req_s']:>8.0f} {r['p50']:>7.1f} {r['p99']:>7.1f}")
+    print("No course oversold.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+Compare gunicorn worker classes on the booking and dashboard request mix.
+
+Starts gunicorn once per worker class using gunicorn.conf.py, logs a pool of
+simulated customers in, then drives a weighted mix of dashboard views,
+booking page views and booking submissions for a fixed duration. Reports
+throughput, latency percentiles and error counts per worker class.
+
+Every client is a different customer from a generate_dataset.py dataset
+(``--tag``) and books the catalog in its own shuffled order, so booking
+submissions insert rows instead of hitting the one-booking-per-course
+constraint. Each worker class gets its own block of ``--clients``
+customers, starting at ``--first-customer``; move that past the blocks of
+earlier runs to repeat a comparison on customers that booked nothing yet.
+
+Needs DATABASE_URL pointing at a database seeded with at least
+``--first-customer + clients * classes`` customers, e.g.
+
+    python benchmarks/generate_dataset.py --customers 10000 --tag bench
+
+Usage:
+    python benchmarks/worker_classes.py --duration 30 --clients 32
+    python benchmarks/worker_classes.py --classes sync gthread --first-customer 1000
+"""
+
+import argparse
+import itertools
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+import psycopg2
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import db  # noqa: E402
+
+CSRF_RE = re.compile(rb'name="csrf_token"\s+value="([^"]+)"')
+COURSE_RE = re.compile(rb'name="courses"\s+value="(\d+)"')
+
+# (weight, method, path) — dashboards dominate, bookings are the writes.
+REQUEST_MIX = [
+    (50, "GET", "/dashboard"),
+    (30, "GET", "/book"),
+    (20, "POST", "/book"),
+]
+
+
+class Client:
+    """One logged-in customer session with its own cookie jar."""
+
+    def __init__(self, base_url, email, password):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(CookieJar())
+        )
+        self.csrf_token = None
+        self.course_ids = []
+        self._login(email, password)
+        # Each customer books the catalog in its own order, one course per
+        # submission, so concurrent clients do not pile onto one course.
+        order = random.Random(email).sample(self.course_ids, len(self.course_ids))
+        self._next_courses = itertools.cycle(order)
+
+    def _fetch(self, method, path, form=None):
+        data = urllib.parse.urlencode(form, doseq=True).encode() if form else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method)
+        with self.opener.open(req, timeout=30) as resp:
+            return resp.status, resp.read()
+
+    def _login(self, email, password):
+        _, body = self._fetch("GET", "/login")
+        token = CSRF_RE.search(body).group(1).decode()
+        self._fetch("POST", "/login", {
+            "csrf_token": token, "email": email, "password": password,
+        })
+        _, body = self._fetch("GET", "/book")
+        self.csrf_token = CSRF_RE.search(body).group(1).decode()
+        self.course_ids = [c.decode() for c in COURSE_RE.findall(body)]
+
+    def request(self, method, path):
+        form = None
+        if method == "POST":
+            form = {
+                "csrf_token": self.csrf_token,
+                "courses": [next(self._next_courses)],
+                "extra": "benchmark",
+            }
+        return self._fetch(method, path, form)
+
+
+def _wait_until_up(base_url, deadline=30.0):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        try:
+            with urllib.request.urlopen(base_url + "/healthz", timeout=1):
+                return
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    raise RuntimeError("gunicorn did not become healthy in time")
+
+
+def customer_email(tag, n):
+    """Email of the n-th (1-based) customer generate_dataset.py made for ``tag``."""
+    return f"{tag}-{n}@example.invalid"
+
+
+def seeded_customers(tag):
+    """Number of customers generate_dataset.py created with ``tag``."""
+    conn = psycopg2.connect(**db.connect_kwargs(os.environ["DATABASE_URL"]))
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT count(*) FROM customers WHERE email LIKE %s",
+            (customer_email(tag, "%"),),
+        )
+        return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+
+def run_load(base_url, emails, duration, password):
+    """Drive the request mix, one thread per customer, for ``duration`` seconds."""
+    sessions = [Client(base_url, email, password) for email in emails]
+    weights = [w for w, _, _ in REQUEST_MIX]
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(client):
+        local, local_errors = [], 0
+        while time.monotonic() < stop_at:
+            _, method, path = random.choices(REQUEST_MIX, weights)[0]
+            started = time.perf_counter()
+            try:
+                client.request(method, path)
+                local.append(time.perf_counter() - started)
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                local_errors += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker, args=(s,)) for s in sessions]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    if not latencies:
+        return {"rps": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "errors": errors[0]}
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {
+        "rps": len(latencies) / duration,
+        "p50": statistics.median(latencies) * 1000,
+        "p95": pct(0.95),
+        "p99": pct(0.99),
+        "errors": errors[0],
+    }
+
+
+def bench_worker_class(worker_class, emails, args):
+    env = dict(os.environ)
+    env["GUNICORN_WORKER_CLASS"] = worker_class
+    env["GUNICORN_BIND"] = f"127.0.0.1:{args.port}"
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "--config", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        _wait_until_up(base_url)
+        return run_load(base_url, emails, args.duration, args.password)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--classes", nargs="+", default=["sync", "gthread", "gevent"])
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tag", default="bench",
+                        help="generate_dataset.py tag of the customers to log in as")
+    parser.add_argument("--first-customer", type=int, default=1)
+    parser.add_argument("--password", default=os.environ.get("BENCH_PASSWORD", "synthetic"),
+                        help="generate_dataset.py --password of that dataset")
+    args = parser.parse_args()
+
+    needed = args.first_customer - 1 + args.clients * len(args.classes)
+    available = seeded_customers(args.tag)
+    if available < needed:
+        parser.error(
+            f"{needed} '{args.tag}' customers needed, {available} found; run "
+            f"benchmarks/generate_dataset.py --customers {needed} --tag {args.tag}"
+        )
+
+    print(f"{'worker':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for i, worker_class in enumerate(args.classes):
+        first = args.first_customer + i * args.clients
+        emails = [customer_email(args.tag, n) for n in range(first, first + args.clients)]
+        r = bench_worker_class(worker_class, emails, args)
+        print(
+            f"{worker_class:<10}{r['rps']:>10.1f}{r['p50']:>10.1f}"
+            f"{r['p95']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,17 @@
 import os
+import tempfile
+
+DEFAULT_SECRET_KEY = "dev_secret_key"
 
 
 class BaseConfig:
     """Shared config for all environments."""
 
-    SECRET_KEY = os.getenv("SECRET_KEY", "dev_secret_key")
+    SECRET_KEY = os.getenv("SECRET_KEY", DEFAULT_SECRET_KEY)
+
+    SESSION_COOKIE_HTTPONLY = True
+    SESSION_COOKIE_SAMESITE = "Lax"
+    SESSION_COOKIE_SECURE = os.getenv("FLASK_DEBUG", "1") == "0"
 
     # Fallback DB values
     DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -15,6 +22,89 @@ class BaseConfig:
 
     DATABASE_URL = os.getenv("DATABASE_URL")
 
+    # Per-worker connection pool; keep DB_POOL_MAX >= gunicorn threads.
+    DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+    # Seconds a new connection may take; bounds requests to an unreachable host.
+    DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+
+    # Optional streaming replica for read-only pages. After a write, that
+    # session's reads stay on the primary for READ_YOUR_WRITES_SECONDS.
+    # After a failed replica connect, reads skip it for REPLICA_RETRY_SECONDS.
+    REPLICA_DATABASE_URL = os.getenv("REPLICA_DATABASE_URL")
+    READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+    REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+
+    # statement_timeout (ms) set on each checked-out connection, per endpoint.
+    STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "5000"))
+    STATEMENT_TIMEOUTS_MS = {
+        "customer_login": 1000,
+        "admin_login": 1000,
+        "customer_dashboard": 1500,
+        "booking_submitted": 1500,
+        "readyz": 500,
+        "booking": 3000,
+        "course_search": 1000,
+        "db_dump": 30000,
+    }
+
+    # Free seats of a capped course are spread over this many counter rows
+    # so concurrent bookings do not all lock the same one.
+    COURSE_SEAT_SHARDS = int(os.getenv("COURSE_SEAT_SHARDS", "8"))
+
+    # Admin review queue: bookings handed out per claim and how long the
+    # claim holds before other reviewers may take them.
+    REVIEW_BATCH_SIZE = int(os.getenv("REVIEW_BATCH_SIZE", "10"))
+    REVIEW_LEASE_SECONDS = int(os.getenv("REVIEW_LEASE_SECONDS", "900"))
+
+    # Audit trail of admin changes: buffered in-process and written with
+    # one COPY per AUDIT_BATCH_SIZE events or every AUDIT_FLUSH_SECONDS.
+    AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "1") == "1"
+    AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "100"))
+    AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "2"))
+    AUDIT_MAX_PENDING = int(os.getenv("AUDIT_MAX_PENDING", "10000"))
+
+    # Outgoing mail for background jobs (booking confirmations).
+    SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+    SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+    MAIL_FROM = os.getenv("MAIL_FROM", "bookings@ghibli-movie-maker.local")
+
+    # Bearer token required by /metrics; unset leaves it open, which is
+    # fine when only the internal network can reach the app port.
+    METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+    # On-demand profiling: an admin adds ?_profile=1 to a request and the
+    # sampled stacks land in PROFILE_DIR, keeping the newest PROFILE_MAX_FILES.
+    PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1") == "1"
+    PROFILE_DIR = os.getenv(
+        "PROFILE_DIR", os.path.join(tempfile.gettempdir(), "ghibli-profiles")
+    )
+    PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "50"))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+
+    # Logging goes through a bounded in-memory queue to one writer thread.
+    # LOG_SAMPLE_RATE keeps that fraction of INFO records (access lines are
+    # the bulk); warnings and errors are never sampled. LOG_FORMAT is
+    # "json" or "text".
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+    # Circuit breaker around the primary database. Half-open, it admits
+    # CIRCUIT_HALF_OPEN_PROBES trial requests and closes once all succeed.
+    CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+    CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "10"))
+    CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+    CIRCUIT_SLOW_RATE = float(os.getenv("CIRCUIT_SLOW_RATE", "0.5"))
+    CIRCUIT_SLOW_MS = float(os.getenv("CIRCUIT_SLOW_MS", "1000"))
+    CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "10"))
+    CIRCUIT_HALF_OPEN_PROBES = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "3"))
+
     @classmethod
     def get_database_url(cls) -> str:
         if cls.DATABASE_URL:
@@ -26,16 +116,30 @@ class BaseConfig:
 
 
 class DevelopmentConfig(BaseConfig):
-    DEBUG = True
+    DEBUG = os.getenv("FLASK_DEBUG", "1") != "0"
 
 
 class TestingConfig(BaseConfig):
     TESTING = True
+    AUDIT_ENABLED = False
 
-    @classmethod
-    def get_database_url(cls) -> str:
-        return os.getenv("DATABASE_URL", "sqlite:///:memory:")
+    # Unit tests mock the database. The real-database tests clone their
+    # own databases next to TEST_DATABASE_URL (tests/pg_databases.py).
+    DATABASE_URL = os.getenv("TEST_DATABASE_URL")
 
 
 class ProductionConfig(BaseConfig):
     DEBUG = False
+
+
+CONFIGS = {
+    "development": DevelopmentConfig,
+    "testing": TestingConfig,
+    "production": ProductionConfig,
+}
+
+
+def config_for_env(env_name=None):
+    """Return the config class for FLASK_ENV, defaulting to development."""
+    env_name = (env_name or os.getenv("FLASK_ENV", "development")).lower()
+    return CONFIGS.get(env_name, DevelopmentConfig)
@@ -1,5 +1,24 @@
 import sys
 import os
 
+import pytest
+
 # Ensure the project root is on sys.path so pytest can import app.py
 sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "tests"))
+
+from query_budget import max_queries  # noqa: E402
+
+
+@pytest.fixture
+def query_budget():
+    """
+    Cap the statements a block sends, for pytest-style tests:
+
+        def test_dashboard(client, query_budget):
+            with query_budget(1):
+                client.get("/dashboard")
+
+    unittest.TestCase classes mix in query_budget.QueryBudgetMixin instead.
+    """
+    return max_queries
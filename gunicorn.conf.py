@@ -0,0 +1,123 @@
+"""
+Gunicorn configuration for the Ghibli Movie Booking System.
+
+Worker and thread counts are derived from the CPU cores actually available
+to the container (cgroup quota first, then CPU affinity) rather than being
+hardcoded. Every value can be overridden through a GUNICORN_* environment
+variable, which is also how benchmarks/worker_classes.py switches modes.
+
+Worker classes:
+    gthread (default): a few processes with a thread pool each, so a slow
+        database call only ties up one thread instead of a whole worker.
+    sync: one in-flight request per process, kept for comparison.
+    gevent: cooperative greenlets; psycogreen makes psycopg2 yield while it waits.
+"""
+
+import glob
+import multiprocessing
+import os
+import tempfile
+
+
+def _available_cores():
+    """Return the number of CPU cores this process may use, at least 1."""
+    # cgroup v2 quota, e.g. "200000 100000" for --cpus=2
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, multiprocessing.cpu_count())
+
+
+def _env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+cores = _available_cores()
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+
+if worker_class == "gevent":
+    # Patch before the app (and psycopg2) is imported by preload_app.
+    from gevent import monkey
+
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+
+    patch_psycopg()
+
+    workers = _env_int("GUNICORN_WORKERS", cores + 1)
+    worker_connections = _env_int("GUNICORN_WORKER_CONNECTIONS", 100)
+    threads = 1
+elif worker_class == "gthread":
+    workers = _env_int("GUNICORN_WORKERS", cores + 1)
+    threads = _env_int("GUNICORN_THREADS", 4)
+else:
+    workers = _env_int("GUNICORN_WORKERS", 2 * cores + 1)
+    threads = 1
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:80")
+
+# Import the app once in the master; workers fork from a warm interpreter.
+# create_app() opens no sockets, and post_fork below resets per-worker state.
+preload_app = True
+
+# Recycle workers periodically to cap slow memory growth, staggered so they
+# never all restart at the same moment.
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+# Heartbeat files on tmpfs; Docker's overlay filesystem can stall workers.
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "warning")
+
+# prometheus_client keeps each worker's metrics in files here so /metrics
+# can add them up across workers. It must be set before the app (and so
+# prometheus_client) is imported, and stale files from a previous run would
+# be counted again, so the directory is emptied on every start.
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "ghibli-metrics"
+    ),
+)
+os.makedirs(metrics_dir, exist_ok=True)
+for stale in glob.glob(os.path.join(metrics_dir, "*.db")):
+    os.remove(stale)
+
+
+def post_fork(server, worker):
+    """Rebuild DB pools and caches in the worker instead of sharing the master's."""
+    from app import reset_worker_state
+
+    reset_worker_state()
+
+
+def child_exit(server, worker):
+    """Stop counting a dead worker's in-flight and pool gauges."""
+    import metrics
+
+    metrics.mark_process_dead(worker.pid)
+
+
+def worker_exit(server, worker):
+    """Flush buffered audit events, then close this worker's pooled connections."""
+    import audit
+    import db
+
+    audit.trail.close()
+    db.close_pools()
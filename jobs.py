@@ -0,0 +1,272 @@
+"""
+Postgres-backed background jobs for the Ghibli Movie Booking System.
+
+Request handlers call ``enqueue()`` with their own cursor, so a job only
+exists if the surrounding transaction (e.g. the booking) commits. A
+``NOTIFY`` in the same transaction wakes idle workers immediately.
+
+Workers run separately from gunicorn (``flask jobs-worker``). Each loop
+claims a batch with ``FOR UPDATE SKIP LOCKED`` so any number of workers can
+share the queue without blocking each other, commits the claim, runs the
+handlers outside any transaction, then deletes successes and reschedules
+failures with exponential backoff. Jobs whose lease expires (worker crash)
+become claimable again.
+"""
+
+import json
+import logging
+import os
+import random
+import select
+import signal
+import smtplib
+import socket
+import time
+from email.message import EmailMessage
+
+import click
+import psycopg2
+from flask import current_app
+
+import db
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "ghibli_jobs"
+
+_HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register ``func(payload)`` as the handler for jobs of ``kind``."""
+    def decorator(func):
+        _HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue(cur, kind, payload, delay_seconds=0, max_attempts=5):
+    """
+    Queue a job inside the caller's transaction.
+
+    Args:
+        cur: Cursor on the connection whose commit should publish the job
+        kind (str): Registered handler name
+        payload (dict): JSON-serialisable job arguments
+        delay_seconds (float): Earliest start, relative to now
+        max_attempts (int): Attempts before the job is marked failed
+    """
+    cur.execute(
+        """
+        INSERT INTO jobs (kind, payload, run_at, max_attempts)
+        VALUES (%s, %s, now() + make_interval(secs => %s), %s)
+        """,
+        (kind, json.dumps(payload), delay_seconds, max_attempts),
+    )
+    cur.execute(f"NOTIFY {NOTIFY_CHANNEL}")
+
+
+def backoff_seconds(attempts, base=5.0, cap=3600.0):
+    """Exponential backoff with full jitter for the given attempt number."""
+    return random.uniform(0, min(cap, base * (2 ** max(0, attempts - 1))))
+
+
+# ---------- EMAIL ----------
+def send_email(to_address, subject, body):
+    """
+    Send a plain-text email through the configured SMTP host.
+
+    Uses SMTP_HOST/SMTP_PORT and, when set, STARTTLS and login credentials.
+    A local debugging SMTP server is enough for development and tests.
+    """
+    config = current_app.config
+    message = EmailMessage()
+    message["From"] = config["MAIL_FROM"]
+    message["To"] = to_address
+    message["Subject"] = subject
+    message.set_content(body)
+
+    with smtplib.SMTP(config["SMTP_HOST"], config["SMTP_PORT"],
+                      timeout=config["SMTP_TIMEOUT"]) as smtp:
+        if config["SMTP_STARTTLS"]:
+            smtp.starttls()
+        if config["SMTP_USERNAME"]:
+            smtp.login(config["SMTP_USERNAME"], config["SMTP_PASSWORD"])
+        smtp.send_message(message)
+
+
+@job_handler("booking_confirmation")
+def send_booking_confirmation(payload):
+    """Email the customer a summary of the bookings they just submitted."""
+    conn = db.connection_pool.getconn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT c.email, c.name, co.course_name,
+                   COALESCE(string_agg(m.module_name, ', ' ORDER BY m.module_order), '')
+            FROM bookings b
+            JOIN customers c ON b.customer_id = c.customer_id
+            JOIN courses co ON b.course_id = co.course_id
+            LEFT JOIN booking_modules bm ON bm.booking_id = b.booking_id
+            LEFT JOIN course_modules m ON m.module_id = bm.module_id
+            WHERE b.booking_id = ANY(%s)
+            GROUP BY b.booking_id, c.email, c.name, co.course_name
+            ORDER BY b.booking_id
+            """,
+            (payload["booking_ids"],),
+        )
+        rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    if not rows:
+        # Bookings were deleted before we got to them; nothing to confirm.
+        return
+
+    email, name = rows[0][0], rows[0][1]
+    lines = [f"Hi {name},", "", "Thanks for your booking. We have received:", ""]
+    for _, _, course_name, modules in rows:
+        lines.append(f"  - {course_name}" + (f" ({modules})" if modules else ""))
+    lines += ["", "We will be in touch once an administrator has reviewed it.",
+              "", "Studio Ghibli Movie Maker"]
+    send_email(email, "Your Studio Ghibli booking", "\n".join(lines))
+
+
+# ---------- WORKER ----------
+class Worker:
+    """
+    Claims and runs queued jobs in batches.
+
+    Args:
+        batch_size (int): Jobs claimed per round trip
+        poll_interval (float): Max seconds to sleep when idle; NOTIFY wakes early
+        lease_seconds (float): How long a claim lasts before others may retake it
+    """
+
+    def __init__(self, batch_size=10, poll_interval=5.0, lease_seconds=300.0):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stopping = False
+        self._listen_conn = None
+
+    def stop(self, *_):
+        self._stopping = True
+
+    def claim(self, cur):
+        """Lock and lease up to batch_size runnable jobs."""
+        cur.execute(
+            """
+            UPDATE jobs
+            SET status = 'running', attempts = attempts + 1,
+                locked_at = now(), locked_by = %s
+            WHERE job_id IN (
+                SELECT job_id FROM jobs
+                WHERE (status = 'queued' AND run_at <= now())
+                   OR (status = 'running'
+                       AND locked_at < now() - make_interval(secs => %s))
+                ORDER BY run_at, job_id
+                FOR UPDATE SKIP LOCKED
+                LIMIT %s
+            )
+            RETURNING job_id, kind, payload, attempts, max_attempts
+            """,
+            (self.worker_id, self.lease_seconds, self.batch_size),
+        )
+        return cur.fetchall()
+
+    def run_once(self):
+        """
+        Claim one batch, run it and record the outcomes.
+
+        Returns:
+            int: Number of jobs claimed (0 means the queue looked empty)
+        """
+        conn = db.connection_pool.getconn()
+        try:
+            cur = conn.cursor()
+            claimed = self.claim(cur)
+            conn.commit()
+            if not claimed:
+                return 0
+
+            succeeded, failed = [], []
+            for job_id, kind, payload, attempts, max_attempts in claimed:
+                handler = _HANDLERS.get(kind)
+                try:
+                    if handler is None:
+                        raise LookupError(f"no handler registered for job kind {kind!r}")
+                    handler(payload)
+                    succeeded.append(job_id)
+                except Exception as e:
+                    logger.warning("Job %s (%s) attempt %s failed: %s", job_id, kind, attempts, e)
+                    final = handler is None or attempts >= max_attempts
+                    failed.append((job_id, final, backoff_seconds(attempts), str(e)))
+
+            if succeeded:
+                cur.execute("DELETE FROM jobs WHERE job_id = ANY(%s)", (succeeded,))
+            if failed:
+                cur.executemany(
+                    """
+                    UPDATE jobs
+                    SET status = CASE WHEN %s THEN 'failed' ELSE 'queued' END,
+                        run_at = now() + make_interval(secs => %s),
+                        last_error = %s, locked_at = NULL, locked_by = NULL
+                    WHERE job_id = %s
+                    """,
+                    [(final, delay, error, job_id) for job_id, final, delay, error in failed],
+                )
+            conn.commit()
+            return len(claimed)
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _listen(self):
+        conn = psycopg2.connect(**db.connect_kwargs(current_app.config["DATABASE_URL"]))
+        conn.autocommit = True
+        conn.cursor().execute(f"LISTEN {NOTIFY_CHANNEL}")
+        return conn
+
+    def wait_for_work(self):
+        """Sleep until NOTIFY arrives or poll_interval passes."""
+        if self._listen_conn is None or self._listen_conn.closed:
+            self._listen_conn = self._listen()
+        if select.select([self._listen_conn], [], [], self.poll_interval)[0]:
+            self._listen_conn.poll()
+            self._listen_conn.notifies.clear()
+
+    def run(self):
+        """Process jobs until SIGTERM/SIGINT."""
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        logger.info("Job worker %s started", self.worker_id)
+        try:
+            while not self._stopping:
+                try:
+                    # Keep draining while full batches come back.
+                    if self.run_once() < self.batch_size:
+                        self.wait_for_work()
+                except (psycopg2.OperationalError, db.PoolTimeout) as e:
+                    logger.error("Job worker database error: %s", e)
+                    self._listen_conn = None
+                    time.sleep(self.poll_interval)
+        finally:
+            if self._listen_conn is not None:
+                self._listen_conn.close()
+            db.close_pools()
+
+
+@click.command("jobs-worker")
+@click.option("--batch-size", default=10, show_default=True, help="Jobs claimed per batch.")
+@click.option("--poll-interval", default=5.0, show_default=True,
+              help="Idle wake-up interval in seconds.")
+@click.option("--lease-seconds", default=300.0, show_default=True,
+              help="Seconds before a claimed job can be retaken.")
+def worker_command(batch_size, poll_interval, lease_seconds):
+    """Run the background job worker."""
+    Worker(batch_size, poll_interval, lease_seconds).run()
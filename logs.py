@@ -0,0 +1,201 @@
+"""
+Non-blocking structured logging for the Ghibli Movie Booking System.
+
+Request threads only put log records on an in-memory queue; a single
+QueueListener thread per process formats them as JSON lines and writes
+them to stdout. Formatting is lazy: ``logger.info("Booked %s", ids)`` is
+only turned into a string on the listener thread, and only if the record
+survives sampling.
+
+Each record carries the request id (from ``X-Request-ID`` or freshly
+generated), route, method and path of the request that logged it. The
+per-request access line adds status, duration and database query count.
+
+A slow or blocked sink never stalls a request: when the queue is full,
+records are dropped and counted, and the listener reports how many were
+lost once it catches up. INFO and DEBUG records can be sampled
+(``LOG_SAMPLE_RATE``); warnings and errors are always kept.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+from flask import g, has_request_context, request
+
+import metrics
+
+# Attributes every LogRecord has; anything else was passed via extra=.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {
+    "message", "asctime", "taskName",
+}
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per record."""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created))
+            + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single lines for local development."""
+
+    def __init__(self):
+        super().__init__("%(levelname)s: %(message)s")
+
+    def format(self, record):
+        line = super().format(record)
+        request_id = getattr(record, "request_id", None)
+        return f"{line} [{request_id}]" if request_id else line
+
+
+class RequestContextFilter(logging.Filter):
+    """Copy request details onto the record while still on the request thread."""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get("request_id")
+            record.route = request.endpoint
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep roughly ``rate`` of INFO/DEBUG records; always keep warnings and up."""
+
+    def __init__(self, rate=1.0):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that drops instead of blocking and formats lazily.
+
+    The stock handler formats every record on the calling thread before
+    queueing it; here only exception tracebacks are rendered up front (the
+    frames would be gone later), the message itself is left for the
+    listener.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.LOG_RECORDS_DROPPED.inc()
+
+
+class _ReportingListener(logging.handlers.QueueListener):
+    """Mentions records lost to a full queue once the backlog drains."""
+
+    def __init__(self, log_queue, producer, *handlers):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.producer = producer
+        self._reported = 0
+
+    def handle(self, record):
+        super().handle(record)
+        dropped = self.producer.dropped
+        if dropped != self._reported and self.queue.empty():
+            lost, self._reported = dropped - self._reported, dropped
+            super().handle(logging.makeLogRecord({
+                "name": __name__, "levelno": logging.WARNING, "levelname": "WARNING",
+                "msg": "Log queue full; dropped %d record(s)", "args": (lost,),
+                "process": os.getpid(),
+            }))
+
+
+class LogPipeline:
+    """The queue, handler and listener thread installed on the root logger."""
+
+    def __init__(self):
+        self.handler = None
+        self.listener = None
+        self._settings = None
+        self._pid = None
+
+    def configure(self, level="INFO", fmt="json", sample_rate=1.0, queue_size=10000,
+                  stream=None):
+        """Install (or reinstall) the pipeline on the root logger."""
+        self.stop()
+        if self.handler is not None:
+            logging.getLogger().removeHandler(self.handler)
+        self._settings = (level, fmt, sample_rate, queue_size, stream)
+
+        sink = logging.StreamHandler(stream or sys.stdout)
+        sink.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+        log_queue = queue.Queue(maxsize=queue_size)
+        self.handler = NonBlockingQueueHandler(log_queue)
+        self.handler.addFilter(SamplingFilter(sample_rate))
+        self.handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger()
+        root.addHandler(self.handler)
+        root.setLevel(level)
+
+        self.listener = _ReportingListener(log_queue, self.handler, sink)
+        self.listener.start()
+        self._pid = os.getpid()
+        return self
+
+    def stop(self):
+        """Drain the queue and stop the listener thread."""
+        if self.listener is not None and self._pid == os.getpid():
+            try:
+                self.listener.stop()
+            except Exception:
+                pass
+        self.listener = None
+
+    def reset(self):
+        """Start a fresh listener in a forked worker; the master's thread is gone."""
+        if self._settings is not None:
+            self.configure(*self._settings)
+
+
+pipeline = LogPipeline()
+atexit.register(pipeline.stop)
+
+
+def configure(level="INFO", fmt="json", sample_rate=1.0, queue_size=10000, stream=None):
+    """Route all logging through the non-blocking JSON pipeline."""
+    return pipeline.configure(level, fmt, sample_rate, queue_size, stream)
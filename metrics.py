@@ -0,0 +1,138 @@
+"""
+Prometheus metrics for the Ghibli Movie Booking System.
+
+Exposed at ``/metrics`` in the Prometheus text format. Covers per-endpoint
+request latency and in-flight requests, database query counts and
+durations (also per request), connection pool occupancy and wait time,
+cache hit/miss counts and password hashing time.
+
+Under gunicorn every worker is a separate process, so counters must be
+summed across workers rather than read from whichever worker answers the
+scrape. gunicorn.conf.py sets ``PROMETHEUS_MULTIPROC_DIR`` before the app
+is imported; prometheus_client then keeps each worker's values in
+memory-mapped files there, and ``render()`` merges them. Gauges declare how
+they combine (``livesum``: add up the live workers). Without the variable
+(flask run, tests) the ordinary in-process registry is used.
+"""
+
+import os
+import threading
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+# Request and query latencies in seconds; booking pages run 5-500 ms.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+# werkzeug's default scrypt/pbkdf2 hashes take tens to hundreds of ms.
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+REQUEST_SECONDS = Histogram(
+    "ghibli_http_request_duration_seconds",
+    "Time spent handling a request, by endpoint.",
+    ["endpoint", "method", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "ghibli_http_requests_in_flight",
+    "Requests currently being handled.",
+    ["endpoint"],
+    multiprocess_mode="livesum",
+)
+DB_QUERY_SECONDS = Histogram(
+    "ghibli_db_query_duration_seconds",
+    "Time spent in cursor.execute/executemany, by pool.",
+    ["pool"],
+    buckets=QUERY_BUCKETS,
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "ghibli_db_queries_per_request",
+    "Database statements issued while handling one request.",
+    ["endpoint"],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "ghibli_db_pool_connections",
+    "Pooled connections by state; max is the configured limit.",
+    ["pool", "state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "ghibli_db_pool_wait_seconds",
+    "Time spent waiting to check out a pooled connection.",
+    ["pool"],
+    buckets=QUERY_BUCKETS,
+)
+DB_POOL_TIMEOUTS = Counter(
+    "ghibli_db_pool_timeouts",
+    "Checkouts that gave up waiting for a free connection.",
+    ["pool"],
+)
+CACHE_REQUESTS = Counter(
+    "ghibli_cache_requests",
+    "Cache lookups by result (hit or miss).",
+    ["cache", "result"],
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "ghibli_password_hash_seconds",
+    "Time spent hashing or verifying a password.",
+    ["operation"],
+    buckets=HASH_BUCKETS,
+)
+LOG_RECORDS_DROPPED = Counter(
+    "ghibli_log_records_dropped",
+    "Log records discarded because the log queue was full.",
+)
+
+_local = threading.local()
+
+
+def observe_query(pool, seconds):
+    """Record one statement on ``pool`` and count it against the current request."""
+    DB_QUERY_SECONDS.labels(pool).observe(seconds)
+    _local.queries = getattr(_local, "queries", 0) + 1
+
+
+def start_request():
+    """Reset this thread's per-request query counter."""
+    _local.queries = 0
+
+
+def request_queries():
+    """Statements issued by this thread since start_request()."""
+    return getattr(_local, "queries", 0)
+
+
+def set_pool_usage(pool, in_use, idle, maxconn):
+    DB_POOL_CONNECTIONS.labels(pool, "in_use").set(in_use)
+    DB_POOL_CONNECTIONS.labels(pool, "idle").set(idle)
+    DB_POOL_CONNECTIONS.labels(pool, "max").set(maxconn)
+
+
+def cache_lookup(cache, hit):
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render():
+    """
+    Current metrics in the Prometheus text format.
+
+    Returns:
+        tuple: (body bytes, content type)
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Drop a dead worker's live gauges; call from gunicorn's child_exit."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(pid)
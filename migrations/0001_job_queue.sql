@@ -0,0 +1,25 @@
+-- Durable background job queue claimed with FOR UPDATE SKIP LOCKED.
+-- Rows are deleted once a job succeeds; failed rows stay for inspection.
+
+CREATE TABLE IF NOT EXISTS public.jobs (
+    job_id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    kind text NOT NULL,
+    payload jsonb DEFAULT '{}'::jsonb NOT NULL,
+    status text DEFAULT 'queued' NOT NULL
+        CHECK (status IN ('queued', 'running', 'failed')),
+    attempts integer DEFAULT 0 NOT NULL,
+    max_attempts integer DEFAULT 5 NOT NULL,
+    run_at timestamp with time zone DEFAULT now() NOT NULL,
+    locked_at timestamp with time zone,
+    locked_by text,
+    last_error text,
+    created_at timestamp with time zone DEFAULT now() NOT NULL
+);
+
+-- Claim query walks queued jobs in run_at order; keep that index tiny.
+CREATE INDEX IF NOT EXISTS jobs_queued_run_at_idx
+    ON public.jobs (run_at, job_id) WHERE status = 'queued';
+
+-- Lets workers reclaim jobs whose lease expired (crashed worker).
+CREATE INDEX IF NOT EXISTS jobs_running_locked_at_idx
+    ON public.jobs (locked_at) WHERE status = 'running';
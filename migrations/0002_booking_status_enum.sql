@@ -0,0 +1,26 @@
+-- Store bookings.status as the booking_status enum instead of free text.
+-- booking() used to insert 'Pending'; fold case/spelling variants onto the
+-- enum labels first. Anything unrecognised goes back to 'pending' so an
+-- admin looks at it again rather than the migration failing halfway.
+-- The type change rewrites bookings under an ACCESS EXCLUSIVE lock.
+
+UPDATE public.bookings
+SET status = CASE lower(btrim(status))
+        WHEN 'pending' THEN 'pending'
+        WHEN 'approved' THEN 'approved'
+        WHEN 'confirmed' THEN 'approved'
+        WHEN 'cancelled' THEN 'cancelled'
+        WHEN 'canceled' THEN 'cancelled'
+        ELSE 'pending'
+    END
+WHERE status NOT IN ('pending', 'approved', 'cancelled');
+
+ALTER TABLE public.bookings
+    ALTER COLUMN status TYPE public.booking_status USING status::public.booking_status,
+    ALTER COLUMN status SET DEFAULT 'pending';
+
+-- The review queue only ever reads pending rows, oldest first.
+CREATE INDEX IF NOT EXISTS bookings_pending_submitted_at_idx
+    ON public.bookings (submitted_at, booking_id) WHERE status = 'pending';
+
+ANALYZE public.bookings;
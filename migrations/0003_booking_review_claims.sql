@@ -0,0 +1,7 @@
+-- Review-queue leases: an admin claims a batch of pending bookings for
+-- a limited time so concurrent reviewers never get the same rows.
+-- Nullable columns with no default, so this is a catalog-only change.
+
+ALTER TABLE public.bookings
+    ADD COLUMN IF NOT EXISTS review_claimed_by text,
+    ADD COLUMN IF NOT EXISTS review_claimed_until timestamp with time zone;
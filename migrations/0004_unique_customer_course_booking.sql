@@ -0,0 +1,50 @@
+-- One booking per (customer_id, course_id), enforced by the database so
+-- double-submits and parallel tabs cannot race past an application check.
+--
+-- Existing duplicates are merged into a single keeper per pair first: the
+-- most advanced status wins (approved, then pending, then cancelled), ties
+-- go to the oldest booking. The keeper inherits every module selected on
+-- its duplicates and their distinct extra requests.
+
+CREATE TEMPORARY TABLE booking_merge ON COMMIT DROP AS
+SELECT booking_id,
+       first_value(booking_id) OVER (
+           PARTITION BY customer_id, course_id
+           ORDER BY CASE status WHEN 'approved' THEN 0 WHEN 'pending' THEN 1 ELSE 2 END,
+                    booking_id
+       ) AS keeper_id
+FROM public.bookings
+WHERE (customer_id, course_id) IN (
+    SELECT customer_id, course_id FROM public.bookings
+    GROUP BY customer_id, course_id HAVING count(*) > 1
+);
+
+DELETE FROM booking_merge WHERE booking_id = keeper_id;
+
+INSERT INTO public.booking_modules (booking_id, module_id)
+SELECT DISTINCT m.keeper_id, bm.module_id
+FROM booking_merge m
+JOIN public.booking_modules bm ON bm.booking_id = m.booking_id
+ON CONFLICT (booking_id, module_id) DO NOTHING;
+
+UPDATE public.bookings k
+SET nice_to_have_requests = merged.requests, updated_at = now()
+FROM (
+    SELECT m.keeper_id,
+           string_agg(DISTINCT btrim(b.nice_to_have_requests), E'\n') AS requests
+    FROM (SELECT keeper_id, booking_id FROM booking_merge
+          UNION SELECT keeper_id, keeper_id FROM booking_merge) m
+    JOIN public.bookings b ON b.booking_id = m.booking_id
+    WHERE btrim(coalesce(b.nice_to_have_requests, '')) <> ''
+    GROUP BY m.keeper_id
+) merged
+WHERE k.booking_id = merged.keeper_id;
+
+DELETE FROM public.booking_modules
+WHERE booking_id IN (SELECT booking_id FROM booking_merge);
+
+DELETE FROM public.bookings
+WHERE booking_id IN (SELECT booking_id FROM booking_merge);
+
+ALTER TABLE public.bookings
+    ADD CONSTRAINT bookings_customer_id_course_id_key UNIQUE (customer_id, course_id);
@@ -0,0 +1,50 @@
+-- Per-course seat limits without a single hot counter row.
+--
+-- A capped course's free seats are spread over several course_seat_shards
+-- rows. booking() takes one seat from a random unlocked shard (SKIP LOCKED),
+-- so concurrent bookings for the same course mostly lock different rows.
+-- bookings.seat_shard records where the seat came from so it can be given
+-- back. courses.capacity NULL means unlimited (no shards, no seat_shard).
+
+ALTER TABLE public.courses
+    ADD COLUMN IF NOT EXISTS capacity integer CHECK (capacity >= 0);
+
+ALTER TABLE public.bookings
+    ADD COLUMN IF NOT EXISTS seat_shard smallint;
+
+CREATE TABLE IF NOT EXISTS public.course_seat_shards (
+    course_id bigint NOT NULL REFERENCES public.courses (course_id) ON DELETE CASCADE,
+    shard smallint NOT NULL,
+    seats_left integer NOT NULL CHECK (seats_left >= 0),
+    PRIMARY KEY (course_id, shard)
+);
+
+-- Return a booking's seat when it is deleted, cancelled or moved to another
+-- course, whichever code path does it (single, bulk or review queue).
+CREATE OR REPLACE FUNCTION public.release_booking_seat() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF OLD.seat_shard IS NOT NULL THEN
+            UPDATE public.course_seat_shards
+            SET seats_left = seats_left + 1
+            WHERE course_id = OLD.course_id AND shard = OLD.seat_shard;
+        END IF;
+        RETURN OLD;
+    END IF;
+
+    IF OLD.seat_shard IS NOT NULL
+       AND (NEW.status = 'cancelled' OR NEW.course_id <> OLD.course_id) THEN
+        UPDATE public.course_seat_shards
+        SET seats_left = seats_left + 1
+        WHERE course_id = OLD.course_id AND shard = OLD.seat_shard;
+        NEW.seat_shard := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS bookings_release_seat ON public.bookings;
+CREATE TRIGGER bookings_release_seat
+    BEFORE UPDATE OF status, course_id OR DELETE ON public.bookings
+    FOR EACH ROW EXECUTE FUNCTION public.release_booking_seat();
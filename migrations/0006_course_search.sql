@@ -0,0 +1,23 @@
+-- Full-text search over courses and modules.
+--
+-- The tsvector columns are generated, so Postgres keeps them in step with
+-- every INSERT/UPDATE; names weigh more than descriptions when ranking.
+-- Adding a stored generated column rewrites the (small) tables once.
+
+ALTER TABLE public.courses
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(course_name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+ALTER TABLE public.course_modules
+    ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(module_name, '')), 'A')
+        || setweight(to_tsvector('english', coalesce(module_description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS courses_search_vector_idx
+    ON public.courses USING gin (search_vector);
+
+CREATE INDEX IF NOT EXISTS course_modules_search_vector_idx
+    ON public.course_modules USING gin (search_vector);
@@ -0,0 +1,119 @@
+-- Email addresses are unique regardless of case, enforced by functional
+-- unique indexes on lower(email). Lookups compare lower(email) to
+-- lower(%s), so login stays a single index probe.
+--
+-- Existing case variants ("Abbie@..." and "abbie@...") are merged into
+-- the oldest account first. Every removed row is copied to
+-- email_case_duplicates so an admin can review or restore it by hand.
+--
+-- Customers: the keeper takes over the duplicates' bookings. Where more
+-- than one of the accounts booked the same course, the bookings are
+-- merged the same way as 0004 (most advanced status wins; modules and
+-- distinct extra requests are kept).
+
+CREATE TABLE IF NOT EXISTS public.email_case_duplicates (
+    account text NOT NULL,
+    removed_id bigint NOT NULL,
+    keeper_id bigint NOT NULL,
+    email text NOT NULL,
+    removed_row jsonb NOT NULL,
+    merged_at timestamp with time zone DEFAULT now() NOT NULL,
+    PRIMARY KEY (account, removed_id)
+);
+
+-- ---------- customers ----------
+
+CREATE TEMPORARY TABLE customer_merge ON COMMIT DROP AS
+SELECT customer_id,
+       first_value(customer_id) OVER (
+           PARTITION BY lower(email) ORDER BY created_at, customer_id
+       ) AS keeper_id
+FROM public.customers
+WHERE lower(email) IN (
+    SELECT lower(email) FROM public.customers
+    GROUP BY lower(email) HAVING count(*) > 1
+);
+
+DELETE FROM customer_merge WHERE customer_id = keeper_id;
+
+CREATE TEMPORARY TABLE booking_merge ON COMMIT DROP AS
+SELECT booking_id, keeper_booking_id
+FROM (
+    SELECT b.booking_id,
+           first_value(b.booking_id) OVER (
+               PARTITION BY coalesce(m.keeper_id, b.customer_id), b.course_id
+               ORDER BY CASE b.status WHEN 'approved' THEN 0 WHEN 'pending' THEN 1 ELSE 2 END,
+                        b.booking_id
+           ) AS keeper_booking_id
+    FROM public.bookings b
+    LEFT JOIN customer_merge m ON m.customer_id = b.customer_id
+    WHERE b.customer_id IN (SELECT customer_id FROM customer_merge
+                            UNION SELECT keeper_id FROM customer_merge)
+) grouped
+WHERE booking_id <> keeper_booking_id;
+
+INSERT INTO public.booking_modules (booking_id, module_id)
+SELECT DISTINCT m.keeper_booking_id, bm.module_id
+FROM booking_merge m
+JOIN public.booking_modules bm ON bm.booking_id = m.booking_id
+ON CONFLICT (booking_id, module_id) DO NOTHING;
+
+UPDATE public.bookings k
+SET nice_to_have_requests = merged.requests, updated_at = now()
+FROM (
+    SELECT m.keeper_booking_id,
+           string_agg(DISTINCT btrim(b.nice_to_have_requests), E'\n') AS requests
+    FROM (SELECT keeper_booking_id, booking_id FROM booking_merge
+          UNION SELECT keeper_booking_id, keeper_booking_id FROM booking_merge) m
+    JOIN public.bookings b ON b.booking_id = m.booking_id
+    WHERE btrim(coalesce(b.nice_to_have_requests, '')) <> ''
+    GROUP BY m.keeper_booking_id
+) merged
+WHERE k.booking_id = merged.keeper_booking_id;
+
+DELETE FROM public.booking_modules
+WHERE booking_id IN (SELECT booking_id FROM booking_merge);
+
+-- Seats held by merged-away bookings are released by release_booking_seat().
+DELETE FROM public.bookings
+WHERE booking_id IN (SELECT booking_id FROM booking_merge);
+
+UPDATE public.bookings b
+SET customer_id = m.keeper_id, updated_at = now()
+FROM customer_merge m
+WHERE b.customer_id = m.customer_id;
+
+INSERT INTO public.email_case_duplicates (account, removed_id, keeper_id, email, removed_row)
+SELECT 'customer', c.customer_id, m.keeper_id, c.email, to_jsonb(c)
+FROM public.customers c
+JOIN customer_merge m ON m.customer_id = c.customer_id
+ON CONFLICT (account, removed_id) DO NOTHING;
+
+DELETE FROM public.customers
+WHERE customer_id IN (SELECT customer_id FROM customer_merge);
+
+ALTER TABLE public.customers DROP CONSTRAINT IF EXISTS customers_email_key;
+
+CREATE UNIQUE INDEX IF NOT EXISTS customers_email_lower_key
+    ON public.customers (lower(email));
+
+-- ---------- admins ----------
+
+CREATE TEMPORARY TABLE admin_merge ON COMMIT DROP AS
+SELECT admin_id,
+       first_value(admin_id) OVER (PARTITION BY lower(email) ORDER BY admin_id) AS keeper_id
+FROM public.admins;
+
+DELETE FROM admin_merge WHERE admin_id = keeper_id;
+
+INSERT INTO public.email_case_duplicates (account, removed_id, keeper_id, email, removed_row)
+SELECT 'admin', a.admin_id, m.keeper_id, a.email, to_jsonb(a)
+FROM public.admins a
+JOIN admin_merge m ON m.admin_id = a.admin_id
+ON CONFLICT (account, removed_id) DO NOTHING;
+
+DELETE FROM public.admins
+WHERE admin_id IN (SELECT admin_id FROM admin_merge);
+
+CREATE UNIQUE INDEX IF NOT EXISTS admins_email_lower_key
+    ON public.admins (lower(email));
@@ -0,0 +1,22 @@
+-- Append-only trail of admin changes, written in batches by audit.py.
+-- occurred_at is when the change committed in the app, not when the
+-- batch was flushed.
+
+CREATE TABLE IF NOT EXISTS public.audit_log (
+    audit_id bigint GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+    occurred_at timestamp with time zone NOT NULL,
+    actor text,
+    action text NOT NULL,
+    entity text NOT NULL,
+    entity_id bigint,
+    details jsonb DEFAULT '{}'::jsonb NOT NULL
+);
+
+-- "What happened to booking 42?"
+CREATE INDEX IF NOT EXISTS audit_log_entity_idx
+    ON public.audit_log (entity, entity_id, occurred_at);
+
+-- Rows arrive in roughly time order, so a BRIN index covers time-range
+-- scans at a fraction of a btree's size and insert cost.
+CREATE INDEX IF NOT EXISTS audit_log_occurred_at_brin
+    ON public.audit_log USING brin (occurred_at);
@@ -0,0 +1,74 @@
+-- Pre-aggregated admin analytics (see analytics.py).
+--
+-- The admin analytics page reads these views instead of aggregating
+-- bookings, booking_modules and customers on every page view.
+-- `flask analytics-refresh` rebuilds them with REFRESH MATERIALIZED VIEW
+-- CONCURRENTLY, so readers keep seeing the previous contents while a
+-- refresh runs. CONCURRENTLY needs a unique index on each view, and the
+-- view must already hold data, hence WITH DATA here.
+-- Course and module names are joined in at read time, so a renamed course
+-- is displayed correctly without waiting for a refresh.
+
+-- Bookings submitted per course per ISO week, split by status.
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.analytics_course_weekly AS
+SELECT b.course_id,
+       date_trunc('week', b.submitted_at)::date AS week,
+       count(*) AS bookings,
+       count(*) FILTER (WHERE b.status = 'approved') AS approved,
+       count(*) FILTER (WHERE b.status = 'cancelled') AS cancelled
+FROM public.bookings b
+GROUP BY b.course_id, date_trunc('week', b.submitted_at)::date
+WITH DATA;
+
+CREATE UNIQUE INDEX IF NOT EXISTS analytics_course_weekly_key
+    ON public.analytics_course_weekly (course_id, week);
+CREATE INDEX IF NOT EXISTS analytics_course_weekly_week_idx
+    ON public.analytics_course_weekly (week);
+
+-- How often each module is chosen in bookings that were not cancelled.
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.analytics_module_popularity AS
+SELECT bm.module_id,
+       b.course_id,
+       count(*) AS bookings,
+       max(b.submitted_at) AS last_booked_at
+FROM public.booking_modules bm
+JOIN public.bookings b ON b.booking_id = bm.booking_id
+WHERE b.status <> 'cancelled'
+GROUP BY bm.module_id, b.course_id
+WITH DATA;
+
+CREATE UNIQUE INDEX IF NOT EXISTS analytics_module_popularity_key
+    ON public.analytics_module_popularity (module_id, course_id);
+CREATE INDEX IF NOT EXISTS analytics_module_popularity_bookings_idx
+    ON public.analytics_module_popularity (bookings DESC);
+
+-- Registration cohorts by week: how many customers went on to book, and
+-- how quickly.
+CREATE MATERIALIZED VIEW IF NOT EXISTS public.analytics_registration_conversion AS
+SELECT date_trunc('week', c.created_at)::date AS week,
+       count(*) AS registered,
+       count(f.first_booking_at) AS booked,
+       count(*) FILTER (
+           WHERE f.first_booking_at < c.created_at + interval '7 days'
+       ) AS booked_within_7_days,
+       round(avg(extract(epoch FROM f.first_booking_at - c.created_at) / 86400)::numeric, 1)
+           AS avg_days_to_first_booking
+FROM public.customers c
+LEFT JOIN (
+    SELECT customer_id, min(submitted_at) AS first_booking_at
+    FROM public.bookings
+    GROUP BY customer_id
+) f ON f.customer_id = c.customer_id
+GROUP BY date_trunc('week', c.created_at)::date
+WITH DATA;
+
+CREATE UNIQUE INDEX IF NOT EXISTS analytics_registration_conversion_key
+    ON public.analytics_registration_conversion (week);
+
+-- One row per view: when it was last refreshed and how long that took.
+CREATE TABLE IF NOT EXISTS public.analytics_refreshes (
+    view_name text PRIMARY KEY,
+    refreshed_at timestamp with time zone NOT NULL,
+    duration_ms numeric(12, 1) NOT NULL,
+    row_count bigint NOT NULL
+);
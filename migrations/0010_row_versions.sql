@@ -0,0 +1,39 @@
+-- Row versions for optimistic concurrency on the admin edit forms.
+--
+-- The edit forms carry the version they were rendered from and update
+-- with "WHERE ... AND version = %s"; a mismatch means someone else changed
+-- the row in the meantime. A trigger bumps the version, so every writer
+-- counts, including the customer's own dashboard edits. Only the columns
+-- shown on the edit forms count: review claims, seat shards and password
+-- rehashes must not make an open form stale.
+-- A constant default makes ADD COLUMN a catalog-only change.
+
+ALTER TABLE public.bookings
+    ADD COLUMN IF NOT EXISTS version integer DEFAULT 1 NOT NULL;
+
+ALTER TABLE public.customers
+    ADD COLUMN IF NOT EXISTS version integer DEFAULT 1 NOT NULL;
+
+CREATE OR REPLACE FUNCTION public.bump_row_version() RETURNS trigger
+    LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS bookings_bump_version ON public.bookings;
+CREATE TRIGGER bookings_bump_version
+    BEFORE UPDATE ON public.bookings
+    FOR EACH ROW
+    WHEN ((OLD.course_id, OLD.nice_to_have_requests)
+          IS DISTINCT FROM (NEW.course_id, NEW.nice_to_have_requests))
+    EXECUTE FUNCTION public.bump_row_version();
+
+DROP TRIGGER IF EXISTS customers_bump_version ON public.customers;
+CREATE TRIGGER customers_bump_version
+    BEFORE UPDATE ON public.customers
+    FOR EACH ROW
+    WHEN ((OLD.name, OLD.last_name, OLD.email, OLD.phone)
+          IS DISTINCT FROM (NEW.name, NEW.last_name, NEW.email, NEW.phone))
+    EXECUTE FUNCTION public.bump_row_version();
@@ -0,0 +1,47 @@
+-- Archive (soft-delete) courses and modules instead of deleting them.
+--
+-- Archiving clears the existing active flag and stamps archived_at; the
+-- catalog (booking page, search) already filters on active. Bookings keep
+-- pointing at archived rows, so nothing has to be checked or cascaded.
+-- `flask catalog-purge` later removes archived rows nothing refers to.
+
+ALTER TABLE public.courses
+    ADD COLUMN IF NOT EXISTS archived_at timestamp with time zone;
+
+ALTER TABLE public.course_modules
+    ADD COLUMN IF NOT EXISTS archived_at timestamp with time zone;
+
+-- Rows deactivated before this migration start their purge grace period now.
+UPDATE public.courses SET archived_at = now() WHERE NOT active AND archived_at IS NULL;
+UPDATE public.course_modules SET archived_at = now() WHERE NOT active AND archived_at IS NULL;
+
+-- Catalog indexes cover live rows only, so archived rows never bloat them.
+-- Course names only need to be unique among live courses; an archived
+-- course's name can be reused.
+CREATE UNIQUE INDEX IF NOT EXISTS courses_active_course_name_key
+    ON public.courses (course_name) WHERE active;
+ALTER TABLE public.courses DROP CONSTRAINT IF EXISTS courses_course_name_key;
+
+CREATE INDEX IF NOT EXISTS course_modules_active_order_idx
+    ON public.course_modules (module_order, module_id) WHERE active;
+
+DROP INDEX IF EXISTS public.courses_search_vector_idx;
+CREATE INDEX IF NOT EXISTS courses_active_search_vector_idx
+    ON public.courses USING gin (search_vector) WHERE active;
+
+DROP INDEX IF EXISTS public.course_modules_search_vector_idx;
+CREATE INDEX IF NOT EXISTS course_modules_active_search_vector_idx
+    ON public.course_modules USING gin (search_vector) WHERE active;
+
+-- The purge looks for archived rows and checks that nothing references
+-- them; these keep both lookups (and the FK checks on delete) off seq scans.
+CREATE INDEX IF NOT EXISTS courses_archived_at_idx
+    ON public.courses (archived_at) WHERE NOT active;
+CREATE INDEX IF NOT EXISTS course_modules_archived_at_idx
+    ON public.course_modules (archived_at) WHERE NOT active;
+CREATE INDEX IF NOT EXISTS course_modules_course_id_idx
+    ON public.course_modules (course_id);
+CREATE INDEX IF NOT EXISTS bookings_course_id_idx
+    ON public.bookings (course_id);
+CREATE INDEX IF NOT EXISTS booking_modules_module_id_idx
+    ON public.booking_modules (module_id);
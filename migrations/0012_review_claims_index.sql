@@ -0,0 +1,4 @@
+-- Releasing a reviewer's claims looks them up by reviewer among pending
+-- bookings; without this it reads the whole bookings table.
+CREATE INDEX IF NOT EXISTS bookings_pending_review_claimed_by_idx
+    ON public.bookings (review_claimed_by) WHERE status = 'pending';
@@ -0,0 +1,13 @@
+-- One live booking per (customer_id, course_id) instead of one booking
+-- ever: a customer whose booking was cancelled can book the course again.
+--
+-- The unique index covers live bookings only. Its old full-table
+-- counterpart was also the only index leading on customer_id, which the
+-- dashboard's list of all of a customer's bookings still needs.
+
+CREATE UNIQUE INDEX IF NOT EXISTS bookings_live_customer_course_key
+    ON public.bookings (customer_id, course_id) WHERE status <> 'cancelled';
+ALTER TABLE public.bookings DROP CONSTRAINT IF EXISTS bookings_customer_id_course_id_key;
+
+CREATE INDEX IF NOT EXISTS bookings_customer_id_idx
+    ON public.bookings (customer_id);
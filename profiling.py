@@ -0,0 +1,160 @@
+"""
+On-demand request profiler for the Ghibli Movie Booking System.
+
+An admin adds ``?_profile=1`` (or the ``X-Profile: 1`` header) to any
+request. A sampling profiler then records the stack of the thread handling
+that request every ``interval`` seconds until the response is done.
+Everyone else pays nothing: without the flag no profiler is created.
+
+Samples are saved in the collapsed-stack ("folded") format understood by
+flamegraph.pl, inferno and speedscope, next to a small JSON summary.
+Profiles live in a bounded on-disk ring: once more than ``max_profiles``
+exist, the oldest are deleted, so production disks never fill up.
+
+Sampling instead of cProfile keeps the overhead roughly constant however
+many Python calls the handler makes, and yields whole stacks, which is
+what a flamegraph needs.
+"""
+
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_ID_RE = re.compile(r"^\d{13}-\d+-[0-9a-f]{6}$")
+
+
+class Sampler:
+    """
+    Sample one thread's Python stack at a fixed interval.
+
+    Args:
+        thread_id (int): threading.get_ident() of the thread to watch
+        interval (float): Seconds between samples
+    """
+
+    def __init__(self, thread_id, interval=0.001):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.started = None
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+        return self
+
+    def sample(self):
+        """Record the watched thread's current stack once."""
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is not None:
+            self.stacks[_stack_key(frame)] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def folded(self):
+        """Samples as "outer;...;inner count" lines, heaviest first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack_key(frame):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class ProfileStore:
+    """
+    Bounded ring of saved profiles in one directory.
+
+    Several gunicorn workers may share the directory; trimming races are
+    harmless because a file deleted twice is simply skipped.
+    """
+
+    def __init__(self, directory, max_profiles=50):
+        self.directory = directory
+        self.max_profiles = max_profiles
+
+    def new_id(self):
+        # Millisecond timestamp first, so names sort oldest to newest.
+        return f"{int(time.time() * 1000):013d}-{os.getpid()}-{secrets.token_hex(3)}"
+
+    def path(self, profile_id, suffix):
+        if not PROFILE_ID_RE.match(profile_id):
+            raise ValueError(f"invalid profile id {profile_id!r}")
+        return os.path.join(self.directory, f"{profile_id}{suffix}")
+
+    def save(self, sampler, **summary):
+        """Write the folded stacks and summary, then trim the ring; return the id."""
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = self.new_id()
+        with open(self.path(profile_id, ".folded"), "w") as f:
+            f.write(sampler.folded())
+        summary.update(
+            id=profile_id,
+            samples=sum(sampler.stacks.values()),
+            duration_ms=round(sampler.elapsed * 1000, 2),
+            interval_ms=sampler.interval * 1000,
+            at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        )
+        with open(self.path(profile_id, ".json"), "w") as f:
+            json.dump(summary, f)
+        self.trim()
+        return profile_id
+
+    def ids(self):
+        """Saved profile ids, newest first."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        ids = {name.rsplit(".", 1)[0] for name in names if name.endswith(".json")}
+        return sorted((i for i in ids if PROFILE_ID_RE.match(i)), reverse=True)
+
+    def trim(self):
+        for profile_id in self.ids()[self.max_profiles:]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(self.path(profile_id, suffix))
+                except FileNotFoundError:
+                    pass
+
+    def summaries(self):
+        """Summary dicts of every saved profile, newest first."""
+        result = []
+        for profile_id in self.ids():
+            try:
+                with open(self.path(profile_id, ".json")) as f:
+                    result.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return result
+
+
+def requested(request):
+    """True when the request asks to be profiled."""
+    return request.args.get("_profile") == "1" or request.headers.get("X-Profile") == "1"
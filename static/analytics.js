@@ -0,0 +1,73 @@
+document.addEventListener("DOMContentLoaded", function () {
+    const root = document.getElementById("analytics");
+    if (!root) {
+        return;
+    }
+    const status = document.getElementById("analytics-status");
+
+    // One labelled horizontal bar per value; the largest fills what the label leaves.
+    function bars(container, labels, values, suffix) {
+        const max = Math.max.apply(null, values.concat([1]));
+        if (!labels.length) {
+            container.textContent = "No data yet.";
+            return;
+        }
+        labels.forEach(function (label, i) {
+            const row = document.createElement("div");
+            row.className = "chart-row";
+            const name = document.createElement("span");
+            name.className = "chart-label";
+            name.textContent = label;
+            const bar = document.createElement("span");
+            bar.className = "chart-bar";
+            bar.style.width = (50 * values[i] / max) + "%";
+            const value = document.createElement("span");
+            value.className = "chart-value";
+            value.textContent = values[i] + (suffix ? suffix[i] : "");
+            row.append(name, bar, value);
+            container.appendChild(row);
+        });
+    }
+
+    function courseWeekly(chart) {
+        const container = document.getElementById("chart-course-weekly");
+        if (!chart.series.length) {
+            container.textContent = "No data yet.";
+            return;
+        }
+        chart.series.forEach(function (series) {
+            const heading = document.createElement("h3");
+            heading.textContent = series.name;
+            container.appendChild(heading);
+            const block = document.createElement("div");
+            container.appendChild(block);
+            bars(block, chart.labels, series.data);
+        });
+    }
+
+    function conversion(chart) {
+        const suffix = chart.booked.map(function (booked, i) {
+            return " / " + chart.registered[i] + " registered";
+        });
+        bars(document.getElementById("chart-conversion"), chart.labels, chart.booked, suffix);
+    }
+
+    fetch(root.dataset.url, {
+        headers: {"Accept": "application/json"},
+        credentials: "same-origin"
+    })
+        .then(function (response) { return response.json(); })
+        .then(function (data) {
+            if (data.error) {
+                status.textContent = data.error;
+                return;
+            }
+            courseWeekly(data.course_weekly);
+            bars(document.getElementById("chart-module-popularity"),
+                 data.module_popularity.labels, data.module_popularity.data);
+            conversion(data.conversion);
+        })
+        .catch(function () {
+            status.textContent = "Analytics are unavailable right now.";
+        });
+});
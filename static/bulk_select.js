@@ -0,0 +1,25 @@
+document.addEventListener("DOMContentLoaded", function () {
+    const form = document.getElementById("bulk-form");
+    const selectAll = document.getElementById("select-all");
+    if (!form || !selectAll) {
+        return;
+    }
+    const boxes = document.querySelectorAll(".bulk-select");
+
+    selectAll.addEventListener("change", function () {
+        boxes.forEach(function (box) {
+            box.checked = selectAll.checked;
+        });
+    });
+
+    form.addEventListener("submit", function (e) {
+        const selected = document.querySelectorAll(".bulk-select:checked").length;
+        const action = e.submitter ? e.submitter.value : "update";
+        if (selected === 0) {
+            alert("Select at least one booking first.");
+            e.preventDefault();
+        } else if (!confirm(action + " " + selected + " booking(s)?")) {
+            e.preventDefault();
+        }
+    });
+});
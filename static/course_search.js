@@ -0,0 +1,83 @@
+document.addEventListener("DOMContentLoaded", function () {
+    const input = document.getElementById("course-search");
+    if (!input) {
+        return;
+    }
+    const status = document.getElementById("course-search-status");
+    const blocks = Array.from(document.querySelectorAll(".course-block"));
+    const container = blocks.length ? blocks[0].parentNode : null;
+    const anchor = blocks.length ? blocks[blocks.length - 1].nextSibling : null;
+    let timer = null;
+    let latest = 0;
+
+    function showAll() {
+        blocks.forEach(function (block) {
+            block.hidden = false;
+            container.insertBefore(block, anchor);
+        });
+        document.querySelectorAll(".search-hit").forEach(function (el) {
+            el.classList.remove("search-hit");
+        });
+        status.textContent = "";
+    }
+
+    function showResults(results) {
+        const byId = {};
+        blocks.forEach(function (block) {
+            block.hidden = true;
+            byId[block.dataset.courseId] = block;
+        });
+        document.querySelectorAll(".search-hit").forEach(function (el) {
+            el.classList.remove("search-hit");
+        });
+        // Ranked order: best match first.
+        results.forEach(function (course) {
+            const block = byId[String(course.id)];
+            if (!block) {
+                return;
+            }
+            block.hidden = false;
+            container.insertBefore(block, anchor);
+            course.modules.forEach(function (module) {
+                const label = block.querySelector('[data-module-id="' + module.id + '"]');
+                if (label) {
+                    label.classList.add("search-hit");
+                }
+            });
+        });
+        status.textContent = results.length ? "" : "No matching courses.";
+    }
+
+    // The box sits inside the booking form; Enter must not submit a booking.
+    input.addEventListener("keydown", function (e) {
+        if (e.key === "Enter") {
+            e.preventDefault();
+        }
+    });
+
+    input.addEventListener("input", function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            const query = input.value.trim();
+            if (!query) {
+                showAll();
+                return;
+            }
+            const request = ++latest;
+            fetch(input.dataset.searchUrl + "?q=" + encodeURIComponent(query), {
+                headers: {"Accept": "application/json"},
+                credentials: "same-origin"
+            })
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // Ignore answers to queries the user has already typed past.
+                    if (request === latest && data.results) {
+                        showResults(data.results);
+                    }
+                })
+                .catch(function () {
+                    status.textContent = "Search is unavailable right now.";
+                });
+        }, 200);
+    });
+});
@@ -0,0 +1,283 @@
+"""
+Throwaway PostgreSQL databases for the real-database tests
+
+TEST_DATABASE_URL names a scratch database on a server where the test
+user may create databases. The server must also offer the extensions
+schema.sql and the migrations create (pgcrypto, from PostgreSQL's contrib
+package); without them the real-database tests are skipped with a message
+saying which are missing. schema.sql plus every migration is built once
+into <name>_template, tagged with a fingerprint of those files and
+rebuilt only when they change. Each test process (one per pytest-xdist
+worker) then clones its own <name>_<worker> with CREATE DATABASE ...
+TEMPLATE, which copies the files instead of replaying the SQL.
+IntegrationTestCase empties every table after each test, so tests in a
+worker never see each other's rows.
+
+Processes coordinate through an advisory lock taken on TEST_DATABASE_URL
+itself; nothing else is written there.
+
+Usage:
+    TEST_DATABASE_URL=postgresql://postgres@localhost/ghibli_test pytest -n auto
+"""
+
+import atexit
+import functools
+import glob
+import hashlib
+import os
+import re
+import unittest
+from urllib.parse import urlsplit, urlunsplit
+
+import psycopg2
+from psycopg2 import sql
+
+import db
+from app import create_app
+from config import TestingConfig
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_PATH = os.path.join(ROOT, "schema.sql")
+
+# Arbitrary key, distinct from the migration lock.
+_LOCK_KEY = 727_002
+
+# psql meta-commands (\restrict) and ownership by the production role.
+_NOT_FOR_TESTS = re.compile(r"^(\\.*|ALTER .* OWNER TO .*;)$", re.MULTILINE)
+
+_CREATE_EXTENSION = re.compile(r"CREATE EXTENSION (?:IF NOT EXISTS )?(\w+)", re.IGNORECASE)
+
+
+def base_url():
+    return os.environ["TEST_DATABASE_URL"]
+
+
+def database_url(name):
+    """TEST_DATABASE_URL pointing at database ``name`` instead."""
+    parts = urlsplit(base_url())
+    return urlunsplit(parts._replace(path="/" + name))
+
+
+def _connect(url):
+    return psycopg2.connect(**db.connect_kwargs(url))
+
+
+def _base_name():
+    return urlsplit(base_url()).path.lstrip("/")
+
+
+def fingerprint():
+    """Hash of schema.sql and the migrations the template is built from."""
+    digest = hashlib.sha256()
+    for path in _source_paths():
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def _source_paths():
+    return [SCHEMA_PATH] + sorted(glob.glob(os.path.join(db.MIGRATIONS_DIR, "*.sql")))
+
+
+def schema_sql():
+    """schema.sql without the parts only psql or the production role can run."""
+    with open(SCHEMA_PATH, encoding="utf-8") as f:
+        return _NOT_FOR_TESTS.sub("", f.read())
+
+
+def required_extensions():
+    """Extensions schema.sql and the migrations create, in file order."""
+    names = []
+    for path in _source_paths():
+        with open(path, encoding="utf-8") as f:
+            names += [n for n in _CREATE_EXTENSION.findall(f.read()) if n not in names]
+    return names
+
+
+def _require_extensions(cur):
+    """Skip the calling tests if the server cannot create a required extension."""
+    cur.execute("SELECT name FROM pg_available_extensions")
+    available = {row[0] for row in cur.fetchall()}
+    missing = [name for name in required_extensions() if name not in available]
+    if missing:
+        raise unittest.SkipTest(
+            f"the PostgreSQL server behind TEST_DATABASE_URL lacks the "
+            f"{', '.join(missing)} extension(s) schema.sql needs; install the "
+            f"server's contrib package"
+        )
+
+
+class _ServerLock:
+    """Autocommit connection to TEST_DATABASE_URL holding the advisory lock."""
+
+    def __enter__(self):
+        self.conn = _connect(base_url())
+        self.conn.autocommit = True
+        self.cur = self.conn.cursor()
+        self.cur.execute("SELECT pg_advisory_lock(%s)", (_LOCK_KEY,))
+        return self.cur
+
+    def __exit__(self, *exc_info):
+        self.cur.execute("SELECT pg_advisory_unlock(%s)", (_LOCK_KEY,))
+        self.conn.close()
+
+
+def _tag(cur, name):
+    """The comment stored on database ``name``, or None if it does not exist."""
+    cur.execute(
+        "SELECT shobj_description(oid, 'pg_database') FROM pg_database WHERE datname = %s",
+        (name,),
+    )
+    row = cur.fetchone()
+    return row and (row[0] or "")
+
+
+def _drop(cur, name):
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s AND datistemplate", (name,))
+    if cur.fetchone():
+        cur.execute(sql.SQL("ALTER DATABASE {} IS_TEMPLATE false").format(sql.Identifier(name)))
+    cur.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+
+
+def _clone(cur, name, template, tag):
+    _drop(cur, name)
+    cur.execute(sql.SQL("CREATE DATABASE {} TEMPLATE {}").format(
+        sql.Identifier(name), sql.Identifier(template)))
+    cur.execute(sql.SQL("COMMENT ON DATABASE {} IS {}").format(
+        sql.Identifier(name), sql.Literal(tag)))
+
+
+def _ensure_template(cur):
+    """Build <name>_template unless it already matches fingerprint()."""
+    name = f"{_base_name()}_template"
+    tag = fingerprint()
+    if _tag(cur, name) == tag:
+        return name
+
+    _require_extensions(cur)
+    _drop(cur, name)
+    cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    # schema.sql empties search_path for its session, so the migrations
+    # get a connection of their own.
+    conn = _connect(database_url(name))
+    try:
+        conn.cursor().execute(schema_sql())
+        conn.commit()
+    finally:
+        conn.close()
+    conn = _connect(database_url(name))
+    try:
+        db.apply_migrations(conn)
+    finally:
+        conn.close()
+    cur.execute(sql.SQL("COMMENT ON DATABASE {} IS {}").format(
+        sql.Identifier(name), sql.Literal(tag)))
+    cur.execute(sql.SQL("ALTER DATABASE {} IS_TEMPLATE true").format(sql.Identifier(name)))
+    return name
+
+
+@functools.lru_cache(maxsize=None)
+def worker_database():
+    """
+    Clone a fresh database for this test process; dropped at exit.
+
+    Returns:
+        str: Its URL
+    """
+    name = f"{_base_name()}_{os.getenv('PYTEST_XDIST_WORKER', 'main')}"
+    with _ServerLock() as cur:
+        _clone(cur, name, _ensure_template(cur), "worker")
+
+    def drop():
+        with _ServerLock() as cur:
+            _drop(cur, name)
+
+    atexit.register(drop)
+    return database_url(name)
+
+
+def seeded_database(tag, populate, version=""):
+    """
+    A database cloned from the template and filled once by ``populate``.
+
+    Shared by every process and kept between runs; it is rebuilt when the
+    schema fingerprint or ``version`` changes. Tests must only read it.
+
+    Args:
+        tag (str): Names the dataset and the database, e.g. "plans"
+        populate (callable): Called with an open connection to fill it
+        version (str): Changes whenever populate would produce other data
+
+    Returns:
+        str: Its URL
+    """
+    name = f"{_base_name()}_{tag}"
+    marker = f"{fingerprint()}:{version}"
+    with _ServerLock() as cur:
+        if _tag(cur, name) != marker:
+            _clone(cur, name, _ensure_template(cur), "seeding")
+            conn = _connect(database_url(name))
+            try:
+                populate(conn)
+                # Tables populate() leaves empty were never analyzed, and the
+                # planner guesses badly about those.
+                conn.autocommit = True
+                conn.cursor().execute("ANALYZE")
+            finally:
+                conn.close()
+            cur.execute(sql.SQL("COMMENT ON DATABASE {} IS {}").format(
+                sql.Identifier(name), sql.Literal(marker)))
+    return database_url(name)
+
+
+def truncate_all(conn):
+    """Empty every table except the migration record and reset identities."""
+    conn.rollback()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT tablename FROM pg_tables "
+        "WHERE schemaname = 'public' AND tablename <> 'schema_migrations'"
+    )
+    tables = [sql.Identifier("public", row[0]) for row in cur.fetchall()]
+    cur.execute(sql.SQL("TRUNCATE {} RESTART IDENTITY CASCADE").format(sql.SQL(", ").join(tables)))
+    conn.commit()
+
+
+@unittest.skipUnless(os.getenv("TEST_DATABASE_URL"), "TEST_DATABASE_URL is not set")
+class IntegrationTestCase(unittest.TestCase):
+    """
+    Runs the app against this process's cloned database.
+
+    ``self.client`` is a test client with CSRF off and ``self.conn`` a
+    direct connection for arranging and checking rows. Every table is
+    emptied after each test.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.database_url = worker_database()
+        config = type("IntegrationConfig", (TestingConfig,), {
+            "DATABASE_URL": cls.database_url,
+            "WTF_CSRF_ENABLED": False,
+        })
+        cls.app = create_app(config, replace=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        # Back to the module app's settings; this closes the clone's pools.
+        create_app(replace=True)
+
+    def setUp(self):
+        self.client = self.app.test_client()
+        self.conn = _connect(self.database_url)
+        self.addCleanup(self.conn.close)
+        self.addCleanup(truncate_all, self.conn)
+
+    def query(self, statement, params=None):
+        """Run one statement on self.conn, commit and return its rows, if any."""
+        cur = self.conn.cursor()
+        cur.execute(statement, params)
+        rows = cur.fetchall() if cur.description else None
+        self.conn.commit()
+        return rows
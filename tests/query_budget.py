@@ -0,0 +1,117 @@
+"""
+Query-count budgets for request tests
+
+QueryRecorder wraps app.get_db_connection for the length of a ``with``
+block and records every statement sent through the connections it hands
+out. Tests can then hold a route to a maximum number of queries, so a page
+that quietly grows from 2 queries to 2+N fails as soon as N appears. The
+recorder wraps whatever get_db_connection is at the time, so it works over
+the MagicMock the unit tests patch in as well as over a real pool.
+
+psycopg2's executemany() runs one statement per parameter set and is
+counted that way.
+"""
+
+import contextlib
+from unittest.mock import patch
+
+import app as app_module
+
+
+class _RecordingCursor:
+    """Cursor proxy that records statements before running them."""
+
+    def __init__(self, cursor, statements):
+        self._cursor = cursor
+        self._statements = statements
+
+    def execute(self, query, *args, **kwargs):
+        self._statements.append(query)
+        return self._cursor.execute(query, *args, **kwargs)
+
+    def executemany(self, query, vars_list):
+        vars_list = list(vars_list)
+        self._statements.extend([query] * len(vars_list))
+        return self._cursor.executemany(query, vars_list)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._cursor.close()
+
+
+class _RecordingConnection:
+    """Connection proxy whose cursors record their statements."""
+
+    def __init__(self, conn, statements):
+        self._conn = conn
+        self._statements = statements
+
+    def cursor(self, *args, **kwargs):
+        return _RecordingCursor(self._conn.cursor(*args, **kwargs), self._statements)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class QueryRecorder:
+    """
+    Record the statements sent through app.get_db_connection.
+
+    Usage:
+        with QueryRecorder() as queries:
+            client.get("/dashboard")
+        assert queries.count <= 2, queries.report()
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._patcher = None
+
+    def __enter__(self):
+        connect = app_module.get_db_connection
+
+        def recording_connection(*args, **kwargs):
+            return _RecordingConnection(connect(*args, **kwargs), self.statements)
+
+        self._patcher = patch.object(app_module, "get_db_connection", recording_connection)
+        self._patcher.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._patcher.stop()
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def report(self, budget=None):
+        """The recorded statements, numbered, for an assertion message."""
+        header = f"{self.count} queries"
+        if budget is not None:
+            header += f" (budget {budget})"
+        lines = [" ".join(str(sql).split()) for sql in self.statements]
+        return "\n".join([header] + [f"  {i}. {line}" for i, line in enumerate(lines, 1)])
+
+
+@contextlib.contextmanager
+def max_queries(budget):
+    """Fail if the block sends more than ``budget`` statements."""
+    with QueryRecorder() as recorder:
+        yield recorder
+    if recorder.count > budget:
+        raise AssertionError(recorder.report(budget))
+
+
+class QueryBudgetMixin:
+    """unittest.TestCase mixin providing assertMaxQueries()."""
+
+    def assertMaxQueries(self, budget):
+        return max_queries(budget)
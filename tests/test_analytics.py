@@ -0,0 +1,109 @@
+"""
+Unit Tests for the admin analytics views (analytics.py)
+
+Covers concurrent refreshes with recorded durations, and the shape and
+compactness of the chart payloads.
+"""
+
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import analytics
+
+
+class RefreshTests(unittest.TestCase):
+    """Tests for analytics.refresh with a mocked connection"""
+
+    def setUp(self):
+        self.conn = MagicMock()
+        self.cursor = self.conn.cursor.return_value
+        self.cursor.fetchone.return_value = (42,)
+
+    def _statements(self):
+        return [c[0][0].strip() for c in self.cursor.execute.call_args_list]
+
+    def test_each_view_refreshed_concurrently_and_committed(self):
+        """One REFRESH ... CONCURRENTLY and one commit per view"""
+        results = analytics.refresh(self.conn)
+
+        refreshes = [s for s in self._statements() if s.startswith("REFRESH")]
+        self.assertEqual(refreshes, [
+            f"REFRESH MATERIALIZED VIEW CONCURRENTLY public.{view}" for view in analytics.VIEWS
+        ])
+        self.assertEqual(self.conn.commit.call_count, len(analytics.VIEWS))
+        self.assertEqual([(view, rows) for view, _, rows in results],
+                         [(view, 42) for view in analytics.VIEWS])
+
+    def test_duration_is_recorded(self):
+        """The refresh time and row count are upserted into analytics_refreshes"""
+        analytics.refresh(self.conn, ["analytics_module_popularity"])
+        sql, params = self.cursor.execute.call_args_list[-1][0]
+        self.assertIn("INSERT INTO analytics_refreshes", sql)
+        self.assertEqual(params[0], "analytics_module_popularity")
+        self.assertGreaterEqual(params[1], 0)
+        self.assertEqual(params[2], 42)
+
+    def test_unknown_view_is_rejected(self):
+        """View names are checked before being put into SQL"""
+        with self.assertRaises(ValueError):
+            analytics.refresh(self.conn, ["customers; DROP TABLE bookings"])
+        self.cursor.execute.assert_not_called()
+        self.conn.rollback.assert_called_once()
+
+    def test_failed_refresh_rolls_back(self):
+        """A failed refresh leaves earlier views committed and rolls back the rest"""
+        self.cursor.execute.side_effect = [None, None, None, None, Exception("lock timeout")]
+        with self.assertRaises(Exception):
+            analytics.refresh(self.conn)
+        self.assertEqual(self.conn.commit.call_count, 1)
+        self.conn.rollback.assert_called_once()
+
+
+class ChartPayloadTests(unittest.TestCase):
+    """Tests for the chart payload builders"""
+
+    def test_course_weekly_fills_missing_weeks(self):
+        """Every series has one value per label, zero where a course had no bookings"""
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [
+            (date(2025, 1, 6), "Animation", 3),
+            (date(2025, 1, 13), "Animation", 5),
+            (date(2025, 1, 13), "Storyboards", 2),
+        ]
+        chart = analytics.course_weekly_chart(cursor)
+        self.assertEqual(chart["labels"], ["2025-01-06", "2025-01-13"])
+        self.assertEqual(chart["series"], [
+            {"name": "Animation", "data": [3, 5]},
+            {"name": "Storyboards", "data": [0, 2]},
+        ])
+
+    def test_conversion_is_column_oriented(self):
+        """One list per measure, aligned with the week labels"""
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [
+            (date(2025, 1, 6), 10, 4, 3, Decimal("2.5")),
+            (date(2025, 1, 13), 8, 0, 0, None),
+        ]
+        chart = analytics.conversion_chart(cursor)
+        self.assertEqual(chart["registered"], [10, 8])
+        self.assertEqual(chart["booked"], [4, 0])
+        self.assertEqual(chart["avg_days_to_first_booking"], [2.5, None])
+
+    def test_json_is_compact(self):
+        """Payloads are serialised without whitespace"""
+        text = analytics.to_json({"labels": ["a", "b"], "data": [1, 2]})
+        self.assertEqual(text, '{"labels":["a","b"],"data":[1,2]}')
+
+    def test_last_refreshes(self):
+        cursor = MagicMock()
+        at = datetime(2025, 1, 6, tzinfo=timezone.utc)
+        cursor.fetchall.return_value = [("analytics_course_weekly", at, Decimal("12.5"), 30)]
+        self.assertEqual(analytics.last_refreshes(cursor),
+                         {"analytics_course_weekly": (at, 12.5, 30)})
+        self.assertIn("2025-01-06", analytics.to_json({"at": at}))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -10,10 +10,21 @@ Comprehensive coverage including:
 
 import sys
 import os
+import tempfile
+import time
 import unittest
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
 from werkzeug.security import generate_password_hash
-from app import app
+from app import (
+    app, create_app, reset_worker_state, get_db_connection, ReadinessCheck, PENDING_PAGE_SIZE,
+    BOOKINGS_PAGE_SIZE, CUSTOMERS_PAGE_SIZE, to_prefix_tsquery, purge_archived,
+)
+import psycopg2.errors
+import audit
+import db
+from config import TestingConfig, ProductionConfig
+from db import CircuitOpenError
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
@@ -32,6 +43,12 @@ class GhibliBookingSystemTests(unittest.TestCase):
         self.addCleanup(patcher.stop)
         self.mock_db = patcher.start()
 
+        # Admin changes must not reach the real audit trail, whose flusher
+        # thread would try to connect while later tests run.
+        patcher = patch.object(audit.trail, "enabled", False)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
         self.mock_conn = MagicMock()
         self.mock_cursor = MagicMock()
         self.mock_db.return_value = self.mock_conn
@@ -71,6 +88,93 @@ class GhibliBookingSystemTests(unittest.TestCase):
         response = self.client.get("/")
         self.assertEqual(response.status_code, 200)
 
+    # =========================================================================
+    # HEALTH CHECKS
+    # =========================================================================
+
+    def test_healthz_does_not_touch_db(self):
+        """Liveness probe returns 200 without opening a DB connection"""
+        response = self.client.get("/healthz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"ok")
+        self.mock_db.assert_not_called()
+
+    def test_readyz_reports_db_round_trip(self):
+        """Readiness probe runs SELECT 1 and reports ok"""
+        with patch("app.readiness", ReadinessCheck(ttl=5)):
+            response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "ok")
+        self.assertIn("db_ms", response.get_json())
+
+    def test_readyz_result_is_cached(self):
+        """Repeated readiness probes within the TTL hit the DB once"""
+        with patch("app.readiness", ReadinessCheck(ttl=60)):
+            for _ in range(5):
+                self.client.get("/readyz")
+        self.assertEqual(self.mock_db.call_count, 1)
+
+    def test_readyz_db_down_returns_503(self):
+        """Readiness probe returns 503 when the DB is unreachable"""
+        self.mock_db.side_effect = Exception("connection refused")
+        with patch("app.readiness", ReadinessCheck(ttl=5)):
+            response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.get_json()["status"], "unavailable")
+
+    def test_readyz_slow_db_is_degraded(self):
+        """Readiness probe flags a slow round trip as degraded but stays in rotation"""
+        with patch("app.readiness", ReadinessCheck(ttl=5, max_db_ms=-1)):
+            response = self.client.get("/readyz")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["status"], "degraded")
+
+    # =========================================================================
+    # METRICS
+    # =========================================================================
+
+    def _sample(self, name, **labels):
+        from prometheus_client import REGISTRY
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_metrics_exposes_prometheus_text(self):
+        """/metrics serves the text format without touching the DB"""
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        self.assertIn(b"ghibli_http_request_duration_seconds", response.data)
+        self.mock_db.assert_not_called()
+
+    def test_requests_are_timed_per_endpoint(self):
+        """Each request lands in its endpoint's latency histogram"""
+        labels = {"endpoint": "healthz", "method": "GET", "status": "200"}
+        before = self._sample("ghibli_http_request_duration_seconds_count", **labels)
+        self.client.get("/healthz")
+        self.client.get("/healthz")
+        after = self._sample("ghibli_http_request_duration_seconds_count", **labels)
+        self.assertEqual(after - before, 2)
+        self.assertEqual(
+            self._sample("ghibli_http_requests_in_flight", endpoint="healthz"), 0
+        )
+
+    def test_password_checks_are_timed(self):
+        """Hash verification during login is recorded"""
+        before = self._sample("ghibli_password_hash_seconds_count", operation="verify")
+        self.mock_cursor.fetchone.return_value = (
+            4, "Abbie", "Smith", "abbie@example.com", "123", generate_password_hash("pw")
+        )
+        self.client.post("/login", data={"email": "abbie@example.com", "password": "pw"})
+        after = self._sample("ghibli_password_hash_seconds_count", operation="verify")
+        self.assertEqual(after - before, 1)
+
+    def test_metrics_token_required_when_configured(self):
+        """With METRICS_TOKEN set, scrapes need the bearer token"""
+        self.app.config["METRICS_TOKEN"] = "s3cret"
+        self.addCleanup(self.app.config.pop, "METRICS_TOKEN")
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        response = self.client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+        self.assertEqual(response.status_code, 200)
+
     # =========================================================================
     # CUSTOMER LOGIN
     # =========================================================================
@@ -105,6 +209,28 @@ class GhibliBookingSystemTests(unittest.TestCase):
             self.assertEqual(sess["email"], "abbie@example.com")
             self.assertEqual(sess["phone"], "123-456-7890")
 
+    @patch("app.get_db_connection")
+    def test_login_email_is_case_insensitive(self, mock_db):
+        """Mixed-case email matches via lower(email); session keeps the stored one"""
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_db.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = (
+            4, "Abbie", "Smith", "abbie@example.com", "123-456-7890",
+            generate_password_hash("group1"),
+        )
+
+        self.client.post(
+            "/login", data={"email": "Abbie@Example.COM", "password": "group1"}
+        )
+
+        sql, params = mock_cursor.execute.call_args_list[0][0]
+        self.assertIn("lower(email) = lower(%s)", sql)
+        self.assertEqual(params, ("Abbie@Example.COM",))
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess["email"], "abbie@example.com")
+
     @patch("app.get_db_connection")
     def test_login_hashed_password(self, mock_db):
         """Login succeeds with a werkzeug-hashed password"""
@@ -363,6 +489,28 @@ class GhibliBookingSystemTests(unittest.TestCase):
         response = self.client.get("/dashboard")
         self.assertEqual(response.status_code, 200)
 
+    def test_dashboard_shows_modules_from_one_query(self):
+        """Bookings arrive with their modules already nested; one SELECT in total"""
+        with self.client.session_transaction() as sess:
+            sess["role"] = "customer"
+            sess["email"] = "abbie@example.com"
+        self.mock_cursor.fetchall.return_value = [
+            ({"booking_id": 9, "course_id": 2, "extra": None, "status": "approved",
+              "course": "Animation", "description": "Drawing", "submitted_at": "2025-01-06 10:00",
+              "updated_at": "2025-01-07 09:30",
+              "modules": [{"module_id": 1, "name": "Backgrounds"},
+                          {"module_id": 2, "name": "Key frames"}]},),
+        ]
+
+        response = self.client.get("/dashboard")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"Backgrounds, Key frames", response.data)
+        self.assertIn(b"approved", response.data)
+        self.assertIn(b"updated 2025-01-07 09:30", response.data)
+        self.assertEqual(self.mock_cursor.execute.call_count, 1)
+        self.assertIn("json_agg", self.mock_cursor.execute.call_args[0][0])
+
     @patch('app.get_customer_by_email')
     def test_dashboard_update_missing_course_id(self, mock_get_customer):
         """POST to dashboard without course ID returns 400"""
@@ -516,8 +664,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
 
         self.mock_cursor.fetchone.side_effect = [
             (4,),    # customer_id
-            None,    # no duplicate
-            (999,),  # new booking_id
+            (999,),  # new booking_id (no conflict)
         ]
 
         response = self.client.post(
@@ -538,7 +685,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
     def test_create_booking_without_modules(self, mock_get_customer):
         """Booking POST without modules still succeeds"""
         self._login_as_customer()
-        self.mock_cursor.fetchone.side_effect = [(4,), None, (888,)]
+        self.mock_cursor.fetchone.side_effect = [(4,), (888,)]
 
         response = self.client.post(
             "/book",
@@ -550,6 +697,23 @@ class GhibliBookingSystemTests(unittest.TestCase):
         with self.client.session_transaction() as sess:
             self.assertEqual(sess["last_booking_ids"], [888])
 
+    @patch('app.jobs.enqueue')
+    @patch('app.get_customer_by_email')
+    def test_booking_post_enqueues_confirmation(self, mock_get_customer, mock_enqueue):
+        """Booking POST queues one confirmation job in the same transaction"""
+        self._login_as_customer()
+        self.mock_cursor.fetchone.side_effect = [(4,), (999,)]
+
+        self.mock_conn.commit.reset_mock()
+        mock_enqueue.side_effect = lambda *a: self.mock_conn.commit.assert_not_called()
+
+        self.client.post("/book", data={"courses": ["1"]})
+
+        mock_enqueue.assert_called_once_with(
+            self.mock_cursor, "booking_confirmation", {"booking_ids": [999]}
+        )
+        self.mock_conn.commit.assert_called_once()
+
     @patch('app.get_customer_by_email')
     def test_booking_post_customer_not_found(self, mock_get_customer):
         """Booking POST redirects to login when customer record is not in DB"""
@@ -571,10 +735,10 @@ class GhibliBookingSystemTests(unittest.TestCase):
         """Booking POST silently skips a course the customer already booked"""
         self._login_as_customer()
 
-        # customer_id found, then duplicate check returns an existing booking_id
+        # customer_id found, then ON CONFLICT DO NOTHING returns no row
         self.mock_cursor.fetchone.side_effect = [
             (4,),   # customer_id
-            (55,),  # duplicate found — should continue (skip)
+            None,   # already booked — should continue (skip)
         ]
 
         response = self.client.post(
@@ -588,6 +752,70 @@ class GhibliBookingSystemTests(unittest.TestCase):
         with self.client.session_transaction() as sess:
             self.assertEqual(sess["last_booking_ids"], [])
 
+    @patch('app.get_customer_by_email')
+    def test_booking_post_capped_course_takes_a_seat(self, mock_get_customer):
+        """A capped course allocates a seat from its shards after the insert"""
+        self._login_as_customer()
+        self.mock_cursor.fetchall.return_value = [(1,)]
+        self.mock_cursor.fetchone.side_effect = [(4,), (999,), (3,)]
+
+        self.client.post("/book", data={"courses": ["1"]})
+
+        statements = [c[0][0] for c in self.mock_cursor.execute.call_args_list]
+        self.assertTrue(any("FOR UPDATE SKIP LOCKED" in s for s in statements))
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess["last_booking_ids"], [999])
+
+    @patch('app.time.sleep')
+    @patch('app.get_customer_by_email')
+    def test_booking_post_retries_when_shards_busy(self, mock_get_customer, mock_sleep):
+        """Busy shards with seats left mean back off and retry, not sold out"""
+        self._login_as_customer()
+        self.mock_cursor.fetchall.return_value = [(1,)]
+        self.mock_cursor.fetchone.side_effect = [(4,), (999,), None, (True,), (2,)]
+
+        self.client.post("/book", data={"courses": ["1"]})
+
+        mock_sleep.assert_called_once()
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess["last_booking_ids"], [999])
+
+    @patch('app.get_customer_by_email')
+    def test_booking_post_sold_out_course(self, mock_get_customer):
+        """A sold-out course removes the fresh booking and says so"""
+        self._login_as_customer()
+        self.mock_cursor.fetchall.return_value = [(1,)]
+        self.mock_cursor.fetchone.side_effect = [(4,), (999,), None, (False,)]
+
+        response = self.client.post("/book", data={"courses": ["1"]})
+
+        self.assertTrue(response.location.endswith("/book"))
+        self.mock_cursor.execute.assert_any_call(
+            "DELETE FROM bookings WHERE booking_id = %s", (999,)
+        )
+        with self.client.session_transaction() as sess:
+            self.assertIn("fully booked", sess["_flashes"][0][1])
+
+    @patch('app.get_customer_by_email')
+    def test_booking_post_uses_conflict_handling(self, mock_get_customer):
+        """Duplicates are resolved by the unique constraint, not a prior SELECT"""
+        self._login_as_customer()
+        self.mock_cursor.reset_mock()
+        self.mock_cursor.fetchone.side_effect = [(4,), (1001,), None]
+
+        self.client.post("/book", data={"courses": ["1", "2"]})
+
+        statements = [c[0][0] for c in self.mock_cursor.execute.call_args_list]
+        self.assertFalse(any("SELECT booking_id FROM bookings" in s for s in statements))
+        inserts = [s for s in statements if "INSERT INTO bookings" in s]
+        self.assertEqual(len(inserts), 2)
+        self.assertIn(
+            "ON CONFLICT (customer_id, course_id) WHERE status <> 'cancelled' DO NOTHING",
+            inserts[0],
+        )
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess["last_booking_ids"], [1001])
+
     @patch("app.get_db_connection")
     def test_booking_post_db_exception(self, mock_db):
         """Booking POST returns 500 when DB raises during insert"""
@@ -631,6 +859,60 @@ class GhibliBookingSystemTests(unittest.TestCase):
         self.assertEqual(response.status_code, 500)
         self.assertIn(b"Error loading booking page", response.data)
 
+    # =========================================================================
+    # COURSE SEARCH
+    # =========================================================================
+
+    def test_prefix_tsquery_strips_syntax(self):
+        """Every word becomes a prefix term; tsquery operators are dropped"""
+        self.assertEqual(to_prefix_tsquery("Studio Ghib"), "studio:* & ghib:*")
+        self.assertEqual(to_prefix_tsquery("a & (b | !c):*"), "a:* & b:* & c:*")
+        self.assertEqual(to_prefix_tsquery("  '!&| "), "")
+        self.assertEqual(to_prefix_tsquery("foo_bar"), "foo:* & bar:*")
+
+    def test_course_search_requires_customer(self):
+        """Search is only available to logged-in customers"""
+        response = self.client.get("/book/search?q=anim")
+        self.assertEqual(response.status_code, 302)
+
+    @patch('app.get_customer_by_email')
+    def test_course_search_returns_ranked_json(self, mock_get_customer):
+        """Search returns ranked courses with their matching modules"""
+        self._login_as_customer()
+        self.mock_cursor.fetchall.return_value = [
+            (2, "Spirited Away Studio", "Learn animation", 0.6079271,
+             [{"id": 11, "name": "Animation basics"}]),
+            (1, "Sound Design", "Foley for anime", 0.24317084, []),
+        ]
+        response = self.client.get("/book/search?q=Anim")
+        data = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r["id"] for r in data["results"]], [2, 1])
+        self.assertEqual(data["results"][0]["rank"], 0.6079)
+        self.assertEqual(data["results"][0]["modules"][0]["id"], 11)
+
+        sql, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("search_vector @@ to_tsquery('english', %(q)s)", sql)
+        self.assertEqual(params["q"], "anim:*")
+
+    @patch('app.get_customer_by_email')
+    def test_course_search_blank_query_skips_db(self, mock_get_customer):
+        """A query with no words returns nothing without touching the DB"""
+        self._login_as_customer()
+        self.mock_db.reset_mock()
+        response = self.client.get("/book/search?q=%20%26%20")
+        self.assertEqual(response.get_json()["results"], [])
+        self.mock_db.assert_not_called()
+
+    @patch('app.get_customer_by_email')
+    def test_course_search_db_exception(self, mock_get_customer):
+        """A failing search returns a JSON 500"""
+        self._login_as_customer()
+        self.mock_cursor.execute.side_effect = Exception("DB Error")
+        response = self.client.get("/book/search?q=anim")
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("error", response.get_json())
+
     # =========================================================================
     # BOOKING SUBMITTED
     # =========================================================================
@@ -656,9 +938,8 @@ class GhibliBookingSystemTests(unittest.TestCase):
         with self.client.session_transaction() as sess:
             sess["last_booking_ids"] = [101]
 
-        self.mock_cursor.fetchall.side_effect = [
-            [(101, "Test Course Name", "Test Extra")],
-            [("Module A",), ("Module B",)],
+        self.mock_cursor.fetchall.return_value = [
+            (101, "Test Course Name", "Test Extra", ["Module A", "Module B"]),
         ]
 
         response = self.client.get("/booking_submitted")
@@ -714,6 +995,28 @@ class GhibliBookingSystemTests(unittest.TestCase):
             self.assertEqual(sess["user"], "admin@example.com")
             self.assertEqual(sess["name"], "Admin User")
 
+    @patch("app.get_db_connection")
+    def test_admin_login_case_insensitive_rehash_by_id(self, mock_db):
+        """Admin email matches any case; the legacy rehash targets the admin_id"""
+        mock_conn = MagicMock()
+        mock_cursor = MagicMock()
+        mock_db.return_value = mock_conn
+        mock_conn.cursor.return_value = mock_cursor
+        mock_cursor.fetchone.return_value = (
+            1, "Admin User", "admin@example.com", "adminpass"
+        )
+
+        self.client.post(
+            "/admin/login", data={"email": "ADMIN@example.com", "password": "adminpass"}
+        )
+
+        lookup, rehash = mock_cursor.execute.call_args_list
+        self.assertIn("lower(email) = lower(%s)", lookup[0][0])
+        self.assertIn("WHERE admin_id = %s", rehash[0][0])
+        self.assertEqual(rehash[0][1][1], 1)
+        with self.client.session_transaction() as sess:
+            self.assertEqual(sess["user"], "admin@example.com")
+
     @patch("app.get_db_connection")
     def test_admin_login_hashed_password_success(self, mock_db):
         """Admin login succeeds with a werkzeug-hashed password"""
@@ -860,6 +1163,24 @@ class GhibliBookingSystemTests(unittest.TestCase):
         ]
         response = self.client.get("/admin/bookings")
         self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"Older bookings", response.data)
+        params = self.mock_cursor.execute.call_args[0][1]
+        self.assertIsNone(params["before"])
+        self.assertEqual(params["limit"], BOOKINGS_PAGE_SIZE + 1)
+
+    def test_manage_bookings_keyset_pagination(self):
+        """A full page links to older bookings by booking_id"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = [
+            (i, "c@example.com", "Course", None)
+            for i in range(200, 200 - BOOKINGS_PAGE_SIZE - 1, -1)
+        ]
+        response = self.client.get("/admin/bookings")
+        self.assertIn(b"Older bookings", response.data)
+        self.assertIn(f"before={200 - BOOKINGS_PAGE_SIZE + 1}\"".encode(), response.data)
+
+        self.client.get("/admin/bookings", query_string={"before": "151"})
+        self.assertEqual(self.mock_cursor.execute.call_args[0][1]["before"], 151)
 
     @patch("app.get_db_connection")
     def test_manage_bookings_db_exception(self, mock_db):
@@ -874,7 +1195,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
     def test_edit_booking_get_loads(self):
         """Edit booking form loads with current data"""
         self._set_admin_session()
-        self.mock_cursor.fetchone.return_value = (1, "Extra req", 101, "Howl's Moving Castle")
+        self.mock_cursor.fetchone.return_value = (1, "Extra req", 101, "Howl's Moving Castle", 3)
         self.mock_cursor.fetchall.return_value = [
             (101, "Howl's Moving Castle"),
             (102, "Spirited Away"),
@@ -897,7 +1218,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
         self._set_admin_session()
         response = self.client.post(
             "/admin/bookings/1/edit",
-            data={"course_id": "1", "extra": "Updated extra"},
+            data={"course_id": "1", "extra": "Updated extra", "version": "3"},
             follow_redirects=False,
         )
         self.assertEqual(response.status_code, 302)
@@ -915,13 +1236,66 @@ class GhibliBookingSystemTests(unittest.TestCase):
 
         response = self.client.post(
             "/admin/bookings/1/edit",
-            data={"course_id": "1", "extra": "Will fail"},
+            data={"course_id": "1", "extra": "Will fail", "version": "1"},
             follow_redirects=False,
         )
         # Route catches the exception and redirects away
         self.assertEqual(response.status_code, 302)
         mock_conn.rollback.assert_called()
 
+    def test_edit_booking_update_is_version_checked(self):
+        """The UPDATE only matches the version the form was rendered from"""
+        self._set_admin_session()
+        self.client.post(
+            "/admin/bookings/1/edit",
+            data={"course_id": "1", "extra": "Updated extra", "version": "3"},
+        )
+        sql, params = self.mock_cursor.execute.call_args_list[0][0]
+        self.assertIn("WHERE booking_id = %s AND version = %s", sql)
+        self.assertEqual(params[2:], (1, 3))
+
+    def test_edit_booking_stale_version_conflicts(self):
+        """A stale edit is not saved; the admin gets a 409 with the differences"""
+        self._set_admin_session()
+        self.mock_cursor.fetchone.side_effect = [
+            None,  # UPDATE ... AND version = 3 matched nothing
+            (1, "Changed by someone else", 101, "Spirited Away", 4),
+        ]
+        self.mock_cursor.fetchall.return_value = [(101, "Spirited Away")]
+
+        response = self.client.post(
+            "/admin/bookings/1/edit",
+            data={"course_id": "101", "extra": "Mine", "version": "3"},
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(b"Changed by someone else", response.data)
+        self.assertIn(b'name="version" value="4"', response.data)
+        self.mock_conn.commit.assert_not_called()
+        self.mock_conn.rollback.assert_called()
+
+    def test_edit_booking_stale_but_identical_is_not_a_conflict(self):
+        """If the row already holds what was submitted, there is nothing to resolve"""
+        self._set_admin_session()
+        self.mock_cursor.fetchone.side_effect = [None, (1, "Mine", 101, "Spirited Away", 4)]
+        self.mock_cursor.fetchall.return_value = [(101, "Spirited Away")]
+
+        response = self.client.post(
+            "/admin/bookings/1/edit",
+            data={"course_id": "101", "extra": "Mine", "version": "3"},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_edit_booking_without_version_is_refused(self):
+        """Forms rendered before versioning cannot overwrite blindly"""
+        self._set_admin_session()
+        response = self.client.post(
+            "/admin/bookings/1/edit", data={"course_id": "1", "extra": "Blind"}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response.location.endswith("/admin/bookings/1/edit"))
+        self.mock_cursor.execute.assert_not_called()
+
     def test_delete_booking_calls_db_and_commits(self):
         """Deleting a booking executes both DELETE statements and commits"""
         self._set_admin_session()
@@ -965,6 +1339,209 @@ class GhibliBookingSystemTests(unittest.TestCase):
         self.assertEqual(response.status_code, 302)
         mock_conn.rollback.assert_called()
 
+    def test_bulk_bookings_requires_admin(self):
+        """Bulk actions reject non-admin sessions"""
+        response = self.client.post(
+            "/admin/bookings/bulk", data={"action": "delete", "booking_ids": ["1"]}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.mock_cursor.execute.assert_not_called()
+
+    def test_bulk_approve_is_one_statement(self):
+        """Approving N bookings issues one seat check and a single UPDATE with all ids"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.side_effect = [[], [], [(1,), (2,), (3,)], []]
+        response = self.client.post(
+            "/admin/bookings/bulk",
+            data={"action": "approve", "booking_ids": ["3", "1", "2", "3"]},
+            follow_redirects=True,
+        )
+        (superseded, _), (claim, _), (sql, params) = [
+            c[0] for c in self.mock_cursor.execute.call_args_list[:3]
+        ]
+        self.assertIn("status = 'cancelled'", superseded)
+        self.assertIn("seat_shard IS NULL", claim)
+        self.assertIn("UPDATE bookings", sql)
+        self.assertIn("ANY(%s)", sql)
+        self.assertEqual(params, ("approved", [1, 2, 3], "approved", []))
+        self.mock_conn.commit.assert_called_once()
+        self.assertIn(b"Approved 3 of 3 selected booking(s).", response.data)
+
+    @patch("app.audit.record")
+    def test_bulk_audits_only_changed_bookings(self, mock_record):
+        """Ids already in the target status or missing get no audit event"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = [(2,)]
+        response = self.client.post(
+            "/admin/bookings/bulk",
+            data={"action": "cancel", "booking_ids": ["1", "2", "99"]},
+            headers={"Accept": "application/json"},
+        )
+        self.assertIn("RETURNING booking_id", self.mock_cursor.execute.call_args[0][0])
+        self.assertEqual(
+            response.get_json(), {"action": "cancel", "requested": 3, "affected": 1}
+        )
+        mock_record.assert_called_once_with(
+            "admin@example.com", "bulk_cancel", "booking", 2, {}
+        )
+
+    def test_bulk_delete_removes_modules_then_bookings(self):
+        """Bulk delete is one DELETE per table, child rows first"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = [(4,), (5,)]
+        response = self.client.post(
+            "/admin/bookings/bulk",
+            data={"action": "delete", "booking_ids": ["4", "5"]},
+            headers={"Accept": "application/json"},
+        )
+        first, second = self.mock_cursor.execute.call_args_list
+        self.assertIn("DELETE FROM booking_modules", first[0][0])
+        self.assertIn("DELETE FROM bookings", second[0][0])
+        self.assertEqual(second[0][1], ([4, 5],))
+        self.assertEqual(
+            response.get_json(), {"action": "delete", "requested": 2, "affected": 2}
+        )
+
+    def test_bulk_bookings_rejects_bad_input(self):
+        """Unknown actions or missing/invalid ids never reach the database"""
+        self._set_admin_session()
+        for data in ({"action": "approve"},
+                     {"action": "archive", "booking_ids": ["1"]},
+                     {"action": "cancel", "booking_ids": ["x"]}):
+            response = self.client.post(
+                "/admin/bookings/bulk", data=data, headers={"Accept": "application/json"}
+            )
+            self.assertEqual(response.status_code, 400)
+        self.mock_db.assert_not_called()
+
+    def test_bulk_bookings_db_exception_rolls_back(self):
+        """A failing statement rolls back the whole batch"""
+        self._set_admin_session()
+        self.mock_cursor.execute.side_effect = Exception("DB Error")
+        response = self.client.post(
+            "/admin/bookings/bulk", data={"action": "cancel", "booking_ids": ["1", "2"]}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.mock_conn.rollback.assert_called_once()
+        self.mock_conn.commit.assert_not_called()
+
+    def test_bulk_bookings_returns_to_pending_view(self):
+        """Bulk actions posted from the pending view redirect back to it"""
+        self._set_admin_session()
+        response = self.client.post(
+            "/admin/bookings/bulk",
+            data={"action": "approve", "booking_ids": ["1"], "return_to": "pending_bookings"},
+        )
+        self.assertTrue(response.location.endswith("/admin/bookings/pending"))
+
+    # =========================================================================
+    # ADMIN PENDING REVIEW
+    # =========================================================================
+
+    def test_pending_bookings_requires_admin(self):
+        """Pending review rejects non-admin sessions"""
+        response = self.client.get("/admin/bookings/pending")
+        self.assertEqual(response.status_code, 302)
+
+    def test_pending_bookings_lists_only_pending(self):
+        """Pending review filters on the enum and renders oldest first"""
+        self._set_admin_session()
+        submitted = datetime(2026, 1, 2, 9, 30, tzinfo=timezone.utc)
+        self.mock_cursor.fetchall.return_value = [
+            (7, "customer@example.com", "Spirited Away", "Window seat", submitted)
+        ]
+        response = self.client.get("/admin/bookings/pending")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"#7", response.data)
+        self.assertIn(b"2026-01-02 09:30", response.data)
+        self.assertNotIn(b"Next page", response.data)
+        sql, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("b.status = 'pending'", sql)
+        self.assertIsNone(params["after_id"])
+
+    def test_pending_bookings_keyset_pagination(self):
+        """A full page links to the next one by (submitted_at, booking_id)"""
+        self._set_admin_session()
+        submitted = datetime(2026, 1, 2, 9, 30, tzinfo=timezone.utc)
+        self.mock_cursor.fetchall.return_value = [
+            (i, "c@example.com", "Course", None, submitted)
+            for i in range(1, PENDING_PAGE_SIZE + 2)
+        ]
+        response = self.client.get("/admin/bookings/pending")
+        self.assertIn(b"Next page", response.data)
+        self.assertIn(f"%2B00:00,{PENDING_PAGE_SIZE}\"".encode(), response.data)
+
+        self.client.get(
+            "/admin/bookings/pending", query_string={"after": f"{submitted.isoformat()},50"}
+        )
+        params = self.mock_cursor.execute.call_args[0][1]
+        self.assertEqual(params["after_id"], 50)
+        self.assertEqual(params["after_ts"], submitted.isoformat())
+
+    # =========================================================================
+    # ADMIN REVIEW QUEUE
+    # =========================================================================
+
+    def test_review_queue_requires_admin(self):
+        """Review queue rejects non-admin sessions"""
+        response = self.client.get("/admin/review-queue")
+        self.assertEqual(response.status_code, 302)
+        self.mock_db.assert_not_called()
+
+    def test_review_queue_claims_with_skip_locked(self):
+        """Each visit leases the next batch to this admin and commits the claim"""
+        self._set_admin_session()
+        submitted = datetime(2026, 1, 2, 9, 30, tzinfo=timezone.utc)
+        self.mock_cursor.fetchall.return_value = [
+            (7, "customer@example.com", "Spirited Away", None, submitted,
+             datetime(2026, 1, 2, 9, 45, tzinfo=timezone.utc)),
+        ]
+        response = self.client.get("/admin/review-queue")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"#7", response.data)
+        self.assertIn(b"reserved for you until 09:45", response.data)
+
+        sql, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+        self.assertIn("review_claimed_until < NOW()", sql)
+        self.assertEqual(params["reviewer"], "admin@example.com")
+        self.assertEqual(params["limit"], app.config["REVIEW_BATCH_SIZE"])
+        self.assertEqual(params["lease"], app.config["REVIEW_LEASE_SECONDS"])
+        self.mock_conn.commit.assert_called_once()
+
+    def test_review_queue_empty(self):
+        """An empty queue renders a friendly message"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = []
+        response = self.client.get("/admin/review-queue")
+        self.assertIn(b"Nothing left to review", response.data)
+
+    def test_review_queue_db_exception(self):
+        """A failed claim rolls back and returns 500"""
+        self._set_admin_session()
+        self.mock_cursor.execute.side_effect = Exception("DB Error")
+        response = self.client.get("/admin/review-queue")
+        self.assertEqual(response.status_code, 500)
+        self.mock_conn.rollback.assert_called_once()
+
+    def test_release_review_claims(self):
+        """Releasing clears only this admin's pending claims"""
+        self._set_admin_session()
+        self.mock_cursor.rowcount = 4
+        response = self.client.post("/admin/review-queue/release", follow_redirects=True)
+        self.assertIn(b"Released 4 booking(s)", response.data)
+        sql, params = self.mock_cursor.execute.call_args_list[0][0]
+        self.assertIn("review_claimed_by = NULL", sql)
+        self.assertEqual(params, ("admin@example.com",))
+
+    @patch("app.get_db_connection")
+    def test_pending_bookings_db_exception(self, mock_db):
+        """Pending review returns 500 when DB raises"""
+        self._set_admin_session()
+        mock_db.side_effect = Exception("DB Error")
+        response = self.client.get("/admin/bookings/pending")
+        self.assertEqual(response.status_code, 500)
+
     # =========================================================================
     # ADMIN CUSTOMERS
     # =========================================================================
@@ -977,6 +1554,24 @@ class GhibliBookingSystemTests(unittest.TestCase):
         ]
         response = self.client.get("/admin/customers")
         self.assertEqual(response.status_code, 200)
+        self.assertNotIn(b"Older customers", response.data)
+        self.assertIsNone(self.mock_cursor.execute.call_args[0][1]["before"])
+
+    def test_admin_customers_keyset_pagination(self):
+        """A full page links to older customers by customer_id"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = [
+            (i, "John", "Doe", f"john{i}@example.com", None, "2024-01-01")
+            for i in range(100, 100 - CUSTOMERS_PAGE_SIZE - 1, -1)
+        ]
+        response = self.client.get("/admin/customers")
+        self.assertIn(f"before={100 - CUSTOMERS_PAGE_SIZE + 1}\"".encode(), response.data)
+        self.assertNotIn(f"#{100 - CUSTOMERS_PAGE_SIZE}<".encode(), response.data)
+
+        self.client.get("/admin/customers", query_string={"before": "51"})
+        params = self.mock_cursor.execute.call_args[0][1]
+        self.assertEqual(params["before"], 51)
+        self.assertEqual(params["limit"], CUSTOMERS_PAGE_SIZE + 1)
 
     @patch("app.get_db_connection")
     def test_admin_customers_db_exception(self, mock_db):
@@ -992,7 +1587,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
         """Edit customer form loads with current customer data"""
         self._set_admin_session()
         self.mock_cursor.fetchone.return_value = (
-            1, "John", "Doe", "john@example.com", "555-1234"
+            1, "John", "Doe", "john@example.com", "555-1234", 2
         )
         response = self.client.get("/admin/customers/1/edit")
         self.assertEqual(response.status_code, 200)
@@ -1016,6 +1611,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
                 "last_name": "Smith",
                 "email": "jane@example.com",
                 "phone": "555-5678",
+                "version": "2",
             },
             follow_redirects=True,
         )
@@ -1056,6 +1652,7 @@ class GhibliBookingSystemTests(unittest.TestCase):
                 "last_name": "Smith",
                 "email": "jane@example.com",
                 "phone": "555",
+                "version": "1",
             },
             follow_redirects=False,
         )
@@ -1063,6 +1660,23 @@ class GhibliBookingSystemTests(unittest.TestCase):
         self.assertEqual(response.status_code, 302)
         mock_conn.rollback.assert_called()
 
+    def test_edit_customer_stale_version_conflicts(self):
+        """Concurrent customer edits end in a 409 diff, not a silent overwrite"""
+        self._set_admin_session()
+        self.mock_cursor.fetchone.side_effect = [
+            None,
+            (1, "Jane", "Smith", "jane.new@example.com", "555", 5),
+        ]
+        response = self.client.post(
+            "/admin/customers/1/edit",
+            data={"name": "Jane", "last_name": "Smith", "email": "jane@example.com",
+                  "phone": "555", "version": "4"},
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(b"jane.new@example.com", response.data)
+        self.assertNotIn(b"<th>Phone</th>", response.data)
+        self.mock_conn.commit.assert_not_called()
+
     def test_delete_customer_calls_db_and_commits(self):
         """Deleting a customer executes all DELETE statements and commits"""
         self._set_admin_session()
@@ -1124,13 +1738,22 @@ class GhibliBookingSystemTests(unittest.TestCase):
     def test_manage_courses_get_loads(self):
         """Manage courses GET returns 200 and lists courses for admin"""
         self._set_admin_session()
-        self.mock_cursor.fetchall.return_value = [
-            (1, "Spirited Away Studio", "Learn animation"),
-            (2, "Moving Castle Creations", "Advanced techniques"),
+        self.mock_cursor.fetchall.side_effect = [
+            [
+                (1, "Spirited Away Studio", "Learn animation", None, None),
+                (2, "Moving Castle Creations", "Advanced techniques", 30, 12),
+            ],
+            [(10, 1, "Backgrounds", True), (11, 1, "Old module", False)],
+            [(3, "Retired Course", datetime(2025, 1, 6, tzinfo=timezone.utc))],
         ]
         response = self.client.get("/admin/courses")
         self.assertEqual(response.status_code, 200)
         self.assertIn(b"Spirited Away Studio", response.data)
+        self.assertIn(b"Unlimited seats", response.data)
+        self.assertIn(b"12 of 30 seats left", response.data)
+        self.assertIn(b"<s>Old module</s> (archived)", response.data)
+        self.assertIn(b"/admin/modules/10/archive", response.data)
+        self.assertIn(b"/admin/courses/3/restore", response.data)
 
     def test_manage_courses_post_creates_course(self):
         """Manage courses POST inserts a new course and redirects"""
@@ -1167,34 +1790,98 @@ class GhibliBookingSystemTests(unittest.TestCase):
         self.assertEqual(response.status_code, 500)
         self.assertIn(b"Manage Courses Error", response.data)
 
+    def test_manage_courses_post_with_capacity_builds_shards(self):
+        """Creating a capped course seeds its seat shards in the same transaction"""
+        self._set_admin_session()
+        self.mock_cursor.fetchone.return_value = (42,)
+        self.mock_cursor.rowcount = 0
+        self.client.post(
+            "/admin/courses",
+            data={"course_name": "Capped", "description": "d", "capacity": "20"},
+        )
+        statements = [c[0] for c in self.mock_cursor.execute.call_args_list]
+        shard_insert = next(s for s in statements if "INSERT INTO course_seat_shards" in s[0])
+        # 20 seats over 8 shards: 2 each plus one extra on the first 4
+        self.assertEqual(shard_insert[1], (42, 2, 4, app.config["COURSE_SEAT_SHARDS"]))
+        self.mock_conn.commit.assert_called_once()
+
+    def test_update_course_capacity_rejects_bad_value(self):
+        """Non-numeric capacities never reach the database"""
+        self._set_admin_session()
+        response = self.client.post("/admin/courses/1/capacity", data={"capacity": "-3"})
+        self.assertEqual(response.status_code, 302)
+        self.mock_db.assert_not_called()
+
+    def test_update_course_capacity_below_bookings(self):
+        """Capacity below the live bookings is refused and rolled back"""
+        self._set_admin_session()
+        self.mock_cursor.rowcount = 25
+        response = self.client.post(
+            "/admin/courses/1/capacity", data={"capacity": "10"}, follow_redirects=True
+        )
+        self.assertIn(b"25 seats are already booked", response.data)
+        self.mock_conn.rollback.assert_called_once()
+        self.mock_conn.commit.assert_not_called()
+
+    def test_update_course_capacity_blank_is_unlimited(self):
+        """A blank capacity removes the limit and the course's shards"""
+        self._set_admin_session()
+        self.client.post("/admin/courses/1/capacity", data={"capacity": ""})
+        statements = [c[0][0] for c in self.mock_cursor.execute.call_args_list]
+        self.assertIn("DELETE FROM course_seat_shards WHERE course_id = %s", statements)
+        self.assertFalse(any("INSERT INTO course_seat_shards" in s for s in statements))
+        self.mock_conn.commit.assert_called_once()
+
     # =========================================================================
-    # DELETE COURSE
+    # ARCHIVE COURSES AND MODULES
     # =========================================================================
 
-    def test_delete_course_requires_admin(self):
-        """Delete course redirects unauthenticated users"""
-        response = self.client.post("/admin/courses/1/delete")
+    def test_archive_course_requires_admin(self):
+        """Archive course redirects unauthenticated users"""
+        response = self.client.post("/admin/courses/1/archive")
         self.assertEqual(response.status_code, 302)
         self.assertIn("/admin/login", response.location)
 
-    def test_delete_course_calls_db_and_commits(self):
-        """Deleting a course executes DELETE and commits, then redirects"""
+    def test_archive_course_is_a_soft_delete(self):
+        """Archiving clears the active flag instead of deleting the row"""
         self._set_admin_session()
         response = self.client.post(
-            "/admin/courses/1/delete", follow_redirects=False
+            "/admin/courses/1/archive", follow_redirects=False
         )
         self.assertEqual(response.status_code, 302)
         self.assertIn("/admin/courses", response.location)
-        delete_calls = [
-            c for c in self.mock_cursor.execute.call_args_list
-            if "DELETE" in c[0][0]
-        ]
-        self.assertTrue(len(delete_calls) > 0, "DELETE query was not executed")
+        sql, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("UPDATE courses", sql)
+        self.assertEqual(params, (False, False, 1, False))
+        for call in self.mock_cursor.execute.call_args_list:
+            self.assertNotIn("DELETE", call[0][0])
         self.mock_conn.commit.assert_called()
 
+    @patch("app.audit.record")
+    def test_archive_course_that_matched_no_row(self, mock_record):
+        """A repeat archive or unknown id says so instead of claiming success"""
+        self._set_admin_session()
+        self.mock_cursor.rowcount = 0
+        self.client.post("/admin/courses/1/archive")
+        with self.client.session_transaction() as sess:
+            (category, message), = sess["_flashes"]
+        self.assertEqual(category, "error")
+        self.assertEqual(message, "That course is already archived or no longer exists.")
+        mock_record.assert_not_called()
+
+    def test_module_archive_form_is_not_a_delete_form(self):
+        """The module archive button has neither delete styling nor a delete confirm"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.side_effect = [
+            [(1, "Totoro", "About", None, None)], [(7, 1, "Forest", True)], [],
+        ]
+        page = self.client.get("/admin/courses").get_data(as_text=True)
+        self.assertIn('class="module-form"', page)
+        self.assertNotIn("delete-form", page)
+
     @patch("app.get_db_connection")
-    def test_delete_course_db_exception(self, mock_db):
-        """Delete course handles DB exception with rollback and redirects"""
+    def test_archive_course_db_exception(self, mock_db):
+        """Archive course handles DB exception with rollback and redirects"""
         self._set_admin_session()
         mock_conn = MagicMock()
         mock_cursor = MagicMock()
@@ -1203,12 +1890,263 @@ class GhibliBookingSystemTests(unittest.TestCase):
         mock_cursor.execute.side_effect = Exception("DB Error")
 
         response = self.client.post(
-            "/admin/courses/1/delete", follow_redirects=False
+            "/admin/courses/1/archive", follow_redirects=False
         )
         self.assertEqual(response.status_code, 302)
         self.assertIn("/admin/courses", response.location)
         mock_conn.rollback.assert_called()
 
+    def test_restore_course_name_clash(self):
+        """Restoring a course whose name a live course now uses is refused"""
+        self._set_admin_session()
+        self.mock_cursor.execute.side_effect = psycopg2.errors.UniqueViolation()
+        self.client.post("/admin/courses/1/restore")
+        with self.client.session_transaction() as sess:
+            (category, message), = sess["_flashes"]
+        self.assertEqual(category, "error")
+        self.assertIn("Another live course already uses this name", message)
+
+    def test_archive_and_restore_module(self):
+        """Modules are archived and restored in place"""
+        self._set_admin_session()
+        self.client.post("/admin/modules/7/archive")
+        self.client.post("/admin/modules/7/restore")
+        (archive_sql, archive_params), (restore_sql, restore_params) = [
+            c[0] for c in self.mock_cursor.execute.call_args_list
+        ]
+        self.assertIn("UPDATE course_modules", archive_sql)
+        self.assertEqual(archive_params, (False, False, 7, False))
+        self.assertEqual(restore_params, (True, True, 7, True))
+
+    def test_booking_ignores_archived_courses_and_modules(self):
+        """The booking inserts only match live courses and modules"""
+        with self.client.session_transaction() as sess:
+            sess["role"] = "customer"
+            sess["email"] = "abbie@example.com"
+        self.mock_cursor.fetchone.side_effect = [(4,), (999,)]
+
+        self.client.post("/book", data={"courses": ["1"], "modules_1": ["10"]})
+
+        booking_sql = next(c[0][0] for c in self.mock_cursor.execute.call_args_list
+                           if "INSERT INTO bookings" in c[0][0])
+        self.assertIn("WHERE course_id = %s AND active", booking_sql)
+        module_sql, module_params = next(c[0] for c in self.mock_cursor.execute.call_args_list
+                                         if "INSERT INTO booking_modules" in c[0][0])
+        self.assertIn("AND active", module_sql)
+        self.assertEqual(module_params, (999, [10], "1"))
+
+    def test_purge_deletes_in_batches(self):
+        """The purge repeats each DELETE until a batch comes back short"""
+        conn = MagicMock()
+        cursor = conn.cursor.return_value
+        counts = iter([2, 2, 1, 0])
+
+        def execute(sql, params):
+            cursor.rowcount = next(counts)
+
+        cursor.execute.side_effect = execute
+
+        self.assertEqual(purge_archived(conn, older_than_days=30, batch_size=2), (5, 0))
+        statements = [c[0][0] for c in cursor.execute.call_args_list]
+        self.assertEqual(len(statements), 4)
+        self.assertIn("DELETE FROM course_modules", statements[0])
+        self.assertIn("DELETE FROM courses", statements[3])
+        self.assertIn("SKIP LOCKED", statements[3])
+        self.assertEqual(conn.commit.call_count, 4)
+
+    # =========================================================================
+    # AUDIT TRAIL
+    # =========================================================================
+
+    @patch("app.audit.record")
+    def test_admin_changes_are_audited_after_commit(self, mock_record):
+        """Each admin mutation buffers one event naming the admin and entity"""
+        self._set_admin_session()
+        self.mock_cursor.rowcount = 1
+        order = []
+        self.mock_conn.commit.side_effect = lambda: order.append("commit")
+        mock_record.side_effect = lambda *args: order.append("record")
+
+        self.client.post("/admin/bookings/5/delete")
+        self.client.post("/admin/courses/3/archive")
+        self.client.post(
+            "/admin/customers/7/edit",
+            data={"name": "Jane", "last_name": "Smith", "email": "j@example.com",
+                  "version": "1"},
+        )
+
+        events = [c[0][:4] for c in mock_record.call_args_list]
+        self.assertEqual(events, [
+            ("admin@example.com", "delete", "booking", 5),
+            ("admin@example.com", "archive", "course", 3),
+            ("admin@example.com", "update", "customer", 7),
+        ])
+        self.assertEqual(mock_record.call_args_list[2][0][4]["email"], "j@example.com")
+        self.assertEqual(order, ["commit", "record"] * 3)
+
+    @patch("app.audit.record")
+    def test_failed_admin_change_is_not_audited(self, mock_record):
+        """A rolled-back change leaves no audit event"""
+        self._set_admin_session()
+        self.mock_cursor.execute.side_effect = Exception("DB Error")
+        self.client.post("/admin/bookings/5/delete")
+        mock_record.assert_not_called()
+
+    def test_audit_log_requires_admin(self):
+        """Audit log redirects non-admins to admin login"""
+        response = self.client.get("/admin/audit")
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("/admin/login", response.location)
+
+    def test_audit_log_filters_by_entity_and_range(self):
+        """Only the filters given end up in the WHERE clause"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = [
+            (datetime(2025, 3, 1, 9, 30, tzinfo=timezone.utc), "admin@example.com",
+             "delete", "booking", 5, {}),
+        ]
+        response = self.client.get("/admin/audit", query_string={
+            "entity": "booking", "entity_id": "5", "since": "2025-03-01", "until": "",
+        })
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b"delete booking #5", response.data)
+        sql, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("entity = %(entity)s", sql)
+        self.assertIn("occurred_at >= %(since)s", sql)
+        self.assertNotIn("%(until)s", sql)
+        self.assertEqual((params["entity"], params["entity_id"]), ("booking", 5))
+
+    def test_audit_log_ignores_unknown_filters(self):
+        """Unknown entities and malformed dates fall back to no filter"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = []
+        response = self.client.get(
+            "/admin/audit", query_string={"entity": "admins", "since": "yesterday"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("WHERE", self.mock_cursor.execute.call_args[0][0])
+
+    # =========================================================================
+    # ADMIN ANALYTICS
+    # =========================================================================
+
+    def test_analytics_requires_admin(self):
+        """Analytics page and data are admin-only"""
+        response = self.client.get("/admin/analytics")
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.client.get("/admin/analytics.json").status_code, 403)
+
+    def test_analytics_data_reads_views_only(self):
+        """Chart data comes from the materialized views as compact JSON"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = []
+
+        response = self.client.get("/admin/analytics.json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.get_json()),
+                         {"course_weekly", "module_popularity", "conversion"})
+        self.assertNotIn(b" ", response.data)
+        sql = " ".join(c[0][0] for c in self.mock_cursor.execute.call_args_list)
+        self.assertIn("analytics_course_weekly", sql)
+        self.assertNotIn("FROM bookings", sql)
+        self.assertEqual(self.mock_db.call_args.kwargs, {"readonly": True})
+
+    def test_analytics_page_shows_last_refresh(self):
+        """Each view's last refresh time and duration is listed"""
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = [
+            ("analytics_course_weekly", datetime(2025, 1, 6, 3, 0, tzinfo=timezone.utc), 12.5, 30),
+        ]
+        response = self.client.get("/admin/analytics")
+        self.assertIn(b"2025-01-06 03:00:00", response.data)
+        self.assertIn(b"12.5 ms", response.data)
+
+    @patch("app.jobs.enqueue")
+    def test_analytics_refresh_is_queued(self, mock_enqueue):
+        """Refresh now queues a job instead of refreshing in the request"""
+        self._set_admin_session()
+        response = self.client.post("/admin/analytics/refresh")
+        self.assertEqual(response.status_code, 302)
+        mock_enqueue.assert_called_once_with(self.mock_cursor, "refresh_analytics", {})
+        self.mock_conn.commit.assert_called_once()
+
+    # =========================================================================
+    # ADMIN PROFILER
+    # =========================================================================
+
+    def _use_profile_dir(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = patch.dict(self.app.config, {"PROFILE_DIR": tmp.name})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return tmp.name
+
+    def test_admin_can_profile_a_request(self):
+        """?_profile=1 from an admin saves a profile and returns its id"""
+        profile_dir = self._use_profile_dir()
+        self._set_admin_session()
+        self.mock_cursor.fetchall.return_value = []
+
+        response = self.client.get("/admin/bookings?_profile=1")
+
+        profile_id = response.headers["X-Profile-Id"]
+        self.assertTrue(os.path.exists(os.path.join(profile_dir, f"{profile_id}.folded")))
+        listing = self.client.get("/admin/profiles")
+        self.assertIn(b"GET /admin/bookings?_profile=1", listing.data)
+        download = self.client.get(f"/admin/profiles/{profile_id}.folded")
+        self.assertEqual(download.status_code, 200)
+        download.close()
+
+    def test_profile_flag_ignored_for_customers(self):
+        """Non-admins cannot trigger the profiler"""
+        profile_dir = self._use_profile_dir()
+        response = self.client.get("/?_profile=1", headers={"X-Profile": "1"})
+        self.assertNotIn("X-Profile-Id", response.headers)
+        self.assertEqual(os.listdir(profile_dir), [])
+
+    def test_unflagged_admin_requests_are_not_profiled(self):
+        """Without the flag no profiler runs, even for admins"""
+        self._use_profile_dir()
+        self._set_admin_session()
+        with patch("app.profiling.Sampler") as mock_sampler:
+            self.client.get("/admin/profiles")
+        mock_sampler.assert_not_called()
+
+    def test_profile_download_rejects_bad_ids(self):
+        """Profile ids are validated before any file access"""
+        self._set_admin_session()
+        response = self.client.get("/admin/profiles/..%2Fconfig.folded")
+        self.assertEqual(response.status_code, 404)
+
+    # =========================================================================
+    # REQUEST IDS AND ACCESS LOG
+    # =========================================================================
+
+    def test_request_id_is_echoed(self):
+        """A well-formed incoming X-Request-ID is kept and returned"""
+        response = self.client.get("/", headers={"X-Request-ID": "lb-1234.abc"})
+        self.assertEqual(response.headers["X-Request-ID"], "lb-1234.abc")
+
+    def test_request_id_is_generated(self):
+        """Missing or malformed ids are replaced with a fresh one"""
+        first = self.client.get("/").headers["X-Request-ID"]
+        second = self.client.get("/", headers={"X-Request-ID": "bad id;drop"}).headers
+        self.assertRegex(first, r"^[0-9a-f]{32}$")
+        self.assertNotEqual(second["X-Request-ID"], first)
+        self.assertNotIn(" ", second["X-Request-ID"])
+
+    def test_access_log_line(self):
+        """Each request logs status, duration and its database query count"""
+        with self.assertLogs("ghibli.access", level="INFO") as captured:
+            self.client.get("/", headers={"X-Request-ID": "req-42"})
+        (record,) = captured.records
+        self.assertEqual(record.getMessage(), "GET / 200")
+        self.assertEqual((record.status, record.db_queries), (200, 0))
+        self.assertGreaterEqual(record.duration_ms, 0)
+
     # =========================================================================
     # DB DUMP
     # =========================================================================
@@ -1311,6 +2249,305 @@ class GhibliBookingSystemTests(unittest.TestCase):
             self.assertNotIn("user", sess)
 
 
+# =============================================================================
+# APPLICATION FACTORY TESTS
+# =============================================================================
+
+class AppFactoryTests(unittest.TestCase):
+    """Test create_app() configuration and per-worker state resets"""
+
+    def tearDown(self):
+        # create_app() configures the shared pool; restore the module app's.
+        create_app(replace=True)
+
+    def test_create_app_uses_given_config(self):
+        """create_app() applies the config class and registers every route"""
+        test_app = create_app(TestingConfig, replace=True)
+        self.assertTrue(test_app.config["TESTING"])
+        rules = {r.endpoint for r in test_app.url_map.iter_rules()}
+        self.assertIn("customer_login", rules)
+        self.assertIn("healthz", rules)
+
+    @patch("config.ProductionConfig.SECRET_KEY", "dev_secret_key")
+    def test_production_requires_secret_key(self):
+        """Production config with the default SECRET_KEY refuses to start"""
+        with self.assertRaises(ValueError):
+            create_app(ProductionConfig, replace=True)
+
+    @patch("app.db.psycopg2.connect")
+    def test_create_app_opens_no_connections(self, mock_connect):
+        """Building the app (e.g. preloaded in the master) does not connect"""
+        create_app(TestingConfig, replace=True)
+        mock_connect.assert_not_called()
+
+    def test_conflicting_second_app_is_refused(self):
+        """A second app may not swap the process's database under the first"""
+        other = type("OtherConfig", (TestingConfig,), {
+            "DATABASE_URL": "postgresql://other@localhost/other",
+        })
+        create_app(TestingConfig, replace=True)
+        with self.assertRaises(RuntimeError) as raised:
+            create_app(other)
+        self.assertIn("DATABASE_URL", str(raised.exception))
+        self.assertEqual(db.connection_pool.database_url, TestingConfig.get_database_url())
+
+    @patch("app.db.close_pools")
+    def test_same_settings_share_process_state(self, mock_close):
+        """An identical second app leaves the pools and logging alone"""
+        create_app(TestingConfig, replace=True)
+        mock_close.reset_mock()
+        with patch("app.logs.configure") as mock_logs:
+            create_app(TestingConfig)
+        mock_logs.assert_not_called()
+        mock_close.assert_not_called()
+
+    @patch("app.db.close_pools")
+    def test_replace_closes_the_old_pools(self, mock_close):
+        """Switching deliberately closes the previous app's connections"""
+        create_app(TestingConfig, replace=True)
+        mock_close.reset_mock()
+        create_app(type("OtherConfig", (TestingConfig,), {"DB_POOL_MAX": 3}), replace=True)
+        mock_close.assert_called_once()
+        self.assertEqual(db.connection_pool.maxconn, 3)
+
+    @patch("app.readiness")
+    @patch("app.db.connection_pool")
+    def test_reset_worker_state_resets_pool_and_caches(self, mock_pool, mock_readiness):
+        """The post_fork hook drops the pool and cached probe results"""
+        reset_worker_state()
+        mock_pool.reset.assert_called_once()
+        mock_readiness.reset.assert_called_once()
+
+
+# =============================================================================
+# STATEMENT TIMEOUT AND CIRCUIT BREAKER TESTS
+# =============================================================================
+
+class DatabaseProtectionTests(unittest.TestCase):
+    """Test per-route statement timeouts and the circuit breaker 503 path"""
+
+    def setUp(self):
+        self.app = app
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.client = self.app.test_client()
+
+        pool = patch("app.db.connection_pool")
+        breaker = patch("app.db.breaker")
+        self.addCleanup(pool.stop)
+        self.addCleanup(breaker.stop)
+        self.pool = pool.start()
+        self.breaker = breaker.start()
+        self.breaker.OPEN = "open"
+        self.breaker.state = "closed"
+        self.breaker.allow_request.return_value = True
+
+    def _customer_session(self):
+        with self.client.session_transaction() as sess:
+            sess["role"] = "customer"
+            sess["email"] = "abbie@example.com"
+
+    def test_route_budget_applied_to_checkout(self):
+        """The dashboard checks out its connection with its tight budget"""
+        self.pool.getconn.return_value.cursor.return_value.fetchall.return_value = []
+        self._customer_session()
+        self.client.get("/dashboard")
+        self.pool.getconn.assert_called_with(statement_timeout_ms=1500)
+
+    def test_unlisted_route_gets_default_budget(self):
+        """Routes without an explicit budget use STATEMENT_TIMEOUT_MS"""
+        with self.app.test_request_context("/admin/customers"):
+            get_db_connection()
+        self.pool.getconn.assert_called_with(
+            statement_timeout_ms=self.app.config["STATEMENT_TIMEOUT_MS"]
+        )
+
+    def test_open_breaker_returns_friendly_503(self):
+        """While the breaker is open DB routes fail fast without a checkout"""
+        self.breaker.allow_request.return_value = False
+        self._customer_session()
+        response = self.client.get("/dashboard")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn(b"right back", response.data)
+        self.assertIn("Retry-After", response.headers)
+        self.pool.getconn.assert_not_called()
+
+    @patch("app.metrics.request_queries", return_value=0)
+    def test_busy_pool_inside_a_view_returns_friendly_503(self, _):
+        """A pool timeout in a view gets the 503 page and hands back its trial"""
+        self.breaker.allow_request.return_value = db.CircuitBreaker.TRIAL
+        self.pool.getconn.side_effect = db.PoolTimeout("pool exhausted after 5.0s")
+        self._customer_session()
+        response = self.client.get("/dashboard")
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response.headers)
+        self.assertNotIn(b"pool exhausted", response.data)
+        self.breaker.finish_trial.assert_called_once_with(None)
+
+    def test_open_breaker_still_serves_static_pages(self):
+        """DB-free pages and the login form stay up while the breaker is open"""
+        self.breaker.allow_request.return_value = False
+        self.assertEqual(self.client.get("/").status_code, 200)
+        self.assertEqual(self.client.get("/login").status_code, 200)
+        self.assertEqual(self.client.get("/healthz").status_code, 200)
+
+    def test_get_db_connection_raises_when_open(self):
+        """A checkout attempted after the breaker opened raises CircuitOpenError"""
+        self.breaker.state = "open"
+        with self.app.test_request_context("/"):
+            with self.assertRaises(CircuitOpenError):
+                get_db_connection()
+
+    @patch("app.metrics.request_queries", return_value=2)
+    def test_trial_request_reports_once(self, _):
+        """A half-open trial counts once per request, however many queries"""
+        self.breaker.allow_request.return_value = db.CircuitBreaker.TRIAL
+        self.pool.getconn.return_value.cursor.return_value.fetchall.return_value = []
+        self._customer_session()
+        self.assertEqual(self.client.get("/dashboard").status_code, 200)
+        self.breaker.finish_trial.assert_called_once_with(True)
+
+    @patch("app.metrics.request_queries", return_value=1)
+    def test_failed_trial_request_reports_failure(self, _):
+        """A trial request that ends in a 5xx reopens the breaker"""
+        self.breaker.allow_request.return_value = db.CircuitBreaker.TRIAL
+        self.pool.getconn.return_value.cursor.return_value.fetchall.side_effect = \
+            psycopg2.OperationalError("gone")
+        self._customer_session()
+        self.assertEqual(self.client.get("/dashboard").status_code, 500)
+        self.breaker.finish_trial.assert_called_once_with(False)
+
+    def test_readiness_probe_is_never_a_trial(self):
+        """/readyz neither takes a trial slot nor reports one"""
+        self.breaker.state = "half_open"
+        self.pool.stats.return_value = {"max": 10, "in_use": 0, "idle": 1}
+        with patch("app.readiness") as mock_readiness:
+            mock_readiness.check.return_value = {"status": "ok"}
+            self.assertEqual(self.client.get("/readyz").status_code, 200)
+        self.breaker.allow_request.assert_not_called()
+        self.breaker.finish_trial.assert_not_called()
+
+
+# =============================================================================
+# READ REPLICA ROUTING TESTS
+# =============================================================================
+
+class ReadReplicaRoutingTests(unittest.TestCase):
+    """Test get_db_connection() replica routing and read-your-writes pinning"""
+
+    def setUp(self):
+        self.app = app
+        self.app.config["TESTING"] = True
+        self.app.config["WTF_CSRF_ENABLED"] = False
+        self.client = self.app.test_client()
+
+        primary = patch("app.db.connection_pool")
+        replica = patch("app.db.replica_pool")
+        self.addCleanup(primary.stop)
+        self.addCleanup(replica.stop)
+        self.primary = primary.start()
+        self.replica = replica.start()
+        self.replica.database_url = "postgresql://replica/ghibli"
+        self.replica_breaker = db.CircuitBreaker(reset_timeout=30, **db.REPLICA_BREAKER_SETTINGS)
+        breaker = patch("app.db.replica_breaker", self.replica_breaker)
+        self.addCleanup(breaker.stop)
+        breaker.start()
+
+    def test_readonly_uses_replica(self):
+        """Read-only checkouts go to the replica when configured"""
+        with self.app.test_request_context():
+            conn = get_db_connection(readonly=True)
+        self.assertIs(conn, self.replica.getconn.return_value)
+
+    def test_writes_use_primary(self):
+        """Default checkouts always go to the primary"""
+        with self.app.test_request_context():
+            conn = get_db_connection()
+        self.assertIs(conn, self.primary.getconn.return_value)
+        self.replica.getconn.assert_not_called()
+
+    def test_no_replica_configured_uses_primary(self):
+        """Without REPLICA_DATABASE_URL read-only checkouts use the primary"""
+        self.replica.database_url = None
+        with self.app.test_request_context():
+            conn = get_db_connection(readonly=True)
+        self.assertIs(conn, self.primary.getconn.return_value)
+
+    def test_recent_write_pins_reads_to_primary(self):
+        """Inside the read-your-writes window reads stay on the primary"""
+        with self.app.test_request_context():
+            from flask import session
+            session["primary_until"] = time.time() + 60
+            conn = get_db_connection(readonly=True)
+        self.assertIs(conn, self.primary.getconn.return_value)
+
+    def test_replica_failure_falls_back_to_primary(self):
+        """An unreachable replica degrades to the primary instead of failing"""
+        self.replica.getconn.side_effect = Exception("replica down")
+        with self.app.test_request_context():
+            conn = get_db_connection(readonly=True)
+        self.assertIs(conn, self.primary.getconn.return_value)
+
+    def test_failed_replica_connect_is_skipped_until_retry(self):
+        """After a failed connect reads go straight to the primary for a while"""
+        self.replica.getconn.side_effect = psycopg2.OperationalError("timeout expired")
+        with self.app.test_request_context():
+            get_db_connection(readonly=True)
+            conn = get_db_connection(readonly=True)
+        self.assertIs(conn, self.primary.getconn.return_value)
+        self.replica.getconn.assert_called_once()
+
+        # Once the retry window passes, one request tries the replica again.
+        self.replica.getconn.side_effect = None
+        with patch("db.time.monotonic", return_value=time.monotonic() + 31), \
+                self.app.test_request_context():
+            conn = get_db_connection(readonly=True)
+        self.assertIs(conn, self.replica.getconn.return_value)
+        self.assertEqual(self.replica_breaker.state, db.CircuitBreaker.CLOSED)
+
+    def test_busy_replica_pool_does_not_trip_the_retry_window(self):
+        """A pool timeout is not a dead replica; the next read tries it again"""
+        self.replica.getconn.side_effect = [db.PoolTimeout("busy"), MagicMock()]
+        with self.app.test_request_context():
+            self.assertIs(get_db_connection(readonly=True), self.primary.getconn.return_value)
+            get_db_connection(readonly=True)
+        self.assertEqual(self.replica.getconn.call_count, 2)
+
+        # In the half-open state a busy pool hands its trial slot back too.
+        self.replica.getconn.side_effect = psycopg2.OperationalError("timeout expired")
+        with self.app.test_request_context():
+            get_db_connection(readonly=True)
+        replica_conn = MagicMock()
+        self.replica.getconn.side_effect = [db.PoolTimeout("busy"), replica_conn]
+        with patch("db.time.monotonic", return_value=time.monotonic() + 31), \
+                self.app.test_request_context():
+            self.assertIs(get_db_connection(readonly=True), self.primary.getconn.return_value)
+            self.assertIs(get_db_connection(readonly=True), replica_conn)
+        self.assertEqual(self.replica.getconn.call_count, 5)
+        self.assertEqual(self.replica_breaker.state, db.CircuitBreaker.CLOSED)
+
+    def test_dashboard_update_sets_read_your_writes_window(self):
+        """A dashboard POST pins the session to the primary"""
+        with self.client.session_transaction() as sess:
+            sess["role"] = "customer"
+            sess["email"] = "abbie@example.com"
+        self.client.post("/dashboard", data={"course": "1", "extra": "x"})
+        with self.client.session_transaction() as sess:
+            self.assertGreater(sess["primary_until"], time.time())
+        self.primary.getconn.assert_called()
+
+    def test_dashboard_get_reads_from_replica(self):
+        """A dashboard GET with no recent write is served by the replica"""
+        self.replica.getconn.return_value.cursor.return_value.fetchall.return_value = []
+        with self.client.session_transaction() as sess:
+            sess["role"] = "customer"
+            sess["email"] = "abbie@example.com"
+        response = self.client.get("/dashboard")
+        self.assertEqual(response.status_code, 200)
+        self.replica.getconn.assert_called_once()
+        self.primary.getconn.assert_not_called()
+
+
 # =============================================================================
 # SESSION MANAGEMENT TESTS
 # =============================================================================
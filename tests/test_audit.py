@@ -0,0 +1,126 @@
+"""
+Unit Tests for the buffered audit trail (audit.py)
+
+Covers buffering without database access, batched COPY flushes on size,
+time and shutdown, retrying after a failed flush, and the filtered query.
+"""
+
+import csv
+import io
+import json
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+
+import audit
+
+
+class AuditTrailTests(unittest.TestCase):
+    """Tests for audit.AuditTrail with the pool mocked out"""
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.conn = MagicMock()
+        self.conn.cursor.return_value = self.cursor
+        self.copied = []
+        self.cursor.copy_expert.side_effect = (
+            lambda sql, data: self.copied.append(list(csv.reader(io.StringIO(data.read()))))
+        )
+
+        patcher = patch("audit.db.connection_pool")
+        self.addCleanup(patcher.stop)
+        self.pool = patcher.start()
+        self.pool.getconn.return_value = self.conn
+
+        self.trail = audit.AuditTrail(batch_size=3, flush_interval=60, max_pending=5)
+        self.addCleanup(self.trail.close)
+
+    def test_record_does_not_touch_database(self):
+        """Recording only buffers the event"""
+        self.trail.record("admin@example.com", "delete", "booking", 5)
+        self.assertEqual(self.trail.pending(), 1)
+        self.pool.getconn.assert_not_called()
+
+    def test_flush_writes_one_copy(self):
+        """All buffered events go out in a single COPY and commit"""
+        self.trail.record("admin@example.com", "delete", "booking", 5)
+        self.trail.record("admin@example.com", "update", "customer", 7, {"phone": None})
+
+        self.assertEqual(self.trail.flush(), 2)
+        self.assertEqual(self.cursor.copy_expert.call_count, 1)
+        self.assertIn("COPY audit_log", self.cursor.copy_expert.call_args[0][0])
+        rows = self.copied[0]
+        self.assertEqual(rows[0][1:5], ["admin@example.com", "delete", "booking", "5"])
+        self.assertEqual(json.loads(rows[1][5]), {"phone": None})
+        self.conn.commit.assert_called_once()
+        self.conn.close.assert_called_once()
+        self.assertEqual(self.trail.pending(), 0)
+
+    def test_flush_with_empty_buffer_is_free(self):
+        """Nothing buffered means no connection is taken"""
+        self.assertEqual(self.trail.flush(), 0)
+        self.pool.getconn.assert_not_called()
+
+    def test_full_batch_flushes_in_background(self):
+        """Reaching batch_size wakes the flusher without waiting for the interval"""
+        for booking_id in range(3):
+            self.trail.record("admin@example.com", "bulk_approve", "booking", booking_id)
+
+        deadline = time.monotonic() + 2
+        while self.trail.pending() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.trail.pending(), 0)
+        self.assertEqual(len(self.copied[0]), 3)
+
+    def test_failed_flush_keeps_events_for_retry(self):
+        """Events survive a failed COPY, bounded by max_pending"""
+        self.cursor.copy_expert.side_effect = Exception("database is down")
+        self.trail.record("admin@example.com", "delete", "booking", 1)
+        self.trail.record("admin@example.com", "delete", "booking", 2)
+
+        with self.assertRaises(Exception):
+            self.trail.flush()
+        self.conn.rollback.assert_called_once()
+        self.assertEqual(self.trail.pending(), 2)
+
+        self.trail._requeue([("t", "a", "delete", "booking", i, "{}") for i in range(10)])
+        self.assertEqual(self.trail.pending(), 5)
+
+        self.cursor.copy_expert.side_effect = None
+        self.assertEqual(self.trail.flush(), 5)
+
+    def test_close_drains_buffer(self):
+        """Shutdown writes whatever is still buffered"""
+        self.trail.record("admin@example.com", "delete", "course", 3)
+        self.trail.close()
+        self.assertEqual(self.trail.pending(), 0)
+        self.assertEqual(self.copied[0][0][3:5], ["course", "3"])
+
+    def test_disabled_trail_records_nothing(self):
+        """With enabled=False, record() is a no-op"""
+        self.trail.configure(enabled=False)
+        self.trail.record("admin@example.com", "delete", "booking", 5)
+        self.assertEqual(self.trail.pending(), 0)
+
+
+class AuditQueryTests(unittest.TestCase):
+    """Tests for audit.query"""
+
+    def test_no_filters_reads_newest_first(self):
+        cursor = MagicMock()
+        audit.query(cursor, limit=50)
+        sql, params = cursor.execute.call_args[0]
+        self.assertNotIn("WHERE", sql)
+        self.assertIn("ORDER BY occurred_at DESC", sql)
+        self.assertEqual(params, {"limit": 50})
+
+    def test_time_range_filters(self):
+        cursor = MagicMock()
+        audit.query(cursor, since="2025-01-01", until="2025-02-01")
+        sql, params = cursor.execute.call_args[0]
+        self.assertIn("occurred_at >= %(since)s AND occurred_at < %(until)s", sql)
+        self.assertEqual(params["until"], "2025-02-01")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,328 @@
+"""
+Unit Tests for the database layer (db.py)
+
+Covers the connection pool (checkout/return through close(), transaction
+cleanup, bounded waiting, fork-safe resets), per-checkout statement timeouts,
+pool and query metrics and the circuit breaker state machine.
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock
+import psycopg2
+from psycopg2 import extensions
+from prometheus_client import REGISTRY
+
+import db
+import metrics
+
+
+def _fake_connection():
+    conn = MagicMock()
+    conn.closed = 0
+    conn.info.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+    return conn
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    """Tests for db.ConnectionPool with psycopg2.connect mocked out"""
+
+    def setUp(self):
+        patcher = patch("db.psycopg2.connect", side_effect=lambda **kw: _fake_connection())
+        self.addCleanup(patcher.stop)
+        self.mock_connect = patcher.start()
+
+        self.pool = db.ConnectionPool()
+        self.pool.configure(
+            "postgresql://user:pw@dbhost:6543/ghibli", maxconn=2, acquire_timeout=0.05
+        )
+
+    def test_connect_kwargs_parses_url(self):
+        """DATABASE_URL is split into psycopg2 keyword arguments"""
+        self.assertEqual(
+            db.connect_kwargs("postgresql://user:pw@dbhost:6543/ghibli"),
+            {"host": "dbhost", "port": 6543, "dbname": "ghibli",
+             "user": "user", "password": "pw", "connect_timeout": db.DEFAULT_CONNECT_TIMEOUT},
+        )
+
+    def test_pool_connects_with_its_timeout(self):
+        """New connections give up after the configured connect_timeout"""
+        self.pool.configure("postgresql://user:pw@dbhost:6543/ghibli", connect_timeout=2)
+        self.pool.getconn()
+        self.assertEqual(self.mock_connect.call_args.kwargs["connect_timeout"], 2)
+
+    def test_pool_connects_lazily(self):
+        """configure() does not connect; the first getconn() does"""
+        self.mock_connect.assert_not_called()
+        self.pool.getconn()
+        self.mock_connect.assert_called_once()
+
+    def test_close_returns_connection_for_reuse(self):
+        """close() keeps the socket open and the next checkout reuses it"""
+        conn = self.pool.getconn()
+        raw = conn.raw
+        conn.close()
+        conn.close()
+        raw.close.assert_not_called()
+        self.assertIs(self.pool.getconn().raw, raw)
+        self.mock_connect.assert_called_once()
+
+    def test_wrapper_delegates_to_raw_connection(self):
+        """cursor()/commit() reach the underlying psycopg2 connection"""
+        conn = self.pool.getconn()
+        conn.cursor()
+        conn.commit()
+        conn.raw.cursor.assert_called_once()
+        conn.raw.commit.assert_called_once()
+
+    def test_release_rolls_back_open_transaction(self):
+        """A connection returned mid-transaction is rolled back first"""
+        conn = self.pool.getconn()
+        raw = conn.raw
+        raw.info.transaction_status = extensions.TRANSACTION_STATUS_INTRANS
+        conn.close()
+        raw.rollback.assert_called_once()
+
+    def test_release_discards_closed_connection(self):
+        """A broken connection is not handed out again"""
+        conn = self.pool.getconn()
+        raw = conn.raw
+        raw.closed = 2
+        conn.close()
+        self.assertIsNot(self.pool.getconn().raw, raw)
+
+    def test_exhausted_pool_times_out(self):
+        """Checkout waits for acquire_timeout then raises PoolTimeout"""
+        self.pool.getconn()
+        self.pool.getconn()
+        with self.assertRaises(db.PoolTimeout):
+            self.pool.getconn()
+
+    def test_released_slot_can_be_reused(self):
+        """Returning a connection frees a slot for the next caller"""
+        first = self.pool.getconn()
+        self.pool.getconn()
+        first.close()
+        self.pool.getconn()
+        self.assertEqual(self.pool.stats()["in_use"], 2)
+
+    def test_reset_drops_connections_without_closing(self):
+        """reset() (post-fork) forgets connections but leaves sockets alone"""
+        conn = self.pool.getconn()
+        raw = conn.raw
+        conn.close()
+        self.pool.reset()
+        raw.close.assert_not_called()
+        self.assertIsNot(self.pool.getconn().raw, raw)
+
+    def test_new_pid_does_not_reuse_parent_connections(self):
+        """Connections created in another process are never reused"""
+        conn = self.pool.getconn()
+        raw = conn.raw
+        conn.close()
+        with patch("db.os.getpid", return_value=-1):
+            self.assertIsNot(self.pool.getconn().raw, raw)
+        raw.close.assert_not_called()
+
+    def test_closeall_closes_idle_connections(self):
+        """closeall() closes connections owned by this process"""
+        conn = self.pool.getconn()
+        raw = conn.raw
+        conn.close()
+        self.pool.closeall()
+        raw.close.assert_called_once()
+
+    def test_missing_database_url_raises(self):
+        """An unconfigured pool refuses to connect"""
+        with self.assertRaises(ValueError):
+            db.ConnectionPool().getconn()
+
+    def test_statement_timeout_set_on_checkout(self):
+        """A statement_timeout budget is applied outside a transaction"""
+        conn = self.pool.getconn(statement_timeout_ms=1500)
+        cur = conn.raw.cursor.return_value.__enter__.return_value
+        cur.execute.assert_called_once_with("SET statement_timeout = %s", (1500,))
+        self.assertFalse(conn.raw.autocommit)
+
+    def test_statement_timeout_not_repeated_when_unchanged(self):
+        """The same budget on a reused connection costs no extra round trip"""
+        conn = self.pool.getconn(statement_timeout_ms=1500)
+        raw = conn.raw
+        conn.close()
+        self.pool.getconn(statement_timeout_ms=1500).close()
+        self.pool.getconn(statement_timeout_ms=30000)
+        cur = raw.cursor.return_value.__enter__.return_value
+        self.assertEqual(cur.execute.call_count, 2)
+
+    def test_connect_failure_feeds_breaker(self):
+        """Connection errors are recorded as failures on the pool's breaker"""
+        breaker = MagicMock()
+        pool = db.ConnectionPool(breaker=breaker)
+        pool.configure("postgresql://u:p@h/db", maxconn=1)
+        self.mock_connect.side_effect = psycopg2.OperationalError("refused")
+        with self.assertRaises(psycopg2.OperationalError):
+            pool.getconn()
+        self.assertFalse(breaker.record.call_args[0][0])
+        self.assertEqual(pool.stats()["in_use"], 0)
+
+
+class PoolMetricsTests(unittest.TestCase):
+    """Metrics published by the pool and its cursors"""
+
+    def setUp(self):
+        patcher = patch("db.psycopg2.connect", side_effect=lambda **kw: _fake_connection())
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.pool = db.ConnectionPool(name="metrics_test")
+        self.pool.configure("postgresql://u:p@h/db", maxconn=3)
+
+    def _sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_pool_publishes_occupancy(self):
+        """In-use, idle and max connections follow checkouts and returns"""
+        conn = self.pool.getconn()
+        self.assertEqual(
+            self._sample("ghibli_db_pool_connections", pool="metrics_test", state="in_use"), 1
+        )
+        conn.close()
+        self.assertEqual(
+            self._sample("ghibli_db_pool_connections", pool="metrics_test", state="in_use"), 0
+        )
+        self.assertEqual(
+            self._sample("ghibli_db_pool_connections", pool="metrics_test", state="idle"), 1
+        )
+        self.assertEqual(
+            self._sample("ghibli_db_pool_connections", pool="metrics_test", state="max"), 3
+        )
+
+    def test_reused_connections_count_as_cache_hits(self):
+        """A fresh connect is a miss, an idle reuse a hit"""
+        hits = self._sample("ghibli_cache_requests_total", cache="db_connection", result="hit")
+        self.pool.getconn().close()
+        self.pool.getconn().close()
+        self.assertEqual(
+            self._sample("ghibli_cache_requests_total", cache="db_connection", result="hit"),
+            hits + 1,
+        )
+
+    def test_queries_are_counted_per_request(self):
+        """Every timed statement counts toward the current request"""
+        timed = db.instrumented_cursor(None, "metrics_test")._timed
+        metrics.start_request()
+        timed(None, MagicMock(), "SELECT 1", None)
+        timed(None, MagicMock(), "SELECT 2", None)
+        self.assertEqual(metrics.request_queries(), 2)
+        self.assertEqual(
+            self._sample("ghibli_db_query_duration_seconds_count", pool="metrics_test"), 2
+        )
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    """Tests for db.CircuitBreaker transitions"""
+
+    def setUp(self):
+        self.breaker = db.CircuitBreaker(
+            window=10, min_calls=4, failure_rate=0.5, slow_rate=0.5,
+            slow_ms=100, reset_timeout=30, half_open_probes=2,
+        )
+
+    def _trip(self):
+        for _ in range(4):
+            self.breaker.record(False)
+
+    def test_starts_closed(self):
+        """A fresh breaker allows requests"""
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertTrue(self.breaker.allow_request())
+
+    def test_opens_on_failure_rate(self):
+        """Half of the window failing opens the breaker"""
+        self.breaker.record(True)
+        self.breaker.record(True)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+        self.assertFalse(self.breaker.allow_request())
+
+    def test_opens_on_slow_rate(self):
+        """Slow but successful calls also open the breaker"""
+        for _ in range(4):
+            self.breaker.record(True, 500)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_needs_min_calls(self):
+        """A couple of early failures are not enough to open"""
+        self.breaker.record(False)
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "closed")
+
+    @patch("db.time.monotonic")
+    def test_half_open_probes_then_closes(self, mock_clock):
+        """After reset_timeout a limited number of probes close it again"""
+        mock_clock.return_value = 1000.0
+        self._trip()
+        mock_clock.return_value = 1031.0
+        self.assertEqual(self.breaker.allow_request(), db.CircuitBreaker.TRIAL)
+        self.assertEqual(self.breaker.allow_request(), db.CircuitBreaker.TRIAL)
+        self.assertFalse(self.breaker.allow_request())
+        self.breaker.finish_trial(True)
+        self.assertEqual(self.breaker.state, "half_open")
+        self.breaker.finish_trial(True)
+        self.assertEqual(self.breaker.state, "closed")
+
+    @patch("db.time.monotonic")
+    def test_half_open_ignores_successful_calls(self, mock_clock):
+        """Query successes (one request's statements, health probes) close nothing"""
+        mock_clock.return_value = 1000.0
+        self._trip()
+        mock_clock.return_value = 1031.0
+        self.breaker.allow_request()
+        for _ in range(10):
+            self.breaker.record(True, 5)
+        self.assertEqual(self.breaker.state, "half_open")
+
+    @patch("db.time.monotonic")
+    def test_half_open_trial_outcomes(self, mock_clock):
+        """A failed trial reopens; one that never used the DB frees its slot"""
+        mock_clock.return_value = 1000.0
+        self._trip()
+        mock_clock.return_value = 1031.0
+        self.breaker.allow_request()
+        self.breaker.allow_request()
+        self.breaker.finish_trial(None)
+        self.assertEqual(self.breaker.allow_request(), db.CircuitBreaker.TRIAL)
+        self.breaker.finish_trial(False)
+        self.assertEqual(self.breaker.state, "open")
+
+    @patch("db.time.monotonic")
+    def test_half_open_failure_reopens(self, mock_clock):
+        """A failing probe sends the breaker straight back to open"""
+        mock_clock.return_value = 1000.0
+        self._trip()
+        mock_clock.return_value = 1031.0
+        self.assertTrue(self.breaker.allow_request())
+        self.breaker.record(False)
+        self.assertEqual(self.breaker.state, "open")
+
+    def test_instrumented_cursor_records_operational_errors(self):
+        """Query timeouts count as failures, constraint errors do not"""
+        breaker = MagicMock()
+        timed = db.instrumented_cursor(breaker)._timed
+
+        timeout = MagicMock(side_effect=extensions.QueryCanceledError("timeout"))
+        with self.assertRaises(psycopg2.OperationalError):
+            timed(None, timeout, "SELECT pg_sleep(10)", None)
+        self.assertFalse(breaker.record.call_args[0][0])
+
+        duplicate = MagicMock(side_effect=psycopg2.IntegrityError("dup"))
+        with self.assertRaises(psycopg2.IntegrityError):
+            timed(None, duplicate, "INSERT ...", None)
+        self.assertEqual(breaker.record.call_count, 1)
+
+        timed(None, MagicMock(), "SELECT 1", None)
+        self.assertTrue(breaker.record.call_args[0][0])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,323 @@
+"""
+Integration Tests against a real PostgreSQL database
+
+Drive whole flows through the app and check the rows they leave behind:
+registration to booking, archived catalog rows, seat caps, optimistic
+edits, the review queue, the catalog purge and the analytics refresh.
+Each test process gets its own database cloned from the schema template
+(tests/pg_databases.py). Skipped unless TEST_DATABASE_URL is set; run
+with ``pytest -n auto`` to spread them over all cores.
+"""
+
+import unittest
+
+import analytics
+import pg_databases
+from app import purge_archived, set_course_capacity
+
+ADMIN_SESSION = {"role": "admin", "user": "admin@example.com", "name": "Admin"}
+
+
+class IntegrationTests(pg_databases.IntegrationTestCase):
+    """End-to-end flows over the app's real connection pool"""
+
+    def _course(self, name, modules=(), capacity=None):
+        course_id = self.query(
+            "INSERT INTO courses (course_name, description, capacity) "
+            "VALUES (%s, 'About', %s) RETURNING course_id",
+            (name, capacity),
+        )[0][0]
+        module_ids = [
+            self.query(
+                "INSERT INTO course_modules (course_id, module_name, module_order) "
+                "VALUES (%s, %s, %s) RETURNING module_id",
+                (course_id, module, order),
+            )[0][0]
+            for order, module in enumerate(modules, 1)
+        ]
+        return course_id, module_ids
+
+    def _customer_session(self, email):
+        customer_id = self.query(
+            "INSERT INTO customers (name, last_name, email, phone, password) "
+            "VALUES ('Test', 'Customer', %s, '555', 'pw') RETURNING customer_id",
+            (email,),
+        )[0][0]
+        with self.client.session_transaction() as sess:
+            sess.update(role="customer", user=email, email=email, name="Test")
+        return customer_id
+
+    def _customer_session_for(self, email):
+        """Log in as an existing customer."""
+        with self.client.session_transaction() as sess:
+            sess.update(role="customer", user=email, email=email, name="Test")
+
+    def _admin_session(self):
+        with self.client.session_transaction() as sess:
+            sess.update(ADMIN_SESSION)
+
+    def _capped_course(self, name, capacity):
+        course_id, _ = self._course(name)
+        set_course_capacity(
+            self.conn.cursor(), course_id, capacity, self.app.config["COURSE_SEAT_SHARDS"]
+        )
+        self.conn.commit()
+        return course_id
+
+    def _book(self, email, course_id):
+        """Book ``course_id`` through the app as a new customer; return the booking id."""
+        self._customer_session(email)
+        self.client.post("/book", data={"courses": [str(course_id)]})
+        return self.query(
+            "SELECT booking_id FROM bookings b JOIN customers c USING (customer_id) "
+            "WHERE c.email = %s AND b.course_id = %s",
+            (email, course_id),
+        )[0][0]
+
+    def _seats(self, course_id):
+        """(live bookings, free seats) of a course."""
+        return self.query("""
+            SELECT (SELECT count(*) FROM bookings
+                    WHERE course_id = %(id)s AND status <> 'cancelled'),
+                   (SELECT sum(seats_left) FROM course_seat_shards WHERE course_id = %(id)s)
+        """, {"id": course_id})[0]
+
+    def test_register_login_book_and_view(self):
+        """A new customer registers, logs in, books with modules and sees it"""
+        course_id, (first, second, _) = self._course(
+            "Spirited Away", ["Bathhouse", "Train", "Names"]
+        )
+        response = self.client.post("/register", data={
+            "first_name": "Chihiro", "last_name": "Ogino", "email": "chihiro@example.com",
+            "phone": "555-0101", "password": "Haku-2001!", "confirm_password": "Haku-2001!",
+        })
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(
+            "/login", data={"email": "Chihiro@Example.com", "password": "Haku-2001!"}
+        )
+        self.assertEqual(response.status_code, 302)
+
+        response = self.client.post("/book", data={
+            "courses": [str(course_id)], f"modules_{course_id}": [str(first), str(second)],
+            "extra": "Window seat",
+        })
+        self.assertTrue(response.location.endswith("/booking_submitted"))
+        page = self.client.get("/booking_submitted").get_data(as_text=True)
+        self.assertIn("Spirited Away", page)
+        self.assertIn("Bathhouse", page)
+        self.assertIn("Train", page)
+        self.assertIn("Window seat", self.client.get("/dashboard").get_data(as_text=True))
+
+        self.assertEqual(self.query("""
+            SELECT b.status::text, b.nice_to_have_requests, count(bm.module_id)
+            FROM bookings b LEFT JOIN booking_modules bm USING (booking_id)
+            GROUP BY b.booking_id
+        """), [("pending", "Window seat", 2)])
+        self.assertEqual(self.query("SELECT kind FROM jobs"), [("booking_confirmation",)])
+        # The legacy plain-text password was rehashed on login.
+        self.assertNotEqual(self.query("SELECT password FROM customers")[0][0], "Haku-2001!")
+
+    def test_booking_skips_duplicates_and_archived_courses(self):
+        """Booking a course twice or an archived course adds nothing"""
+        live, _ = self._course("Totoro")
+        archived, _ = self._course("Porco Rosso")
+        self._admin_session()
+        self.client.post(f"/admin/courses/{archived}/archive")
+
+        self._customer_session("mei@example.com")
+        self.client.post("/book", data={"courses": [str(live)]})
+        self.client.post("/book", data={"courses": [str(live), str(archived)]})
+
+        self.assertEqual(self.query("SELECT course_id FROM bookings"), [(live,)])
+
+    def test_capped_course_sells_out(self):
+        """The last seat goes to the first booking; the next one is refused"""
+        self._admin_session()
+        self.client.post("/admin/courses", data={
+            "course_name": "Laputa", "description": "Castle in the sky", "capacity": "1",
+        })
+        course_id = self.query("SELECT course_id FROM courses")[0][0]
+
+        self._customer_session("pazu@example.com")
+        self.client.post("/book", data={"courses": [str(course_id)]})
+        self._customer_session("sheeta@example.com")
+        response = self.client.post(
+            "/book", data={"courses": [str(course_id)]}, follow_redirects=True
+        )
+
+        self.assertIn("fully booked", response.get_data(as_text=True))
+        self.assertEqual(self.query("SELECT count(*) FROM bookings"), [(1,)])
+        self.assertEqual(
+            self.query("SELECT sum(seats_left) FROM course_seat_shards"), [(0,)]
+        )
+
+    def test_reapproving_a_cancelled_booking_needs_a_free_seat(self):
+        """Bulk approve cannot bring a cancelled booking back into a full course"""
+        course_id = self._capped_course("Arrietty", 1)
+        first = self._book("a@example.com", course_id)
+        self._admin_session()
+        self.client.post("/admin/bookings/bulk", data={"action": "cancel", "booking_ids": [first]})
+        second = self._book("b@example.com", course_id)
+
+        self._admin_session()
+        response = self.client.post(
+            "/admin/bookings/bulk", data={"action": "approve", "booking_ids": [first, second]},
+            headers={"Accept": "application/json"},
+        )
+
+        self.assertEqual(response.get_json()["sold_out"], 1)
+        self.assertEqual(self._seats(course_id), (1, 0))
+        self.assertEqual(self.query("SELECT status::text FROM bookings ORDER BY booking_id"),
+                         [("cancelled",), ("approved",)])
+
+        # Once the seat is free again, the re-approval takes it.
+        self.client.post("/admin/bookings/bulk", data={"action": "cancel", "booking_ids": [second]})
+        self.client.post("/admin/bookings/bulk", data={"action": "approve", "booking_ids": [first]})
+        self.assertEqual(self._seats(course_id), (1, 0))
+        self.assertEqual(
+            self.query("SELECT seat_shard IS NOT NULL FROM bookings WHERE booking_id = %s",
+                       (first,)),
+            [(True,)],
+        )
+
+    def test_moving_a_booking_claims_a_seat_on_the_new_course(self):
+        """A course move takes a seat on a capped course, or is refused when full"""
+        open_course, _ = self._course("Marnie")
+        capped = self._capped_course("Earwig", 1)
+        moving = self._book("anna@example.com", open_course)
+        self._admin_session()
+
+        def move(version):
+            return self.client.post(f"/admin/bookings/{moving}/edit", data={
+                "course_id": str(capped), "extra": "", "version": str(version),
+            })
+
+        move(1)
+        self.assertEqual(self._seats(capped), (1, 0))
+        self.assertEqual(self.query("SELECT course_id FROM bookings"), [(capped,)])
+
+        # Back to the open course frees the seat; someone else takes it.
+        self.client.post(f"/admin/bookings/{moving}/edit", data={
+            "course_id": str(open_course), "extra": "", "version": "2",
+        })
+        self._book("marnie@example.com", capped)
+        self._admin_session()
+        response = move(3)
+
+        self.assertTrue(response.location.endswith(f"/admin/bookings/{moving}/edit"))
+        self.assertEqual(self._seats(capped), (1, 0))
+        self.assertEqual(
+            self.query("SELECT course_id, version FROM bookings WHERE booking_id = %s",
+                       (moving,)),
+            [(open_course, 3)],
+        )
+
+    def test_rebooking_after_a_cancel(self):
+        """A cancelled booking no longer blocks booking the same course again"""
+        course_id = self._capped_course("Kaguya", 1)
+        first = self._book("kaguya@example.com", course_id)
+        self._admin_session()
+        self.client.post("/admin/bookings/bulk", data={"action": "cancel", "booking_ids": [first]})
+
+        self._customer_session_for("kaguya@example.com")
+        self.client.post("/book", data={"courses": [str(course_id)]})
+        self.client.post("/book", data={"courses": [str(course_id)]})
+
+        self.assertEqual(
+            self.query("SELECT status::text FROM bookings ORDER BY booking_id"),
+            [("cancelled",), ("pending",)],
+        )
+        self.assertEqual(self._seats(course_id), (1, 0))
+
+        # The old booking cannot come back alongside the new one.
+        self._admin_session()
+        response = self.client.post(
+            "/admin/bookings/bulk", data={"action": "approve", "booking_ids": [first]},
+            headers={"Accept": "application/json"},
+        )
+        self.assertEqual(response.get_json()["superseded"], 1)
+        self.assertEqual(
+            self.query("SELECT status::text FROM bookings ORDER BY booking_id"),
+            [("cancelled",), ("pending",)],
+        )
+        self.assertEqual(self._seats(course_id), (1, 0))
+
+    def test_stale_booking_edit_conflicts(self):
+        """A save from a form rendered before another admin's save gets a 409"""
+        course_id, _ = self._course("Kiki")
+        customer_id = self._customer_session("kiki@example.com")
+        booking_id = self.query(
+            "INSERT INTO bookings (customer_id, course_id) VALUES (%s, %s) RETURNING booking_id",
+            (customer_id, course_id),
+        )[0][0]
+        self._admin_session()
+        form = {"course_id": str(course_id), "version": "1"}
+
+        first = self.client.post(
+            f"/admin/bookings/{booking_id}/edit", data=dict(form, extra="Broom")
+        )
+        second = self.client.post(
+            f"/admin/bookings/{booking_id}/edit", data=dict(form, extra="Cat")
+        )
+
+        self.assertEqual(first.status_code, 302)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(
+            self.query("SELECT nice_to_have_requests, version FROM bookings"), [("Broom", 2)]
+        )
+
+    def test_review_queue_hands_out_disjoint_batches(self):
+        """Two reviewers never lease the same pending booking"""
+        course_id, _ = self._course("Nausicaa")
+        for i in range(15):
+            customer_id = self._customer_session(f"c{i}@example.com")
+            self.query(
+                "INSERT INTO bookings (customer_id, course_id) VALUES (%s, %s)",
+                (customer_id, course_id),
+            )
+        for reviewer in ("a@example.com", "b@example.com"):
+            with self.client.session_transaction() as sess:
+                sess.update(ADMIN_SESSION, user=reviewer)
+            self.assertEqual(self.client.get("/admin/review-queue").status_code, 200)
+
+        batch = self.app.config["REVIEW_BATCH_SIZE"]
+        self.assertEqual(self.query("""
+            SELECT review_claimed_by, count(*) FROM bookings
+            GROUP BY review_claimed_by ORDER BY review_claimed_by
+        """), [("a@example.com", batch), ("b@example.com", 15 - batch)])
+
+    def test_purge_removes_only_unreferenced_archived_rows(self):
+        """Archived rows go once nothing points at them; booked ones stay"""
+        booked, (booked_module,) = self._course("Mononoke", ["Forest"])
+        unused, _ = self._course("Ponyo", ["Sea", "Fish"])
+        customer_id = self._customer_session("san@example.com")
+        booking_id = self.query(
+            "INSERT INTO bookings (customer_id, course_id) VALUES (%s, %s) RETURNING booking_id",
+            (customer_id, booked),
+        )[0][0]
+        self.query("INSERT INTO booking_modules VALUES (%s, %s)", (booking_id, booked_module))
+        self._admin_session()
+        for course_id in (booked, unused):
+            self.client.post(f"/admin/courses/{course_id}/archive")
+
+        self.assertEqual(purge_archived(self.conn, older_than_days=0, batch_size=1), (2, 1))
+        self.assertEqual(self.query("SELECT course_id FROM courses"), [(booked,)])
+
+    def test_analytics_refresh_and_charts(self):
+        """The materialized views refresh concurrently and feed the JSON"""
+        course_id, _ = self._course("Howl")
+        customer_id = self._customer_session("sophie@example.com")
+        self.query(
+            "INSERT INTO bookings (customer_id, course_id) VALUES (%s, %s)",
+            (customer_id, course_id),
+        )
+        analytics.refresh(self.conn)
+        self._admin_session()
+
+        payload = self.client.get("/admin/analytics.json").get_json()
+
+        self.assertIn("Howl", str(payload))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+"""
+Unit Tests for the background job queue (jobs.py)
+
+Covers enqueueing inside the caller's transaction, the SKIP LOCKED claim,
+success/failure bookkeeping with backoff, and confirmation emails delivered
+to a throwaway local SMTP server.
+"""
+
+import socketserver
+import threading
+import unittest
+from email import message_from_bytes
+from unittest.mock import patch, MagicMock
+
+import jobs
+from app import create_app
+from config import TestingConfig
+
+
+class _SMTPSink(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept one message per connection."""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb = line.split(b" ", 1)[0].split(b":", 1)[0].strip().upper()
+            if verb == b"DATA":
+                self.reply("354 go ahead")
+                data = b""
+                while True:
+                    chunk = self.rfile.readline()
+                    if chunk in (b".\r\n", b""):
+                        break
+                    data += chunk
+                self.server.messages.append(message_from_bytes(data))
+                self.reply("250 queued")
+            elif verb == b"QUIT":
+                self.reply("221 bye")
+                return
+            else:
+                self.reply("250 ok")
+
+
+class JobQueueTests(unittest.TestCase):
+    """Tests for jobs.enqueue and jobs.Worker with the pool mocked out"""
+
+    def setUp(self):
+        self.cursor = MagicMock()
+        self.conn = MagicMock()
+        self.conn.cursor.return_value = self.cursor
+
+        patcher = patch("jobs.db.connection_pool")
+        self.addCleanup(patcher.stop)
+        patcher.start().getconn.return_value = self.conn
+
+        self.worker = jobs.Worker(batch_size=5)
+
+    def test_enqueue_inserts_and_notifies(self):
+        """enqueue() writes the job and wakes workers on the same cursor"""
+        jobs.enqueue(self.cursor, "booking_confirmation", {"booking_ids": [1]})
+        insert, notify = self.cursor.execute.call_args_list
+        self.assertIn("INSERT INTO jobs", insert[0][0])
+        self.assertEqual(insert[0][1][1], '{"booking_ids": [1]}')
+        self.assertEqual(notify[0][0], f"NOTIFY {jobs.NOTIFY_CHANNEL}")
+        self.conn.commit.assert_not_called()
+
+    def test_claim_skips_locked_rows(self):
+        """Concurrent workers never wait on each other's claimed jobs"""
+        self.cursor.fetchall.return_value = []
+        self.assertEqual(self.worker.run_once(), 0)
+        sql = self.cursor.execute.call_args[0][0]
+        self.assertIn("FOR UPDATE SKIP LOCKED", sql)
+        self.assertEqual(self.cursor.execute.call_args[0][1][2], 5)
+        self.conn.commit.assert_called_once()
+        self.conn.close.assert_called_once()
+
+    def test_successful_jobs_are_deleted(self):
+        """Handled jobs are removed in one statement"""
+        handler = MagicMock()
+        self.cursor.fetchall.return_value = [(7, "test_ok", {"x": 1}, 1, 5)]
+        with patch.dict(jobs._HANDLERS, {"test_ok": handler}):
+            self.assertEqual(self.worker.run_once(), 1)
+        handler.assert_called_once_with({"x": 1})
+        self.cursor.execute.assert_called_with(
+            "DELETE FROM jobs WHERE job_id = ANY(%s)", ([7],)
+        )
+
+    def test_failed_job_is_rescheduled(self):
+        """A failing job goes back to queued with a backoff delay"""
+        handler = MagicMock(side_effect=RuntimeError("smtp down"))
+        self.cursor.fetchall.return_value = [(8, "test_fail", {}, 2, 5)]
+        with patch.dict(jobs._HANDLERS, {"test_fail": handler}):
+            self.worker.run_once()
+        final, delay, error, job_id = self.cursor.executemany.call_args[0][1][0]
+        self.assertFalse(final)
+        self.assertLessEqual(delay, 10)
+        self.assertEqual((error, job_id), ("smtp down", 8))
+
+    def test_last_attempt_marks_failed(self):
+        """Jobs out of attempts, or with no handler, stop retrying"""
+        handler = MagicMock(side_effect=RuntimeError("boom"))
+        self.cursor.fetchall.return_value = [
+            (9, "test_fail", {}, 5, 5),
+            (10, "unknown_kind", {}, 1, 5),
+        ]
+        with patch.dict(jobs._HANDLERS, {"test_fail": handler}):
+            self.worker.run_once()
+        rows = self.cursor.executemany.call_args[0][1]
+        self.assertEqual([row[0] for row in rows], [True, True])
+
+    def test_backoff_is_bounded(self):
+        """Backoff grows with attempts but never exceeds the cap"""
+        for attempts in range(1, 30):
+            delay = jobs.backoff_seconds(attempts, base=5, cap=60)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(60, 5 * 2 ** (attempts - 1)))
+
+
+class BookingConfirmationEmailTests(unittest.TestCase):
+    """Confirmation emails sent to a local SMTP sink"""
+
+    def setUp(self):
+        self.smtp = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPSink)
+        self.smtp.daemon_threads = True
+        self.smtp.messages = []
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+
+        class SinkConfig(TestingConfig):
+            SMTP_HOST = "127.0.0.1"
+            SMTP_PORT = self.smtp.server_address[1]
+
+        self.flask_app = create_app(SinkConfig, replace=True)
+        self.addCleanup(create_app, replace=True)
+
+        self.cursor = MagicMock()
+        self.conn = MagicMock()
+        self.conn.cursor.return_value = self.cursor
+        patcher = patch("jobs.db.connection_pool")
+        self.addCleanup(patcher.stop)
+        patcher.start().getconn.return_value = self.conn
+
+    def test_confirmation_lists_booked_courses(self):
+        """One email per job, listing every course and its modules"""
+        self.cursor.fetchall.return_value = [
+            ("abbie@example.com", "Abbie", "Animation Basics", "Storyboarding, Colour"),
+            ("abbie@example.com", "Abbie", "Sound Design", ""),
+        ]
+        with self.flask_app.app_context():
+            jobs.send_booking_confirmation({"booking_ids": [1, 2]})
+
+        self.assertEqual(len(self.smtp.messages), 1)
+        message = self.smtp.messages[0]
+        self.assertEqual(message["To"], "abbie@example.com")
+        self.assertEqual(message["From"], TestingConfig.MAIL_FROM)
+        body = message.get_payload()
+        self.assertIn("Animation Basics (Storyboarding, Colour)", body)
+        self.assertIn("Sound Design", body)
+        self.conn.close.assert_called_once()
+
+    def test_deleted_bookings_send_nothing(self):
+        """Bookings removed before the job runs are skipped silently"""
+        self.cursor.fetchall.return_value = []
+        with self.flask_app.app_context():
+            jobs.send_booking_confirmation({"booking_ids": [3]})
+        self.assertEqual(self.smtp.messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
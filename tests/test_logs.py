@@ -0,0 +1,98 @@
+"""
+Unit Tests for the structured logging pipeline (logs.py)
+
+Covers JSON output with request context, lazy formatting on the listener
+thread, sampling of INFO records and dropping (not blocking) when the
+queue is full.
+"""
+
+import io
+import json
+import logging
+import queue
+import threading
+import unittest
+
+import logs
+from app import create_app
+from config import TestingConfig
+
+
+class _Unformatted:
+    """Records which thread turned it into a string."""
+
+    def __init__(self):
+        self.formatted_on = None
+
+    def __str__(self):
+        self.formatted_on = threading.current_thread().name
+        return "payload"
+
+
+class LogPipelineTests(unittest.TestCase):
+    """Tests for logs.LogPipeline writing into a StringIO sink"""
+
+    def setUp(self):
+        self.sink = io.StringIO()
+        self.pipeline = logs.LogPipeline().configure(stream=self.sink)
+        self.addCleanup(logging.getLogger().removeHandler, self.pipeline.handler)
+        self.addCleanup(self.pipeline.stop)
+        self.logger = logging.getLogger("tests.logs")
+
+    def _lines(self):
+        self.pipeline.stop()
+        return [json.loads(line) for line in self.sink.getvalue().splitlines()]
+
+    def test_records_are_json_with_extras(self):
+        """Each record is one JSON object including extra= fields"""
+        self.logger.warning("Booked %s seat(s)", 2, extra={"course_id": 7})
+        (entry,) = [e for e in self._lines() if e["logger"] == "tests.logs"]
+        self.assertEqual(entry["message"], "Booked 2 seat(s)")
+        self.assertEqual((entry["level"], entry["course_id"]), ("WARNING", 7))
+
+    def test_formatting_happens_on_listener_thread(self):
+        """Arguments are only rendered by the listener, not the caller"""
+        arg = _Unformatted()
+        self.logger.warning("value %s", arg)
+        self._lines()
+        self.assertIsNotNone(arg.formatted_on)
+        self.assertNotEqual(arg.formatted_on, threading.current_thread().name)
+
+    def test_request_context_is_attached(self):
+        """Records logged inside a request carry its id and route"""
+        app = create_app(TestingConfig, replace=True)
+        self.addCleanup(create_app, replace=True)
+        logs.pipeline.stop()
+        with app.test_request_context("/book", method="POST"):
+            from flask import g
+            g.request_id = "req-1"
+            self.logger.warning("inside")
+        (entry,) = [e for e in self._lines() if e["message"] == "inside"]
+        self.assertEqual((entry["request_id"], entry["method"], entry["path"]),
+                         ("req-1", "POST", "/book"))
+
+
+class FilterAndQueueTests(unittest.TestCase):
+    """Tests for sampling and the non-blocking queue handler"""
+
+    def _record(self, level):
+        return logging.LogRecord("t", level, __file__, 1, "msg", None, None)
+
+    def test_sampling_spares_warnings(self):
+        """With rate 0 every INFO is dropped and every WARNING kept"""
+        sampler = logs.SamplingFilter(rate=0.0)
+        self.assertFalse(sampler.filter(self._record(logging.INFO)))
+        self.assertTrue(sampler.filter(self._record(logging.WARNING)))
+        self.assertTrue(logs.SamplingFilter(rate=1.0).filter(self._record(logging.DEBUG)))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """A stalled listener costs records, never request time"""
+        handler = logs.NonBlockingQueueHandler(queue.Queue(maxsize=2))
+        for _ in range(5):
+            handler.handle(self._record(logging.INFO))
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,112 @@
+"""
+Unit Tests for the on-demand request profiler (profiling.py)
+
+Covers stack sampling, the collapsed-stack export and the bounded on-disk
+ring of saved profiles.
+"""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+import profiling
+
+
+def _blocked_handler(entered, release):
+    entered.set()
+    release.wait()
+
+
+def _request_handler(entered, release):
+    _blocked_handler(entered, release)
+
+
+class SamplerTests(unittest.TestCase):
+    """Tests for profiling.Sampler"""
+
+    def setUp(self):
+        # A "request" thread parked inside _blocked_handler until released.
+        entered, self.release = threading.Event(), threading.Event()
+        self.watched = threading.Thread(target=_request_handler, args=(entered, self.release))
+        self.watched.start()
+        self.addCleanup(self.watched.join)
+        self.addCleanup(self.release.set)
+        entered.wait()
+
+    def test_samples_the_watched_thread(self):
+        """Stacks name the watched thread's functions, outermost frame first"""
+        sampler = profiling.Sampler(self.watched.ident)
+        sampler.sample()
+        sampler.sample()
+
+        ((stack, count),) = sampler.stacks.items()
+        self.assertEqual(count, 2)
+        functions = [label.split(" (")[0] for label in stack.split(";")]
+        self.assertLess(functions.index("_request_handler"), functions.index("_blocked_handler"))
+        self.assertIn("_blocked_handler (test_profiling.py", stack)
+
+    def test_background_thread_samples_until_stopped(self):
+        """start() samples on its own thread; stop() ends it"""
+        sampler = profiling.Sampler(self.watched.ident, interval=0.001).start()
+        deadline = time.monotonic() + 10
+        while not sampler.stacks and time.monotonic() < deadline:
+            time.sleep(0.001)
+        sampler.stop()
+
+        self.assertFalse(sampler._thread.is_alive())
+        self.assertIn("_blocked_handler", next(iter(sampler.stacks)))
+
+    def test_folded_output_is_flamegraph_ready(self):
+        """Each line is a semicolon-joined stack and a sample count"""
+        sampler = profiling.Sampler(threading.get_ident())
+        sampler.stacks.update({"main (a.py:1);leaf (a.py:9)": 3, "main (a.py:1)": 1})
+        self.assertEqual(
+            sampler.folded(), "main (a.py:1);leaf (a.py:9) 3\nmain (a.py:1) 1\n"
+        )
+
+
+class ProfileStoreTests(unittest.TestCase):
+    """Tests for profiling.ProfileStore"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = profiling.ProfileStore(os.path.join(tmp.name, "profiles"), max_profiles=3)
+
+    def _sampler(self):
+        sampler = profiling.Sampler(threading.get_ident())
+        sampler.stacks["main (a.py:1)"] = 2
+        sampler.started = time.perf_counter()
+        return sampler.stop()
+
+    def test_save_writes_stacks_and_summary(self):
+        """A saved profile can be listed and its stacks read back"""
+        profile_id = self.store.save(self._sampler(), endpoint="booking", status=200)
+        summary = self.store.summaries()[0]
+        self.assertEqual(summary["id"], profile_id)
+        self.assertEqual((summary["endpoint"], summary["samples"]), ("booking", 2))
+        with open(self.store.path(profile_id, ".folded")) as f:
+            self.assertEqual(f.read(), "main (a.py:1) 2\n")
+
+    def test_ring_keeps_only_the_newest(self):
+        """Saving beyond max_profiles deletes the oldest files"""
+        saved = []
+        for _ in range(5):
+            saved.append(self.store.save(self._sampler()))
+            time.sleep(0.002)
+        self.assertEqual(self.store.ids(), list(reversed(saved[-3:])))
+        self.assertEqual(len(os.listdir(self.store.directory)), 6)
+
+    def test_rejects_path_like_ids(self):
+        """Ids are validated before touching the filesystem"""
+        with self.assertRaises(ValueError):
+            self.store.path("../../etc/passwd", ".folded")
+
+    def test_missing_directory_lists_nothing(self):
+        self.assertEqual(self.store.summaries(), [])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
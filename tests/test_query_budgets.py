@@ -0,0 +1,234 @@
+"""
+Query-count budgets for the customer pages and admin lists
+
+Each route is held to a maximum number of statements per request, at
+several data sizes, so an N+1 loop fails here before it reaches
+production. The unit tests run over the usual MagicMock connection. With
+TEST_DATABASE_URL set, the same budgets are also checked against the
+seeded database test_query_plans.py uses.
+"""
+
+import os
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch, MagicMock
+
+import psycopg2
+
+import app as app_module
+import audit
+import db
+from app import app, create_app
+from config import TestingConfig
+from query_budget import QueryBudgetMixin, QueryRecorder
+from test_query_plans import seeded_database_url, SEED_TAG
+
+# Statements per request. Booking runs a fixed part plus one INSERT for
+# the booking and one for all its modules per selected course.
+BOOK_FIXED_QUERIES = 4
+BOOK_QUERIES_PER_COURSE = 2
+BUDGETS = {
+    "/book": 2,
+    "/booking_submitted": 1,
+    "/dashboard": 1,
+    "/admin": 3,
+    "/admin/bookings": 1,
+    "/admin/bookings/pending": 1,
+    "/admin/customers": 1,
+    "/admin/courses": 3,
+}
+
+CUSTOMER_SESSION = {
+    "role": "customer", "user": "abbie@example.com", "name": "Abbie",
+    "email": "abbie@example.com",
+}
+ADMIN_SESSION = {"role": "admin", "user": "admin@example.com", "name": "Admin"}
+
+
+class RouteQueryBudgetTests(QueryBudgetMixin, unittest.TestCase):
+    """Query budgets per route over a mocked connection"""
+
+    def setUp(self):
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.client = app.test_client()
+
+        patcher = patch("app.get_db_connection")
+        self.addCleanup(patcher.stop)
+        self.mock_db = patcher.start()
+        patcher = patch.object(audit.trail, "enabled", False)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+
+        self.mock_conn = MagicMock()
+        self.mock_cursor = MagicMock()
+        self.mock_db.return_value = self.mock_conn
+        self.mock_conn.cursor.return_value = self.mock_cursor
+
+    def _session(self, values, **extra):
+        with self.client.session_transaction() as sess:
+            sess.update(values, **extra)
+
+    def test_recorder_counts_executemany_per_row(self):
+        """executemany() counts as one statement per parameter set"""
+        with QueryRecorder() as queries:
+            cur = app_module.get_db_connection().cursor()
+            cur.execute("SELECT 1")
+            cur.executemany("INSERT INTO t VALUES (%s)", iter([(1,), (2,), (3,)]))
+        self.assertEqual(queries.count, 4)
+        self.assertEqual(len(self.mock_cursor.executemany.call_args[0][1]), 3)
+
+    def test_over_budget_fails_with_the_statements(self):
+        """Going over budget fails and lists what ran"""
+        self._session(ADMIN_SESSION)
+        with self.assertRaises(AssertionError) as raised:
+            with self.assertMaxQueries(2):
+                self.client.get("/admin")
+        self.assertIn("3 queries (budget 2)", str(raised.exception))
+        self.assertIn("3. SELECT COUNT(*) FROM bookings", str(raised.exception))
+
+    def test_booking_form(self):
+        """The booking form loads the catalog in a fixed number of queries"""
+        self._session(CUSTOMER_SESSION)
+        for courses in (1, 50):
+            self.mock_cursor.fetchall.side_effect = [
+                [(i, f"Course {i}", "About") for i in range(courses)],
+                [(i * 10, i, "Module", "About") for i in range(courses)],
+            ]
+            with self.subTest(courses=courses), self.assertMaxQueries(BUDGETS["/book"]):
+                self.assertEqual(self.client.get("/book").status_code, 200)
+
+    def test_booking_post(self):
+        """Booking costs a constant per selected course, whatever the module count"""
+        self._session(CUSTOMER_SESSION)
+        self.mock_cursor.fetchone.return_value = (4,)
+        self.mock_cursor.fetchall.return_value = []
+        for courses, modules in ((1, 1), (3, 4), (5, 12)):
+            form = {"courses": [str(c) for c in range(1, courses + 1)]}
+            for c in range(1, courses + 1):
+                form[f"modules_{c}"] = [str(c * 100 + m) for m in range(modules)]
+            budget = BOOK_FIXED_QUERIES + BOOK_QUERIES_PER_COURSE * courses
+            with self.subTest(courses=courses, modules=modules), self.assertMaxQueries(budget):
+                self.assertEqual(self.client.post("/book", data=form).status_code, 302)
+
+    def test_booking_submitted(self):
+        """The confirmation page is one query however many bookings it shows"""
+        for bookings in (1, 10):
+            self._session(CUSTOMER_SESSION, last_booking_ids=list(range(1, bookings + 1)))
+            self.mock_cursor.fetchall.return_value = [
+                (i, f"Course {i}", None, ["Module A", "Module B"]) for i in range(bookings)
+            ]
+            with self.subTest(bookings=bookings), \
+                    self.assertMaxQueries(BUDGETS["/booking_submitted"]):
+                self.assertEqual(self.client.get("/booking_submitted").status_code, 200)
+
+    def test_customer_dashboard(self):
+        """The dashboard is one query however many bookings and modules"""
+        self._session(CUSTOMER_SESSION)
+        for bookings in (0, 1, 25):
+            self.mock_cursor.fetchall.return_value = [
+                ({"booking_id": i, "course_id": i, "course": "Course", "status": "pending",
+                  "modules": [{"module_id": 1, "name": "Module"}] * 3},)
+                for i in range(bookings)
+            ]
+            with self.subTest(bookings=bookings), self.assertMaxQueries(BUDGETS["/dashboard"]):
+                self.assertEqual(self.client.get("/dashboard").status_code, 200)
+
+    def test_admin_lists(self):
+        """Admin lists run a fixed number of queries at any page size"""
+        self._session(ADMIN_SESSION)
+        self.mock_cursor.fetchone.return_value = (0,)
+        submitted = datetime(2026, 1, 2, 9, 30, tzinfo=timezone.utc)
+        rows = {
+            "/admin/bookings": lambda i: (i, "c@example.com", "Course", None),
+            "/admin/bookings/pending": lambda i: (i, "c@example.com", "Course", None, submitted),
+            "/admin/customers": lambda i: (i, "Name", "Last", "c@example.com", None, None),
+            "/admin/courses": lambda i: (i, "Course", "About", None, None),
+        }
+        for url, row in rows.items():
+            for size in (0, 1, 60):
+                self.mock_cursor.fetchall.side_effect = None
+                self.mock_cursor.fetchall.return_value = [row(i) for i in range(size)]
+                if url == "/admin/courses":
+                    self.mock_cursor.fetchall.side_effect = [
+                        [row(i) for i in range(size)], [], [],
+                    ]
+                with self.subTest(url=url, size=size), self.assertMaxQueries(BUDGETS[url]):
+                    self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.mock_cursor.fetchall.side_effect = None
+        with self.assertMaxQueries(BUDGETS["/admin"]):
+            self.assertEqual(self.client.get("/admin").status_code, 200)
+
+
+@unittest.skipUnless(os.getenv("TEST_DATABASE_URL"), "TEST_DATABASE_URL is not set")
+class RealDatabaseQueryBudgetTests(QueryBudgetMixin, unittest.TestCase):
+    """The same budgets over a real connection pool and seeded data"""
+
+    @classmethod
+    def setUpClass(cls):
+        url = seeded_database_url()
+        conn = psycopg2.connect(**db.connect_kwargs(url))
+        cur = conn.cursor()
+        # Seeded customers with the fewest and the most bookings.
+        cur.execute("""
+            SELECT c.email, array_agg(b.booking_id ORDER BY b.booking_id)
+            FROM customers c JOIN bookings b ON b.customer_id = c.customer_id
+            WHERE c.email LIKE %s
+            GROUP BY c.customer_id
+            ORDER BY count(*), c.customer_id
+        """, (f"{SEED_TAG}-%",))
+        rows = cur.fetchall()
+        cls.customers = [rows[0], rows[-1]]
+        cur.execute(
+            "SELECT min(booking_id) + 60, min(customer_id) + 60 FROM bookings"
+        )
+        cls.older_booking, cls.older_customer = cur.fetchone()
+        conn.close()
+        cls.app = create_app(type("SeededConfig", (TestingConfig,), {
+            "DATABASE_URL": url,
+            "WTF_CSRF_ENABLED": False,
+        }), replace=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        create_app(replace=True)
+
+    def setUp(self):
+        self.client = self.app.test_client()
+
+    def _session(self, values, **extra):
+        with self.client.session_transaction() as sess:
+            sess.update(values, **extra)
+
+    def test_customer_pages(self):
+        """Customer pages stay in budget for light and heavy customers"""
+        for email, booking_ids in self.customers:
+            session = dict(CUSTOMER_SESSION, user=email, email=email)
+            with self.subTest(bookings=len(booking_ids)):
+                self._session(session, last_booking_ids=booking_ids)
+                for url in ("/book", "/booking_submitted", "/dashboard"):
+                    with self.assertMaxQueries(BUDGETS[url]) as queries:
+                        response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200, url)
+                    self.assertGreater(queries.count, 0, url)
+
+    def test_admin_lists(self):
+        """Admin lists stay in budget on the first and on a deep page"""
+        self._session(ADMIN_SESSION)
+        for url, query_string in (
+            ("/admin", {}),
+            ("/admin/bookings", {}),
+            ("/admin/bookings", {"before": self.older_booking}),
+            ("/admin/bookings/pending", {}),
+            ("/admin/customers", {}),
+            ("/admin/customers", {"before": self.older_customer}),
+            ("/admin/courses", {}),
+        ):
+            with self.subTest(url=url, **query_string), self.assertMaxQueries(BUDGETS[url]):
+                self.assertEqual(
+                    self.client.get(url, query_string=query_string).status_code, 200
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+"""
+Query plan regression tests for the SQL in app.py
+
+Every statement app.py hands to execute() is read from the source,
+prepared against a real, seeded PostgreSQL database and EXPLAINed with
+representative parameter values. psycopg2 sends parameters inline, so
+these are the custom plans the app actually gets. A plan fails when it
+sequentially scans a large table or its estimated cost is over budget,
+and the failure prints the offending plan.
+
+Set TEST_DATABASE_URL to enable them. The seeded database is cloned from
+the test template (tests/pg_databases.py) and filled once with
+SEED_CUSTOMERS customers by benchmarks/generate_dataset.py; later runs
+reuse it until the schema changes.
+"""
+
+import ast
+import os
+import re
+import unittest
+
+import psycopg2
+
+import db
+import pg_databases
+from benchmarks import generate_dataset
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+SEED_TAG = "plans"
+SEED_CUSTOMERS = 30_000
+SEED_COURSES = 100
+
+# Tables that grow with traffic; a seq scan on one of these is a regression.
+LARGE_TABLES = {"customers", "bookings", "booking_modules"}
+
+# Functions allowed to scan large tables, and why.
+SEQ_SCAN_ALLOWED = {
+    "admin_dashboard": "exact COUNT(*) totals read every row whatever the plan",
+}
+
+# Estimated total cost, in planner units, on the seeded dataset.
+DEFAULT_COST_BUDGET = 1000
+COST_BUDGETS = {
+    # The booking form lists the whole live catalog.
+    "booking": 2500,
+    "admin_dashboard": 2500,
+}
+
+# SQL built at runtime cannot be read from the source. New entries here
+# need a look at the statements they can produce.
+DYNAMIC_SQL = {
+    "_set_catalog_active": "UPDATE of courses or course_modules by primary key",
+    "db_dump": "SELECT * FROM each table, for a full export",
+}
+
+# Parameters whose type PostgreSQL cannot infer (e.g. "%(x)s IS NULL"),
+# declared in placeholder order.
+PARAM_TYPES = {
+    "pending_bookings": ("bigint", "timestamp with time zone"),
+    "manage_bookings": ("bigint",),
+    "admin_customers": ("bigint",),
+}
+
+# One value per parameter type. Keys are the ids of the first seeded rows.
+SAMPLE_VALUES = {
+    "bigint": 1,
+    "integer": 1,
+    "smallint": 1,
+    "double precision": 60.0,
+    "numeric": 1,
+    "boolean": True,
+    "text": f"{SEED_TAG}-1@example.invalid",
+    "character varying": "x",
+    "name": "public",
+    "timestamp with time zone": "2025-01-01 00:00+00",
+    "bigint[]": [1, 2, 3],
+    "integer[]": [1, 2, 3],
+    "booking_status": "pending",
+}
+
+_PLACEHOLDER = re.compile(r"%%|%\((\w+)\)s|%s")
+
+
+def _string_values(node, assigned):
+    """Resolve an execute() argument to the SQL strings it can hold, or None."""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.Tuple, ast.List)):
+        values = [_string_values(item, assigned) for item in node.elts]
+        if all(values):
+            return [sql for value in values for sql in value]
+        return None
+    if isinstance(node, ast.Name) and node.id in assigned:
+        return _string_values(assigned[node.id], assigned)
+    return None
+
+
+def app_statements(path=APP_PATH):
+    """
+    Find every execute()/executemany() call in app.py.
+
+    String literals, names assigned a literal (or a tuple of them) and loop
+    variables over such a tuple are resolved. Anything else is dynamic.
+
+    Returns:
+        tuple: ([(function, lineno, sql), ...], {function: lineno} of dynamic SQL)
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+
+    statements, dynamic = [], {}
+    for func in ast.walk(tree):
+        if not isinstance(func, ast.FunctionDef):
+            continue
+        assigned = {}
+        for node in ast.walk(func):
+            if isinstance(node, ast.Assign) and len(node.targets) == 1 \
+                    and isinstance(node.targets[0], ast.Name):
+                assigned[node.targets[0].id] = node.value
+            elif isinstance(node, ast.For) and isinstance(node.target, ast.Name):
+                assigned[node.target.id] = node.iter
+        for node in ast.walk(func):
+            if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                    and node.func.attr in ("execute", "executemany") and node.args):
+                continue
+            sqls = _string_values(node.args[0], assigned)
+            if sqls is None:
+                dynamic.setdefault(func.name, node.lineno)
+                continue
+            statements.extend((func.name, node.lineno, sql) for sql in sqls)
+    return statements, dynamic
+
+
+def to_server_placeholders(sql):
+    """Rewrite psycopg2 %s / %(name)s placeholders as $1, $2, ..."""
+    numbers = {}
+
+    def number(match):
+        if match.group(0) == "%%":
+            return "%"
+        key = match.group(1) or len(numbers)
+        numbers.setdefault(key, len(numbers) + 1)
+        return f"${numbers[key]}"
+
+    return _PLACEHOLDER.sub(number, sql)
+
+
+def seeded_database_url():
+    """URL of the shared seeded database, built on first use."""
+    return pg_databases.seeded_database(
+        SEED_TAG,
+        lambda conn: generate_dataset.populate(
+            conn, SEED_CUSTOMERS, courses=SEED_COURSES, tag=SEED_TAG
+        ),
+        version=f"{SEED_CUSTOMERS}:{SEED_COURSES}",
+    )
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get("Plans", ()):
+        yield from plan_nodes(child)
+
+
+@unittest.skipUnless(os.getenv("TEST_DATABASE_URL"), "TEST_DATABASE_URL is not set")
+class QueryPlanTests(unittest.TestCase):
+    """EXPLAIN every app.py statement against a seeded PostgreSQL database"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.conn = psycopg2.connect(**db.connect_kwargs(seeded_database_url()))
+        cls.conn.autocommit = True
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.conn.close()
+
+    def explain(self, function, sql):
+        """
+        Plan one statement as the app would run it.
+
+        Returns:
+            tuple: (JSON plan root, text EXPLAIN for failure messages)
+        """
+        cur = self.conn.cursor()
+        cur.execute("DEALLOCATE ALL")
+        declared = PARAM_TYPES.get(function)
+        cur.execute(
+            "PREPARE plan_check"
+            + (f" ({', '.join(declared)})" if declared else "")
+            + " AS " + to_server_placeholders(sql)
+        )
+        cur.execute(
+            "SELECT parameter_types::text[] FROM pg_prepared_statements"
+            " WHERE name = 'plan_check'"
+        )
+        values = [SAMPLE_VALUES[t] for t in cur.fetchone()[0]]
+        execute = "EXECUTE plan_check" + (f"({', '.join(['%s'] * len(values))})" if values else "")
+        cur.execute("EXPLAIN (FORMAT JSON) " + execute, values)
+        plan = cur.fetchone()[0][0]["Plan"]
+        cur.execute("EXPLAIN " + execute, values)
+        text = "\n".join(row[0] for row in cur.fetchall())
+        return plan, text
+
+    def test_plans_avoid_seq_scans_and_stay_under_budget(self):
+        """No plan scans a large table or goes over its estimated cost budget"""
+        failures = []
+        for function, lineno, sql in app_statements()[0]:
+            where = f"{function} (app.py:{lineno})"
+            try:
+                plan, text = self.explain(function, sql)
+            except (psycopg2.Error, KeyError) as e:
+                failures.append(f"{where}: cannot EXPLAIN: {e}\n{sql}")
+                continue
+
+            problems = []
+            if function not in SEQ_SCAN_ALLOWED:
+                scanned = sorted({
+                    node["Relation Name"] for node in plan_nodes(plan)
+                    if node["Node Type"] == "Seq Scan" and node["Relation Name"] in LARGE_TABLES
+                })
+                if scanned:
+                    problems.append(f"seq scan on {', '.join(scanned)}")
+            budget = COST_BUDGETS.get(function, DEFAULT_COST_BUDGET)
+            if plan["Total Cost"] > budget:
+                problems.append(f"estimated cost {plan['Total Cost']} > budget {budget}")
+            if problems:
+                failures.append(f"{where}: {'; '.join(problems)}\n{text}")
+
+        if failures:
+            self.fail("\n\n".join(failures))
+
+
+class StatementExtractionTests(unittest.TestCase):
+    """Tests for the source scan and placeholder rewriting (no database)"""
+
+    def test_placeholders_are_numbered(self):
+        """Positional placeholders count up; named ones reuse their number"""
+        self.assertEqual(
+            to_server_placeholders("a = %s AND b = %s AND c LIKE 'x%%'"),
+            "a = $1 AND b = $2 AND c LIKE 'x%'",
+        )
+        self.assertEqual(
+            to_server_placeholders("%(id)s IS NULL OR id < %(id)s LIMIT %(limit)s"),
+            "$1 IS NULL OR id < $1 LIMIT $2",
+        )
+
+    def test_statements_are_found(self):
+        """The source scan sees app.py's queries and only the known dynamic SQL"""
+        statements, dynamic = app_statements()
+        functions = {function for function, _, _ in statements}
+        for expected in ("get_customer_by_email", "customer_dashboard", "manage_bookings"):
+            self.assertIn(expected, functions)
+        self.assertEqual(set(dynamic), set(DYNAMIC_SQL), dynamic)
+
+    def test_variables_and_loops_are_resolved(self):
+        """SQL held in a variable or looped over from a tuple is found"""
+        statements, _ = app_statements()
+        dashboard = [sql for function, _, sql in statements if function == "customer_dashboard"]
+        self.assertEqual(len(dashboard), 2)
+        purge = [sql for function, _, sql in statements if function == "purge_archived"]
+        self.assertEqual(len(purge), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()